@@ -1,5 +1,4 @@
 import sys, os
-import pickle
 
 sys.path.append(os.path.abspath(os.path.join('..', 'research')))
 
@@ -10,16 +9,19 @@ import pandas as pd
 from bokeh.core.properties import value
 from bokeh.io import curdoc
 from bokeh.layouts import row, column, widgetbox
-from bokeh.models import HoverTool, ColumnDataSource
+from bokeh.models import HoverTool, ColumnDataSource, CustomJSHover, LinearColorMapper
 from bokeh.models.widgets import CheckboxGroup, Div, Slider, Select, Panel, Tabs, DataTable, \
     DateFormatter, TableColumn
 from bokeh.palettes import Category10
 from datetime import datetime
 from functools import partial
 
-from research.dao import DataAccessObject, n_classes
+from research.dao import DataAccessObject, n_classes, measurements, categorical_attributes
+from research.data_classes.cohort_query import CohortQuery
+from research.results_cache import ResultsCache
 
 dao = DataAccessObject()
+results_cache = ResultsCache(cohort_hash=dao.cla.cohort_hash)
 
 """
 Setup
@@ -38,6 +40,31 @@ no_data_div = Div(text='No data to display!', name='no_data_div')
 subject_div = Div(text='', name='subject_div', style={'margin': '20px'})
 
 
+def create_region_values_data() -> dict:
+    """
+    Returns the current results set's class values by region index for the slice hover tools
+    """
+    region_values = dao.region_values
+    if region_values is None:
+        return {f'class_{class_idx}': [] for class_idx in range(n_classes)}
+    return {f'class_{class_idx}': region_values[:, class_idx] for class_idx in range(n_classes)}
+
+
+# Region values shared by all slice hover tools, looked up by the hovered region ID (the format
+# of a class tooltip is its class index)
+region_values_source = ColumnDataSource(data=create_region_values_data())
+region_hover = CustomJSHover(args=dict(source=region_values_source), code="""
+    if (!format) {
+        return value > 0 ? value.toString() : '-';
+    }
+    const values = source.data['class_' + format];
+    if (value < 1 || value > values.length) {
+        return '-';
+    }
+    return Number(values[value - 1]).toFixed(3);
+""")
+
+
 def plot_slice(plane: str, i_slice: int, class_idx: int):
     """
     Plots a specified slice from the current results set
@@ -51,7 +78,8 @@ def plot_slice(plane: str, i_slice: int, class_idx: int):
     :return: bokeh plot
     """
     slice = dao.get_slice(plane, class_idx, i_slice)
-    source = ColumnDataSource(data=dict(image=[slice]))
+    labels = dao.get_label_slice(plane, i_slice)
+    source = ColumnDataSource(data=dict(image=[slice], labels=[labels]))
 
     # Create plot
     plot = bp.figure(plot_width=slice.shape[1] * 2,
@@ -62,12 +90,16 @@ def plot_slice(plane: str, i_slice: int, class_idx: int):
                      name=f'class_{class_idx}_{plane}')
 
     # Add hover tool
-    hover = HoverTool(tooltips=[("x", "$x"), ("y", "$y"), ("value", "@image")])
+    class_tooltips = [(f'class {i + 1}', f'@labels{{{i}}}') for i in range(n_classes)]
+    hover = HoverTool(tooltips=[("x", "$x"), ("y", "$y"), ("value", "@image"),
+                                ("region", "@labels")] + class_tooltips,
+                      formatters={'labels': region_hover})
     plot.add_tools(hover)
 
-    # Plot image
+    # Plot image (regions without a value, e.g. untestable contrast regions, are transparent)
+    color_mapper = LinearColorMapper(palette='Spectral11', nan_color='rgba(0, 0, 0, 0)')
     plot.image(image='image', x=0, y=0, dw=slice.shape[1], dh=slice.shape[0],
-               source=source, palette='Spectral11', name=f'class_{class_idx}_{plane}_image')
+               source=source, color_mapper=color_mapper, name=f'class_{class_idx}_{plane}_image')
 
     # Update plot sources dictionary
     plot_source_dict[plot] = source
@@ -86,14 +118,15 @@ def update_plot(plot) -> None:
     # Use plot name to build DAO query
     _, class_idx, plane = plot.name.split('_')
 
-    # Get updated slice
+    # Get updated slice and matching region IDs
     slice = dao.get_slice(plane, int(class_idx), sliders[plane].value)
+    labels = dao.get_label_slice(plane, sliders[plane].value)
 
     # Get the appropriate data source object from the plot sources dictionary
     source = plot_source_dict[plot]
 
     # Update the plot source with the new slice image
-    source.data = dict(image=[slice])
+    source.data = dict(image=[slice], labels=[labels])
 
 
 def create_class_multi_planar_plots(index: dict, class_idx: int) -> list:
@@ -137,23 +170,30 @@ def plot_multi_planar(i_sagittal: int, i_coronal: int, i_horizontal: int, class_
     return plots
 
 
-def plot_area_across_regions(pbr):
-    source_dict = {f'Class {class_idx+1}': pbr.data[:, class_idx] for class_idx in
-                   range(pbr.data.shape[1])}
+def plot_area_across_regions(pbr, level: str = 'region'):
+    if level == 'region':
+        data = pbr.data
+        groups = [str(i) for i in range(1, data.shape[0] + 1)]
+    else:
+        grouping = dao.get_region_grouping(level)
+        data = grouping.roll_up(pbr.data)
+        groups = [str(name) for name in grouping.names]
+    source_dict = {f'Class {class_idx+1}': data[:, class_idx] for class_idx in
+                   range(data.shape[1])}
     classes = list((source_dict.keys()))[::-1]
-    regions = [str(i) for i in range(1, 1001)]
-    source_dict['regions'] = regions
+    source_dict['regions'] = groups
     source = ColumnDataSource(data=source_dict)
-    plot = bp.figure(x_range=regions, title='Class Area by AAL Region', plot_width=1500)
-    plot.vbar_stack(classes, x='regions', width=0.1,
+    level_label = 'AAL Region' if level == 'region' else level.capitalize()
+    plot = bp.figure(x_range=groups, title=f'Class Area by {level_label}', plot_width=1500)
+    plot.vbar_stack(classes, x='regions', width=0.1 if level == 'region' else 0.8,
                     color=['blue', 'red', 'yellow', 'green', 'purple', 'grey'],
                     source=source, legend=[value(x) for x in classes])
     plot.y_range.start = 0
     plot.y_range.end = 1
     plot.yaxis.axis_label = 'Class Probability'
-    plot.xaxis.axis_label = 'AAL Region'
+    plot.xaxis.axis_label = level_label
     # plot.xaxis[0].ticker.ticks = list(range(0,1001,50))[1:]
-    plot.xaxis.visible = False
+    plot.xaxis.visible = level != 'region'
     plot.legend.location = "top_right"
     csf = Div(text='CSF', style={'text-align': 'center'}, width=1000)
     myelin = Div(text='Myelin', style={'text-align': 'center'}, width=1000)
@@ -168,6 +208,11 @@ def plot_linear_model_across_regions(measurement: str):
     # Summary div
     n_subjects = len(scores[scores.index.isin([pbr.subject_id for pbr in dao.pbrs])])
     div = Div(text=f'Summary results over {n_subjects} subjects')
+    if 0 in lm_influence_cb.active:
+        influential = dao.get_influential_subjects(measurement, n_subjects=5)
+        div.text += '<br /><br />Most influential subjects (regions with high Cook\'s distance):'
+        for subject_id, n_regions in influential['n_high_cooks_distance'].items():
+            div.text += f'<br />{subject_id}: {n_regions}'
 
     # Create figure
     n_regions = len(source_dict['region'])
@@ -206,23 +251,15 @@ def plot_linear_model_across_regions(measurement: str):
 
 
 def get_linear_model_results(measurement: str):
-    if measurement in big_five:
-        scores = dao.get_neo_scores(measurement)
-    elif measurement in cantab_measures:
-        scores = dao.get_cantab_scores(measurement)
-    else:
-        scores = dao.get_scores(measurement)
-    file_name = f'{measurement}_lm_results.pkl'
-    file_path = os.path.join('./app/obj', file_name)
-    if os.path.isfile(file_path):
+    scores = dao.get_measurement_scores(measurement)
+    file_name = results_cache.get_lm_file_name(measurement)
+    if results_cache.exists(file_name):
         lm_show_message('Loading...', style={'color': 'orange'})
-        with open(file_path, 'rb') as f:
-            return pickle.load(f), scores
+        return results_cache.load(file_name), scores
     else:
         lm_show_message('Calculating...', style={'color': 'orange'})
         source_dict = dao.cla.calculate_linear_model_dict(scores)
-        with open(file_path, 'wb') as f:
-            pickle.dump(source_dict, f, pickle.HIGHEST_PROTOCOL)
+        results_cache.save(file_name, source_dict)
         return source_dict, scores
 
 
@@ -253,18 +290,14 @@ def plot_anova(categorical_attr: str):
 
 
 def get_anova_results(class_idx: int, categorical_attr: str):
-    file_name = f'{categorical_attr}_{class_idx}_anova_result.pkl'
-    file_path = os.path.join('./app/obj', file_name)
-    if os.path.isfile(file_path):
+    file_name = results_cache.get_anova_file_name(categorical_attr, class_idx)
+    if results_cache.exists(file_name):
         anova_show_message(f'Loading class {class_idx} results...', style={'color': 'orange'})
-        with open(file_path, 'rb') as f:
-            return pickle.load(f)
+        return results_cache.load(file_name)
     else:
         anova_show_message(f'Calculating class {class_idx+1}...', style={'color': 'orange'})
-        attribute_values = dao.get_subject_attributes(categorical_attr)
-        results = dao.cla.calculate_anova(class_idx, attribute_values)
-        with open(file_path, 'wb') as f:
-            pickle.dump(results, f, pickle.HIGHEST_PROTOCOL)
+        results = dao.calculate_anova_results(categorical_attr, class_idx)
+        results_cache.save(file_name, results)
         return results
 
 
@@ -280,6 +313,11 @@ def create_subject_summary():
     subject_div.text += 'Cortical layers results: '
     if hasattr(subject, 'pbr'):
         subject_div.text += 'TRUE'
+        subject_div.text += '<br /><br />'
+        subject_div.text += 'SIMILAR SUBJECTS'
+        subject_div.text += '<br />'
+        for subject_id, distance in dao.get_similar_subjects(subject.id).items():
+            subject_div.text += f'{subject_id}: {distance:.3f}<br />'
     else:
         subject_div.text += 'FALSE'
 
@@ -346,22 +384,68 @@ atlas_msg_div = Div(text='', name='atlas_message')
 lm_msg_div = Div(text='', name='lm_message')
 anova_msg_div = Div(text='', name='anova_message')
 
-# Select menu to choose the displayed results set (single subject or summary)
-options = ['mean'] + [str(subject) for subject in dao.subjects if hasattr(subject, 'pbr')]
+
+def create_cohort_queries() -> dict:
+    """
+    Returns sub-cohort queries by results set option label for every categorical attribute value
+    and age decade
+    """
+    queries = {}
+    subjects_df = dao.get_subject_attributes_df()
+    for attr in categorical_attributes:
+        for attr_value in sorted(subjects_df[attr].dropna().unique()):
+            queries[f'mean ({attr.replace("_", " ")}: {attr_value})'] = CohortQuery(
+                **{attr: attr_value})
+    ages = [subject.get_age() for subject in dao.subjects if hasattr(subject, 'pbr')]
+    decades = sorted({int(age // 10) * 10 for age in ages if age is not None})
+    for decade in decades:
+        queries[f'mean (age: {decade}-{decade + 10})'] = CohortQuery(min_age=decade,
+                                                                  max_age=decade + 10)
+    return queries
+
+
+def create_contrast_queries() -> dict:
+    """
+    Returns pairs of sub-cohort queries by results set option label for every pair of values of
+    each categorical attribute
+    """
+    queries = {}
+    subjects_df = dao.get_subject_attributes_df()
+    for attr in categorical_attributes:
+        attr_values = sorted(subjects_df[attr].dropna().unique())
+        for i, value_a in enumerate(attr_values):
+            for value_b in attr_values[i + 1:]:
+                label = f't-test ({attr.replace("_", " ")}: {value_a} vs. {value_b})'
+                queries[label] = (CohortQuery(**{attr: value_a}), CohortQuery(**{attr: value_b}))
+    return queries
+
+
+# Select menu to choose the displayed results set (single subject, summary, sub-cohort summary or
+# sub-cohort contrast)
+cohort_queries = create_cohort_queries()
+contrast_queries = create_contrast_queries()
+options = ['mean'] + list(cohort_queries.keys()) + list(contrast_queries.keys()) + \
+          [str(subject) for subject in dao.subjects if hasattr(subject, 'pbr')]
 select = Select(title="Results set", value="mean", options=options)
 
 
 def change_results_set(attr, old, new):
     set_id = select.value
-    if set_id not in ['mean']:
+    if set_id in cohort_queries:
+        set_id = cohort_queries[set_id]
+    elif set_id not in ['mean'] and set_id not in contrast_queries:
         set_id = set_id[-9:]
     atlas_show_message(f'Loading results for subject {select.value}...', style={'color': 'orange'})
-    dao.results_set = dao.get_results_set(set_id)
+    if set_id in contrast_queries:
+        dao.results_set = dao.get_contrast_results_set(*contrast_queries[set_id])
+    else:
+        dao.results_set = dao.get_results_set(set_id)
     if not dao.results_set:
         atlas_show_message(f'Could not find results for {select.value}!', style={'color': 'red'})
         return
     else:
         atlas_show_message(f'Displaying reults for {select.value}', style={'color': 'green'})
+        region_values_source.data = create_region_values_data()
         for class_idx in classes_checkbox.active:
             for plane in ('sagittal', 'coronal', 'horizontal'):
                 existing_plot = curdoc().get_model_by_name(f'class_{class_idx}_{plane}')
@@ -371,15 +455,13 @@ def change_results_set(attr, old, new):
 select.on_change('value', change_results_set)
 
 # Sliders for slice changing
-if dao.results_set:
-    sample_img = dao.results_set[0].data
-else:
-    sample_img = np.zeros((1, 1, 1))
-sagittal_slice_slider = Slider(start=1, end=sample_img.shape[0], value=1, step=1,
+# Slice indices are in template space (maps may be cropped to the atlas' bounding box)
+template_shape = dao.get_template_shape()
+sagittal_slice_slider = Slider(start=1, end=template_shape[0], value=1, step=1,
                                title='Sagittal Slice')
-coronal_slice_slider = Slider(start=1, end=sample_img.shape[1], value=1, step=1,
+coronal_slice_slider = Slider(start=1, end=template_shape[1], value=1, step=1,
                               title='Coronal Slice')
-horizontal_slice_slider = Slider(start=1, end=sample_img.shape[2], value=1, step=1,
+horizontal_slice_slider = Slider(start=1, end=template_shape[2], value=1, step=1,
                                  title='Horizontal Slice')
 
 # Sliders dictionary for accessibility
@@ -425,7 +507,6 @@ def change_subject_view(attr, old, new):
 subjects_source.on_change('selected', change_subject_view)
 
 # ANOVA attribute select
-categorical_attributes = ['sex', 'dominant_hand']
 anova_categorical_select = Select(title='Group by', value='sex', options=categorical_attributes)
 
 
@@ -451,11 +532,26 @@ def update_visible_statistics(attr, old, new):
 
 anova_statistic_cb.on_change('active', update_visible_statistics)
 
+# Summary statistics roll-up level select
+summary_level_select = Select(title='Level', value='region',
+                              options=['region'] + dao.get_region_grouping_names())
+
+
+def update_summary_level(attr, old, new):
+    summary_layout.children[1] = plot_area_across_regions(dao.cla.mean_pbr,
+                                                          summary_level_select.value)
+
+
+summary_level_select.on_change('value', update_summary_level)
+
+
+def update_summary_level_options(name: str):
+    summary_level_select.options = ['region'] + dao.get_region_grouping_names()
+
+
+dao.on_region_grouping_added(update_summary_level_options)
+
 # Linear model attribute select
-big_five = ['agreeableness', 'conscientiousness', 'extraversion', 'neuroticism', 'openness']
-cantab_measures = ['DMSMDLAD', 'DMSPC', 'PALFAMS', 'PALTEA', 'RTIFMDRT', 'RTIFMMT', 'RVPA',
-                   'RVPMDL', 'SWMBE', 'SWMS']
-measurements = ['height', 'weight', 'age'] + big_five + cantab_measures
 lm_measurement_select = Select(title='Measurement', value='age', options=measurements)
 
 
@@ -466,6 +562,10 @@ def update_lm_measurement(attr, old, new):
 
 lm_measurement_select.on_change('value', update_lm_measurement)
 
+# Linear model influential subjects checkbox
+lm_influence_cb = CheckboxGroup(labels=['Show influential subjects'], active=[])
+lm_influence_cb.on_change('active', update_lm_measurement)
+
 """
 Create layout and set as document root
 """
@@ -476,7 +576,8 @@ subjects_tab = Panel(child=subjects_row, title='Subjects')
 
 # Statistical summary tab
 area_plot = plot_area_across_regions(dao.cla.mean_pbr)
-summary_stats_tab = Panel(child=area_plot, title="Summary Statistics")
+summary_layout = column(summary_level_select, area_plot, name='summary_layout')
+summary_stats_tab = Panel(child=summary_layout, title="Summary Statistics")
 
 # Atlas projection tab
 all_class_figures = column(name='all_class_figures')
@@ -496,7 +597,7 @@ anova_tab = Panel(child=anova_layout, title='ANOVA')
 # Linear model tab
 lm_plot = plot_linear_model_across_regions(lm_measurement_select.value)
 lm_show_message('Ready!', style={'color': 'green'})
-lm_control = widgetbox(lm_measurement_select, lm_msg_div, name='lm_control')
+lm_control = widgetbox(lm_measurement_select, lm_influence_cb, lm_msg_div, name='lm_control')
 lm_layout = column(lm_control, lm_plot, name='lm_layout')
 lm_tab = Panel(child=lm_layout, title='Linear Models')
 
@@ -1,38 +1,115 @@
+import re
+
 import numpy as np
 import pandas as pd
 
-from .data_classes.data_loader import DataLoader
+from .data_classes.data_loader import DataLoader, datasource
 from .data_classes.cortical_layers.analysis import CorticalLayersAnalysis
-from .data_classes.cortical_layers.probability_map import ProbabilityMap
-from .data_classes.cortical_layers.cfg import n_classes
+from .data_classes.cortical_layers.chunked_analysis import ChunkedCorticalLayersAnalysis
+from .data_classes.cortical_layers.group_aggregates import GroupAggregates
+from .data_classes.cortical_layers.brain_matrix import BrainMatrix
+from .data_classes.cortical_layers.group_contrast import GroupContrast
+from .data_classes.cortical_layers.region_grouping import RegionGrouping
+from .data_classes.cortical_layers.surface_projection import SurfaceProjection
+from .data_classes.cortical_layers.cfg import n_classes, atlas
+from .data_classes.cohort_query import CohortQuery
 from .data_classes.subject import Subject
 
 data_loader = DataLoader()
 
+big_five = ['agreeableness', 'conscientiousness', 'extraversion', 'neuroticism', 'openness']
+cantab_measures = ['DMSMDLAD', 'DMSPC', 'PALFAMS', 'PALTEA', 'RTIFMDRT', 'RTIFMMT', 'RVPA',
+                   'RVPMDL', 'SWMBE', 'SWMS']
+measurements = ['height', 'weight', 'age'] + big_five + cantab_measures
+categorical_attributes = ['sex', 'dominant_hand']
+
 
 class DataAccessObject:
     _chosen_subject = None
     _results_set = None
     _pbrs = None
+    _surface_projection = None
+    _region_values = None
+    _region_groupings = None
+    region_cluster_options = (4, 6, 8, 10, 12)
 
-    def __init__(self, subjects: list = data_loader.subjects):
+    def __init__(self, subjects: list = data_loader.subjects, chunked: bool = False):
         """
         This class handles data access
 
         :param subjects: subjects data
         :type subjects: list of subject instances
+        :param chunked: run the analysis out-of-core over a memory-mapped stacked array
+        :type chunked: bool
         """
         self.subjects = subjects
-        self.cla = CorticalLayersAnalysis(self.pbrs)
+        self._label_volumes = {}
+        self._region_grouping_callbacks = []
+        if chunked:
+            files = data_loader.cortical_layers.get_files()
+            self.cla = ChunkedCorticalLayersAnalysis(files=files)
+        else:
+            self.cla = CorticalLayersAnalysis(self.pbrs)
 
     def get_subject_by_id(self, subject_id: str) -> Subject:
         return data_loader.get_subject_by_id(subject_id)
 
-    def get_scores(self, measurement_name: str):
-        scores_dict = {
-        subject.id: subject.measurements.get_last_measurement_value(measurement_name)
-        for subject in self.subjects}
-        return pd.DataFrame(data=list(scores_dict.values()), index=list(scores_dict.keys()))
+    def get_scan_dates(self) -> pd.Series:
+        """
+        Returns the scan date of each subject with cortical layers results. Scan dates are only
+        read from the optional 'scan_date' column of the subjects sheet, so a ValueError is
+        raised if any of these subjects has none (rather than silently returning no scores).
+
+        :return: scan date by subject ID
+        :rtype: pd.Series
+        """
+        subjects = [subject for subject in self.subjects if hasattr(subject, 'pbr')]
+        missing = [subject.id for subject in subjects if pd.isnull(subject.scan_date)]
+        if missing:
+            raise ValueError(f'Missing scan dates for {len(missing)} of {len(subjects)} subjects '
+                             f'(e.g. {missing[0]})! Add a scan_date column to the subjects sheet.')
+        return pd.Series({subject.id: subject.scan_date for subject in subjects}, dtype=object)
+
+    def get_scores_as_of(self, measurement_name: str, dates: pd.Series,
+                         direction: str = 'backward', tolerance: pd.Timedelta = None):
+        """
+        Returns the value of a measurement as of a date for each subject
+
+        :param measurement_name: measurement name
+        :type measurement_name: str
+        :param dates: date by subject ID
+        :type dates: pd.Series
+        :param direction: 'backward' (last value on or before the date), 'forward' or 'nearest'
+        :type direction: str
+        :param tolerance: maximal distance between the measurement and the given date
+        :type tolerance: pd.Timedelta
+        :return: scores by subject ID
+        :rtype: pd.DataFrame
+        """
+        values = datasource.measurements.get_values_as_of(measurement_name, dates,
+                                                          direction=direction, tolerance=tolerance)
+        return pd.DataFrame(data=values.values, index=values.index)
+
+    def get_scores(self, measurement_name: str, at_scan_date: bool = False):
+        """
+        Returns a measurement's scores by subject ID
+
+        :param measurement_name: measurement name
+        :type measurement_name: str
+        :param at_scan_date: use each subject's measurement nearest to their scan date (requires
+        scan dates, see get_scan_dates) rather than the latest one (see
+        Measurements.get_latest_values)
+        :type at_scan_date: bool
+        :return: scores by subject ID
+        :rtype: pd.DataFrame
+        """
+        if at_scan_date:
+            return self.get_scores_as_of(measurement_name, self.get_scan_dates(),
+                                         direction='nearest')
+        subject_ids = [subject.id for subject in self.subjects
+                       if hasattr(subject, 'measurements')]
+        values = datasource.measurements.get_latest_values(measurement_name).reindex(subject_ids)
+        return pd.DataFrame(data=values.values, index=subject_ids)
 
     def get_neo_scores(self, trait: str):
         scores_dict = {subject.id: subject.neo_ffi.get_score(trait) for subject in self.subjects if hasattr(subject, 'neo_ffi')}
@@ -42,6 +119,116 @@ class DataAccessObject:
         scores_dict = {subject.id: subject.cantab.get_score(measure) for subject in self.subjects if hasattr(subject, 'cantab')}
         return pd.DataFrame(data=list(scores_dict.values()), index=list(scores_dict.keys()))
 
+    def get_measurement_scores(self, measurement: str, at_scan_date: bool = False) -> pd.DataFrame:
+        """
+        Returns the scores of any of the available measurements by subject ID
+
+        :param measurement: measurement, NEO-FFI trait or CANTAB measure name
+        :type measurement: str
+        :param at_scan_date: use each subject's measurement nearest to their scan date rather than
+        the latest one (measurements only, requires scan dates, see get_scan_dates)
+        :type at_scan_date: bool
+        :return: scores by subject ID
+        :rtype: pd.DataFrame
+        """
+        if measurement in big_five:
+            return self.get_neo_scores(measurement)
+        elif measurement in cantab_measures:
+            return self.get_cantab_scores(measurement)
+        return self.get_scores(measurement, at_scan_date=at_scan_date)
+
+    def get_covariates_df(self, names: list) -> pd.DataFrame:
+        """
+        Returns a covariates table for the subjects with cortical layers results, with 'age'
+        calculated from the date of birth, 'pc<n>' the subjects' principal component scores and
+        any other name treated as a subject attribute (e.g. 'sex') or a measurement score
+
+        :param names: covariate names
+        :type names: list
+        :return: covariates by subject ID
+        :rtype: pd.DataFrame
+        """
+        subjects = [subject for subject in self.subjects if hasattr(subject, 'pbr')]
+        index = [subject.id for subject in subjects]
+        covariates = pd.DataFrame(index=index)
+        for name in names:
+            if name == 'age':
+                covariates[name] = [subject.get_age() for subject in subjects]
+            elif name in Subject.attributes:
+                covariates[name] = [getattr(subject, name) for subject in subjects]
+            elif re.fullmatch(r'pc\d+', name):
+                decomposition = self.cla.get_decomposition(max(int(name[2:]), 10))
+                if name not in decomposition.component_names:
+                    raise ValueError(f'Invalid principal component: {name}! Must be one of pc1 to '
+                                     f'pc{decomposition.n_components}')
+                scores = decomposition.scores[name]
+                covariates[name] = scores.reindex(index).values
+            else:
+                scores = self.get_measurement_scores(name)[0]
+                covariates[name] = scores.reindex(index).values
+        return covariates
+
+    def get_feature_matrix(self, names: list = None) -> pd.DataFrame:
+        """
+        Returns a numeric subject x measure table for the subjects with cortical layers results
+
+        :param names: measure names (see get_covariates_df), defaults to all measurements, NEO-FFI
+        traits and CANTAB measures
+        :type names: list
+        :return: measures by subject ID
+        :rtype: pd.DataFrame
+        """
+        names = measurements if names is None else names
+        return self.get_covariates_df(names).apply(pd.to_numeric, errors='coerce')
+
+    def screen_correlations(self, names: list = None, covariates: list = None):
+        """
+        Screens the correlations of every region x class probability with every measure
+
+        :param names: measure names, defaults to all available
+        :type names: list
+        :param covariates: covariate names to partial out (see get_covariates_df)
+        :type covariates: list
+        :return: fitted screen
+        :rtype: CorrelationScreen
+        """
+        covariates_df = self.get_covariates_df(covariates) if covariates else None
+        return self.cla.screen_correlations(self.get_feature_matrix(names), covariates_df)
+
+    def calculate_lm_results(self, measurement: str) -> dict:
+        return self.cla.calculate_linear_model_dict(self.get_measurement_scores(measurement))
+
+    def get_influential_subjects(self, measurement: str, n_subjects: int = 10) -> pd.DataFrame:
+        """
+        Returns the subjects most often acting as high-influence points in the regions' linear
+        models of a measurement
+
+        :param measurement: measurement, NEO-FFI trait or CANTAB measure name
+        :type measurement: str
+        :param n_subjects: number of subjects
+        :type n_subjects: int
+        :return: influence summary by subject ID
+        :rtype: pd.DataFrame
+        """
+        influence = self.cla.calculate_influence(self.get_measurement_scores(measurement))
+        return influence.get_influential_subjects().head(n_subjects)
+
+    def calculate_ridge_results(self, measurement: str, n_folds: int = 5):
+        """
+        Predicts a measurement from the whole-brain probability by region data
+
+        :param measurement: measurement, NEO-FFI trait or CANTAB measure name
+        :type measurement: str
+        :param n_folds: number of cross-validation folds
+        :type n_folds: int
+        :return: fitted predictor
+        :rtype: RidgePredictor
+        """
+        return self.cla.fit_ridge(self.get_measurement_scores(measurement), n_folds=n_folds)
+
+    def calculate_anova_results(self, categorical_attr: str, class_idx: int) -> pd.DataFrame:
+        return self.cla.calculate_anova(class_idx, self.get_subject_attributes(categorical_attr))
+
     def get_subject_attributes(self, attr_name: str):
         attr_dict = {subject.id: getattr(subject, attr_name) for subject in self.subjects if hasattr(subject, attr_name)}
         return pd.DataFrame(data=list(attr_dict.values()), index=list(attr_dict.keys()))
@@ -53,17 +240,103 @@ class DataAccessObject:
     def get_probability_by_region_matrices(self):
         return [subject.pbr for subject in self.subjects if hasattr(subject, 'pbr')]
 
-    def get_results_set(self, identifier: str) -> list:
+    def get_similar_subjects(self, subject_id: str, k: int = 5) -> pd.Series:
+        """
+        Returns the subjects with the most similar cortical layers profiles
+
+        :param subject_id: subject ID
+        :type subject_id: str
+        :param k: number of subjects
+        :type k: int
+        :return: correlation distance (of the cohort mean centred profiles) by subject ID
+        (ascending)
+        :rtype: pd.Series
+        """
+        return self.cla.similarity_index.query(subject_id, k=k)
+
+    def get_subject_percentiles(self, subject_id: str) -> np.ndarray:
+        """
+        Returns a subject's percentile rank within the cohort in every region x class
+
+        :param subject_id: subject ID
+        :type subject_id: str
+        :return: percentile ranks (region x class)
+        :rtype: np.ndarray
+        """
+        return self.cla.distribution.get_subject_percentiles(subject_id)
+
+    def get_cohort_aggregates(self, query: CohortQuery) -> GroupAggregates:
+        """
+        Returns the (cached) mean and STD probability by region of a sub-cohort
+
+        :param query: sub-cohort definition
+        :type query: CohortQuery
+        :return: group aggregates
+        :rtype: GroupAggregates
+        """
+        subjects = [subject for subject in self.subjects if hasattr(subject, 'pbr')]
+        return self.cla.get_group_aggregates(query.resolve(subjects))
+
+    def get_cohort_contrast(self, query_a: CohortQuery, query_b: CohortQuery) -> GroupContrast:
+        """
+        Compares two sub-cohorts across all regions and classes
+
+        :param query_a: first sub-cohort definition
+        :type query_a: CohortQuery
+        :param query_b: second sub-cohort definition
+        :type query_b: CohortQuery
+        :return: group contrast
+        :rtype: GroupContrast
+        """
+        subjects = [subject for subject in self.subjects if hasattr(subject, 'pbr')]
+        return self.cla.create_group_contrast(query_a.resolve(subjects),
+                                              query_b.resolve(subjects))
+
+    def get_contrast_results_set(self, query_a: CohortQuery, query_b: CohortQuery,
+                                 statistic: str = 't') -> list:
+        """
+        Get a results set of statistic maps contrasting two sub-cohorts
+
+        :param query_a: first sub-cohort definition
+        :type query_a: CohortQuery
+        :param query_b: second sub-cohort definition
+        :type query_b: CohortQuery
+        :param statistic: 't', 'df', 'p', 'd' or 'p_fdr'
+        :type statistic: str
+        :return: statistic maps by class
+        :rtype: list of StatisticMap instances
+        """
+        print(f'Retrieving {statistic} maps for {query_a} vs. {query_b}...', end='\t')
+        try:
+            statistic_maps = self.get_cohort_contrast(query_a, query_b).create_maps(statistic)
+        except ValueError as e:
+            print(e)
+            return None
+        print('done!')
+        return statistic_maps
+
+    def get_results_set(self, identifier) -> list:
         """
         Get a results set (list of ordered class probability brain matrices) by identifier
 
-        :param identifier: results set identifier
-        :type identifier: str
+        :param identifier: results set identifier or a sub-cohort query
+        :type identifier: str or CohortQuery
         :return: desired results set
         :rtype: list  of BrainMatrix instances
         """
-        # Get summary results
+        # Get sub-cohort summary results
         probability_maps = None
+        if isinstance(identifier, CohortQuery):
+            print(f'Retrieving class mean probabilites for {identifier}...', end='\t')
+            try:
+                probability_maps = self.get_cohort_aggregates(identifier).probability_maps
+            except ValueError:
+                print(f'No subjects match {identifier}!')
+                return None
+            print('done!')
+            return probability_maps
+
+        # Get summary results
         if identifier == 'mean':
             print('Retrieving class mean probabilites result set...', end='\t')
             probability_maps = self.cla.mean_probability_maps
@@ -94,8 +367,8 @@ class DataAccessObject:
             print('done!')
             return True
         is_list = isinstance(value, list)
-        of_pmaps = all([isinstance(obj, ProbabilityMap) for obj in value])
-        assert is_list and of_pmaps, 'Results set must be a list of BrainMatrix instances'
+        of_brain_matrices = all([isinstance(obj, BrainMatrix) for obj in value])
+        assert is_list and of_brain_matrices, 'Results set must be a list of BrainMatrix instances'
         assert len(value) is n_classes, f'Results set must be of length {n_classes}'
         print('done!')
         return True
@@ -113,7 +386,123 @@ class DataAccessObject:
         :return: slice image
         :rtype: np.ndarray
         """
-        return self.results_set[class_idx].create_slice(plane, i_slice)
+        return self.results_set[class_idx].create_display_slice(plane, i_slice)
+
+    def get_template_shape(self) -> tuple:
+        """
+        Returns the shape of the atlas template, whose space slice indices are given in (cropped
+        maps included)
+
+        :return: template shape
+        :rtype: tuple
+        """
+        return atlas.template.shape
+
+    def get_label_slice(self, plane: str, i_slice: int) -> np.ndarray:
+        """
+        Returns the atlas region ID slice matching the results set slices, sliced from the
+        (cached) full or cropped label volume
+
+        :param plane: 'sagittal', 'coronal' or 'horizontal'
+        :type plane: str
+        :param i_slice: index of the desired slice
+        :type i_slice: int
+        :return: region ID slice image
+        :rtype: np.ndarray
+        """
+        cropped = bool(self.results_set) and \
+            self.results_set[0].data.shape == atlas.cropped_shape
+        if cropped not in self._label_volumes:
+            if cropped:
+                labels = BrainMatrix(atlas.template[atlas.bounding_box], offset=atlas.crop_offset)
+            else:
+                labels = BrainMatrix(atlas.template)
+            self._label_volumes[cropped] = labels
+        return self._label_volumes[cropped].create_slice(plane, i_slice)
+
+    def get_region_values(self) -> np.ndarray:
+        """
+        Returns the region x class values the current results set's maps were projected from
+        (None if any map was not projected from region values)
+
+        :return: values (region x class)
+        :rtype: np.ndarray
+        """
+        values = [getattr(brain_matrix, 'region_values', None) for brain_matrix in self.results_set]
+        if any(class_values is None for class_values in values):
+            return None
+        return np.column_stack(values).astype(float)
+
+    def get_region_grouping_names(self) -> list:
+        """
+        Returns the names of the available region groupings without calculating them
+
+        :return: region grouping names
+        :rtype: list
+        """
+        return list(self.region_groupings)
+
+    def get_region_grouping(self, name: str) -> RegionGrouping:
+        """
+        Returns a region grouping by name, calculating (and caching) k-means groupings on first
+        use. Region values are rolled up as voxel-count weighted means.
+
+        :param name: region grouping name (see get_region_grouping_names)
+        :type name: str
+        :return: region grouping
+        :rtype: RegionGrouping
+        """
+        if name not in self.region_groupings:
+            raise ValueError(f'Invalid region grouping: {name}!')
+        if self.region_groupings[name] is None:
+            voxel_counts = atlas.get_region_voxel_counts()
+            if name == 'hemisphere':
+                grouping = RegionGrouping.from_hemispheres(atlas)
+            else:
+                n_clusters = int(name[len('k-means ('):-len(')')])
+                clusters = self.cla.get_region_clusters((n_clusters,))[n_clusters]
+                grouping = RegionGrouping(clusters.labels, weights=voxel_counts)
+            self.region_groupings[name] = grouping
+        return self.region_groupings[name]
+
+    def add_region_grouping(self, name: str, mapping) -> None:
+        """
+        Adds a custom region grouping (e.g. lobes) and notifies the callbacks registered with
+        on_region_grouping_added
+
+        :param name: grouping name
+        :type name: str
+        :param mapping: parent by region index
+        :type mapping: dict or pd.Series
+        :return:
+        """
+        self.region_groupings[name] = RegionGrouping.from_mapping(
+            mapping, self.cla.n_regions, weights=atlas.get_region_voxel_counts())
+        for callback in self._region_grouping_callbacks:
+            callback(name)
+
+    def on_region_grouping_added(self, callback) -> None:
+        """
+        Registers a callback to be called with the name of every region grouping added
+
+        :param callback: function with the signature callback(name)
+        :return:
+        """
+        self._region_grouping_callbacks.append(callback)
+
+    def get_surface_maps(self, region_values: np.ndarray) -> list:
+        """
+        Renders region x class values (e.g. a mean probability by region matrix's data, LM
+        R-squared or group contrast statistics) onto the surface template
+
+        :param region_values: value by region index (and class)
+        :type region_values: np.ndarray
+        :return: surface map by class
+        :rtype: list of BrainMatrix instances
+        """
+        region_values = np.asarray(region_values).reshape(len(region_values), -1)
+        return [self.surface_projection.create_map(class_values) for class_values in
+                region_values.T]
 
     def get_subject_attributes_df(self):
         dicts = [subject.to_dict() for subject in self.subjects]
@@ -138,6 +527,30 @@ class DataAccessObject:
     def results_set(self, value) -> None:
         if self.validate_results_set(value):
             self._results_set = value
+            self._region_values = None
+
+    @property
+    def region_values(self) -> np.ndarray:
+        if not isinstance(self._region_values, np.ndarray) and self.results_set:
+            self._region_values = self.get_region_values()
+        return self._region_values
+
+    @property
+    def region_groupings(self) -> dict:
+        """
+        Region groupings by name, None until calculated (see get_region_grouping)
+        """
+        if not isinstance(self._region_groupings, dict):
+            names = ['hemisphere'] + [f'k-means ({n_clusters})' for n_clusters in
+                                      self.region_cluster_options]
+            self._region_groupings = dict.fromkeys(names)
+        return self._region_groupings
+
+    @property
+    def surface_projection(self) -> SurfaceProjection:
+        if not isinstance(self._surface_projection, SurfaceProjection):
+            self._surface_projection = SurfaceProjection()
+        return self._surface_projection
 
     @property
     def pbrs(self):
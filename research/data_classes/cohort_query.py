@@ -0,0 +1,81 @@
+from .subject import Subject
+
+
+class CohortQuery:
+    def __init__(self, sex: str = None, dominant_hand: str = None, min_age: float = None,
+                 max_age: float = None, has_cantab: bool = None, predicates: list = None):
+        """
+        Defines a sub-cohort by subject attribute predicates (all of which must hold)
+
+        :param sex: required sex
+        :type sex: str
+        :param dominant_hand: required dominant hand
+        :type dominant_hand: str
+        :param min_age: minimal age in years (inclusive)
+        :type min_age: float
+        :param max_age: maximal age in years (exclusive)
+        :type max_age: float
+        :param has_cantab: whether CANTAB results are required (True) or excluded (False)
+        :type has_cantab: bool
+        :param predicates: additional functions of a Subject instance returning a bool
+        :type predicates: list
+        """
+        self.sex = sex
+        self.dominant_hand = dominant_hand
+        self.min_age = min_age
+        self.max_age = max_age
+        self.has_cantab = has_cantab
+        self.predicates = predicates or []
+
+    def check_age(self, subject: Subject) -> bool:
+        if self.min_age is None and self.max_age is None:
+            return True
+        age = subject.get_age()
+        if age is None:
+            return False
+        if self.min_age is not None and age < self.min_age:
+            return False
+        if self.max_age is not None and age >= self.max_age:
+            return False
+        return True
+
+    def matches(self, subject: Subject) -> bool:
+        """
+        Checks whether a subject belongs to the queried cohort
+
+        :param subject: subject
+        :type subject: Subject
+        :return: boolean result
+        :rtype: bool
+        """
+        if self.sex is not None and subject.sex != self.sex:
+            return False
+        if self.dominant_hand is not None and subject.dominant_hand != self.dominant_hand:
+            return False
+        if self.has_cantab is not None and hasattr(subject, 'cantab') is not self.has_cantab:
+            return False
+        if not self.check_age(subject):
+            return False
+        return all(predicate(subject) for predicate in self.predicates)
+
+    def resolve(self, subjects: list) -> tuple:
+        """
+        Returns the sorted IDs of the subjects belonging to the queried cohort
+
+        :param subjects: subjects to filter
+        :type subjects: list of Subject instances
+        :return: subject IDs
+        :rtype: tuple
+        """
+        return tuple(sorted(subject.id for subject in subjects if self.matches(subject)))
+
+    def __str__(self):
+        conditions = [f'{attr}={getattr(self, attr)}' for attr in
+                      ('sex', 'dominant_hand', 'has_cantab') if getattr(self, attr) is not None]
+        if self.min_age is not None or self.max_age is not None:
+            min_age = '' if self.min_age is None else self.min_age
+            max_age = '' if self.max_age is None else self.max_age
+            conditions.append(f'age={min_age}-{max_age}')
+        if self.predicates:
+            conditions.append(f'{len(self.predicates)} custom predicates')
+        return ', '.join(conditions) or 'all'
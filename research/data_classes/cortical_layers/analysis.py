@@ -1,16 +1,36 @@
 import glob
+import hashlib
 import os
 
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 import statsmodels.api as sm
 
 from statsmodels.formula.api import ols
 from statsmodels.stats.multitest import fdrcorrection
+from .bootstrap import BootstrapEngine
 from .brain_atlas import BrainAtlas
-from .cfg import n_classes, results_dir, atlas
+from .clusters import ClusterInference
+from .correlation_screen import CorrelationScreen, standardize
+from .decomposition import CohortDecomposition
+from .distribution import CohortDistribution
+from .cfg import n_classes, results_dir, atlas, precision
+from .glm import GeneralLinearModel
+from .group_aggregates import GroupAggregates
+from .group_contrast import GroupContrast, welch_t_test
+from .influence import RegressionInfluence
 from .probability_by_region_matrix import ProbabilityByRegionMatrix
 from .probability_map import ProbabilityMap
+from .quality_control import QualityControl
+from .rank_tests import RankTests
+from .region_clustering import RegionClustering
+from .region_grouping import RegionGrouping
+from .ridge import DEFAULT_ALPHAS, RidgePredictor
+from .similarity_index import SimilarityIndex
+from .statistic_map import StatisticMap
+from .structural_covariance import StructuralCovariance
 
 
 class CorticalLayersAnalysis:
@@ -18,10 +38,18 @@ class CorticalLayersAnalysis:
     _mean_probability_maps = None
     _std_pbr = None
     _stacked_data = None
+    _cohort_hash = None
+    _structural_covariance = None
+    _rank_tests = None
+    _similarity_index = None
+    _standardized_pbrs = None
+    _distribution = None
     subjects_axis = 2
+    group_cache_size = 32
 
     def __init__(self, pbr_matrices: list):
         self.pbrs = pbr_matrices
+        self._group_cache = OrderedDict()
 
     def get_pbr_by_subject_id(self, subject_id: str):
         result = [pbr for pbr in self.pbrs if pbr.subject_id == subject_id]
@@ -37,6 +65,60 @@ class CorticalLayersAnalysis:
         """
         return np.stack([pbr.data for pbr in self.pbrs], axis=-1)
 
+    def get_region_data(self, region_idx: int) -> np.ndarray:
+        """
+        Returns the class probabilities of a single region across subjects
+
+        :param region_idx: region index
+        :type region_idx: int
+        :return: region class probabilities (class x subject)
+        :rtype: np.ndarray
+        """
+        return self.stacked_pbrs[region_idx]
+
+    def calculate_cohort_hash(self) -> str:
+        """
+        Returns a hash of the subject IDs and stacked data, read in blocks of regions
+
+        :return: cohort hash
+        :rtype: str
+        """
+        cohort_hash = hashlib.sha1(','.join(self.subject_ids).encode())
+        for start in range(0, self.n_regions, 100):
+            cohort_hash.update(np.ascontiguousarray(self.stacked_pbrs[start:start + 100]).data)
+        return cohort_hash.hexdigest()
+
+    def get_cache_dir(self) -> str:
+        """
+        Returns the directory of results derived from the current cohort data
+
+        :return: cache directory path
+        :rtype: str
+        """
+        path = os.path.join(results_dir, 'cache', self.cohort_hash[:16])
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def create_quality_report(self, sum_tolerance: float = 0.01,
+                              z_threshold: float = 3.5) -> pd.DataFrame:
+        """
+        Runs the data quality checks over the whole cohort
+
+        :param sum_tolerance: maximal deviation of a region's class probabilities sum from 1
+        :type sum_tolerance: float
+        :param z_threshold: absolute robust z-score above which a value is an outlier
+        :type z_threshold: float
+        :return: QC report by subject ID (see QualityControl.create_report)
+        :rtype: pd.DataFrame
+        """
+        quality_control = QualityControl(self.stacked_pbrs, self.subject_ids,
+                                         sum_tolerance=sum_tolerance, z_threshold=z_threshold)
+        report = quality_control.create_report()
+        n_failed = (~report['passed']).sum()
+        if n_failed:
+            print(f'WARNING: {n_failed} of {len(report)} subjects failed quality control!')
+        return report
+
     def create_mean_pbr(self) -> ProbabilityByRegionMatrix:
         """
         Returns a ProbabilityByRegionMatrix instance representing the mean across subjects
@@ -44,7 +126,8 @@ class CorticalLayersAnalysis:
         :return: mean probability by region across subjects
         :rtype: ProbabilityByRegionMatrix
         """
-        return ProbabilityByRegionMatrix(from_array=self.stacked_pbrs.mean(axis=self.subjects_axis))
+        mean = self.stacked_pbrs.mean(axis=self.subjects_axis, dtype=precision.accumulation)
+        return ProbabilityByRegionMatrix(from_array=mean)
 
     def create_std_pbr(self) -> ProbabilityByRegionMatrix:
         """
@@ -53,7 +136,204 @@ class CorticalLayersAnalysis:
         :return: STD of class probability by region across subjects
         :rtype: ProbabilityByRegionMatrix
         """
-        return ProbabilityByRegionMatrix(from_array=self.stacked_pbrs.std(axis=self.subjects_axis))
+        std = self.stacked_pbrs.std(axis=self.subjects_axis, dtype=precision.accumulation)
+        return ProbabilityByRegionMatrix(from_array=std)
+
+    def get_subject_mask(self, subject_ids: tuple) -> np.ndarray:
+        """
+        Returns a boolean mask over the subjects axis of the stacked array
+
+        :param subject_ids: subject IDs to include
+        :type subject_ids: tuple
+        :return: subjects mask
+        :rtype: np.ndarray
+        """
+        subject_ids = set(subject_ids)
+        return np.array([subject_id in subject_ids for subject_id in self.subject_ids],
+                        dtype=bool)
+
+    def create_group_aggregates(self, subject_ids: tuple) -> GroupAggregates:
+        """
+        Calculates the mean and STD probability by region of a sub-cohort
+
+        :param subject_ids: IDs of the subjects in the group
+        :type subject_ids: tuple
+        :return: group aggregates
+        :rtype: GroupAggregates
+        """
+        group_data = self.stacked_pbrs[:, :, self.get_subject_mask(subject_ids)]
+        mean = group_data.mean(axis=self.subjects_axis, dtype=precision.accumulation)
+        std = group_data.std(axis=self.subjects_axis, dtype=precision.accumulation)
+        return GroupAggregates(subject_ids, ProbabilityByRegionMatrix(from_array=mean),
+                               ProbabilityByRegionMatrix(from_array=std))
+
+    def get_group_aggregates(self, subject_ids: tuple) -> GroupAggregates:
+        """
+        Returns the (LRU cached) group aggregates of the given subjects
+
+        :param subject_ids: IDs of the subjects in the group
+        :type subject_ids: tuple
+        :return: group aggregates
+        :rtype: GroupAggregates
+        """
+        key = tuple(sorted(set(subject_ids).intersection(self.subject_ids)))
+        if not key:
+            raise ValueError('No probability by region data for the requested subjects!')
+        if key in self._group_cache:
+            self._group_cache.move_to_end(key)
+        else:
+            self._group_cache[key] = self.create_group_aggregates(key)
+            if len(self._group_cache) > self.group_cache_size:
+                self._group_cache.popitem(last=False)
+        return self._group_cache[key]
+
+    def create_group_contrast(self, subject_ids_a: tuple, subject_ids_b: tuple) -> GroupContrast:
+        """
+        Compares two sub-cohorts across all regions and classes
+
+        :param subject_ids_a: IDs of the subjects in the first group
+        :type subject_ids_a: tuple
+        :param subject_ids_b: IDs of the subjects in the second group
+        :type subject_ids_b: tuple
+        :return: group contrast
+        :rtype: GroupContrast
+        """
+        group_a = self.stacked_pbrs[:, :, self.get_subject_mask(subject_ids_a)]
+        group_b = self.stacked_pbrs[:, :, self.get_subject_mask(subject_ids_b)]
+        return GroupContrast(group_a, group_b)
+
+    def get_decomposition(self, n_components: int = 10,
+                          block_size: int = None) -> CohortDecomposition:
+        """
+        Returns the (cohort cached) principal components of the subjects' probability profiles
+
+        :param n_components: number of components
+        :type n_components: int
+        :param block_size: number of regions read at once (None to read all at once)
+        :type block_size: int
+        :return: fitted decomposition
+        :rtype: CohortDecomposition
+        """
+        path = os.path.join(self.get_cache_dir(), f'decomposition_{n_components}.npz')
+        if os.path.isfile(path):
+            return CohortDecomposition.load(path)
+        decomposition = CohortDecomposition(n_components, block_size=block_size)
+        decomposition.fit(self.stacked_pbrs, self.subject_ids)
+        decomposition.save(path)
+        return decomposition
+
+    def get_distribution(self, n_bins: int = 20) -> CohortDistribution:
+        """
+        Returns the (cohort cached) quantiles, histogram counts and percentile ranks of every
+        region x class
+
+        :param n_bins: number of histogram bins
+        :type n_bins: int
+        :return: fitted distribution
+        :rtype: CohortDistribution
+        """
+        path = os.path.join(self.get_cache_dir(), f'distribution_{n_bins}.npz')
+        if os.path.isfile(path):
+            return CohortDistribution.load(path)
+        distribution = CohortDistribution(n_bins=n_bins).fit(self.stacked_pbrs, self.subject_ids)
+        distribution.save(path)
+        return distribution
+
+    def get_region_clusters(self, n_clusters_options=(4, 6, 8, 10, 12), profile: str = 'mean',
+                            batch_size: int = None) -> dict:
+        """
+        Returns (cohort cached) data-driven groupings of the regions by class probability profile
+
+        :param n_clusters_options: numbers of clusters
+        :type n_clusters_options: iterable of int
+        :param profile: cluster by the 'mean' class probabilities or the 'cohort' (every
+        subject's) class probabilities of each region
+        :type profile: str
+        :param batch_size: mini-batch k-means batch size (None for full-batch k-means)
+        :type batch_size: int
+        :return: region grouping by number of clusters
+        :rtype: dict
+        """
+        if profile not in ('mean', 'cohort'):
+            raise ValueError(f'Invalid profile: {profile}! Must be either "mean" or "cohort"')
+        paths = {n_clusters: os.path.join(self.get_cache_dir(),
+                                          f'region_clusters_{profile}_{n_clusters}.npy')
+                 for n_clusters in n_clusters_options}
+        missing = [n_clusters for n_clusters, path in paths.items() if not os.path.isfile(path)]
+        if missing:
+            if profile == 'mean':
+                profiles = self.mean_pbr.data
+            else:
+                profiles = precision.to_accumulation(self.stacked_pbrs).reshape(self.n_regions, -1)
+            results = RegionClustering(batch_size=batch_size).fit(profiles, missing)
+            for n_clusters, (labels, _, _) in results.items():
+                np.save(paths[n_clusters], labels)
+        return {n_clusters: RegionGrouping(np.load(path)) for n_clusters, path in paths.items()}
+
+    def calculate_mean_confidence_interval(self, confidence: float = 0.95,
+                                           n_resamples: int = 2000, batch_size: int = 100,
+                                           seed: int = None, n_workers: int = None) -> tuple:
+        """
+        Returns bootstrap percentile confidence intervals of the mean probability by region (the
+        corresponding maps may be created with create_all_class_probability_maps())
+
+        :param confidence: confidence level
+        :type confidence: float
+        :param n_resamples: number of resamples
+        :type n_resamples: int
+        :param batch_size: number of resamples computed at once by each worker
+        :type batch_size: int
+        :param seed: random seed
+        :type seed: int
+        :param n_workers: number of worker processes
+        :type n_workers: int
+        :return: lower and upper bounds
+        :rtype: tuple of ProbabilityByRegionMatrix instances
+        """
+        engine = BootstrapEngine(self.stacked_pbrs, n_resamples=n_resamples,
+                                 batch_size=batch_size, seed=seed, n_workers=n_workers)
+        lower, upper = engine.calculate_confidence_interval(confidence)
+        return ProbabilityByRegionMatrix(from_array=lower), ProbabilityByRegionMatrix(
+            from_array=upper)
+
+    def calculate_contrast_clusters(self, subject_ids_a: tuple, subject_ids_b: tuple,
+                                    class_idx: int, threshold: float = 0.01,
+                                    n_permutations: int = 1000, seed: int = None,
+                                    atlas: BrainAtlas = atlas) -> tuple:
+        """
+        Finds clusters of adjacent regions with uncorrected Welch's t-test p-values below the
+        threshold and corrects their extent (in voxels) against a group label permutation null
+
+        :param subject_ids_a: IDs of the subjects in the first group
+        :type subject_ids_a: tuple
+        :param subject_ids_b: IDs of the subjects in the second group
+        :type subject_ids_b: tuple
+        :param class_idx: class index
+        :type class_idx: int
+        :param threshold: cluster forming p-value threshold
+        :type threshold: float
+        :param n_permutations: number of permutations
+        :type n_permutations: int
+        :param seed: random seed
+        :type seed: int
+        :param atlas: brain atlas defining region adjacency
+        :type atlas: BrainAtlas
+        :return: cluster label by region and a table of cluster extents and p-values
+        :rtype: tuple
+        """
+        mask_a = self.get_subject_mask(subject_ids_a)
+        mask_b = self.get_subject_mask(subject_ids_b)
+        data = self.stacked_pbrs[:, class_idx, mask_a | mask_b]
+        in_a = mask_a[mask_a | mask_b]
+
+        def get_significant(group_mask: np.ndarray) -> np.ndarray:
+            return welch_t_test(data[:, group_mask], data[:, ~group_mask])[2] < threshold
+
+        rng = np.random.default_rng(seed)
+        inference = ClusterInference(atlas.adjacency, weights=atlas.get_region_voxel_counts())
+        null_distribution = inference.create_null_distribution(
+            get_significant(rng.permutation(in_a)) for _ in range(n_permutations))
+        return inference.test_clusters(get_significant(in_a), null_distribution)
 
     def create_mean_probability_map(self, class_idx: int) -> ProbabilityMap:
         return self.mean_pbr.create_class_probability_map(class_idx)
@@ -82,40 +362,102 @@ class CorticalLayersAnalysis:
         dir_path = os.path.join(results_dir, 'mean')
         files = glob.glob(os.path.join(dir_path, '*.npy'))
         if os.path.isdir(dir_path) and files:
-            return self.load_probability_maps(files)
+            probability_maps = self.load_probability_maps(files)
+            for probability_map in probability_maps:
+                class_idx = int(probability_map.class_idx)
+                probability_map.region_values = self.mean_pbr.data[:, class_idx]
+            return probability_maps
 
     def calculate_region_mlr_model(self, region_idx: int, scores: pd.DataFrame):
         columns = [f'class_{class_idx}' for class_idx in range(1, n_classes + 1)]
-        index = [pbr.subject_id for pbr in self.pbrs]
-        X = pd.DataFrame(columns=columns, index=index)
+        X = pd.DataFrame(self.get_region_data(region_idx).T, columns=columns,
+                         index=self.subject_ids)
         scores = scores[scores.index.isin(X.index)]
-        for subject_id, score in scores.iterrows():
-            pbr = self.get_pbr_by_subject_id(subject_id)
-            if isinstance(pbr, ProbabilityByRegionMatrix):
-                X.loc[subject_id] = pbr.data[region_idx, :]
-        X = X.dropna()
+        X = X[X.index.isin(scores.index)]
         model = sm.OLS(scores, X.astype(float)).fit()
         # predictions = model.predict(X)
         return model  # , predictions
 
+    def calculate_regions_lm_results(self, regions: range, scores: pd.DataFrame) -> list:
+        """
+        Fits the linear model of each of the given regions
+
+        :param regions: region indices
+        :type regions: range
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: (R-squared, adjusted R-squared, p-values) tuple by region
+        :rtype: list
+        """
+        results = []
+        for region_idx in regions:
+            model = self.calculate_region_mlr_model(region_idx, scores)
+            results.append((model.rsquared, model.rsquared_adj, model.pvalues))
+        return results
+
     def calculate_linear_model_dict(self, scores: pd.DataFrame):
         results_dict = {'region': [], 'rsquared': [], 'rsquared_adj': [], 'pvalues': []}
-        for region_idx in range(1000):
-            model = self.calculate_region_mlr_model(region_idx, scores)
+        regions = range(self.n_regions)
+        region_results = self.calculate_regions_lm_results(regions, scores)
+        for region_idx, (rsquared, rsquared_adj, pvalues) in zip(regions, region_results):
             results_dict['region'].append(region_idx)
-            results_dict['rsquared'].append(model.rsquared)
-            results_dict['rsquared_adj'].append(model.rsquared_adj)
-            results_dict['pvalues'].append(model.pvalues)
+            results_dict['rsquared'].append(rsquared)
+            results_dict['rsquared_adj'].append(rsquared_adj)
+            results_dict['pvalues'].append(pvalues)
 
         # Fix for multiple comparisons
-        results_dict['corr_pvalues'] = np.zeros((1000, 6))
-        for class_idx in range(6):
+        results_dict['corr_pvalues'] = np.zeros((self.n_regions, n_classes))
+        for class_idx in range(n_classes):
             class_pvalues = [value[class_idx] for value in results_dict['pvalues']]
             corrected_pvalues = fdrcorrection(class_pvalues)[1]
             results_dict['corr_pvalues'][:, class_idx] = corrected_pvalues
         results_dict['corr_pvalues'] = results_dict['corr_pvalues'].tolist()
         return results_dict
 
+    def calculate_influence(self, scores: pd.DataFrame) -> RegressionInfluence:
+        """
+        Calculates the influence diagnostics of every subject in each region's linear model
+
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: influence diagnostics (see RegressionInfluence.get_influential_subjects)
+        :rtype: RegressionInfluence
+        """
+        return RegressionInfluence(self.stacked_pbrs, self.subject_ids).fit(scores)
+
+    def screen_correlations(self, features: pd.DataFrame,
+                            covariates: pd.DataFrame = None) -> CorrelationScreen:
+        """
+        Screens the (partial) correlations of every region x class probability with every measure
+
+        :param features: measures by subject ID (one column per measure)
+        :type features: pd.DataFrame
+        :param covariates: covariates to partial out by subject ID
+        :type covariates: pd.DataFrame
+        :return: fitted screen (see CorrelationScreen.get_significant)
+        :rtype: CorrelationScreen
+        """
+        screen = CorrelationScreen(self.stacked_pbrs, self.subject_ids,
+                                   standardized=self.standardized_pbrs)
+        return screen.fit(features, covariates)
+
+    def fit_ridge(self, scores: pd.DataFrame, alphas: np.ndarray = DEFAULT_ALPHAS,
+                  n_folds: int = 5) -> RidgePredictor:
+        """
+        Predicts scores from all (region x class) features with cross-validated ridge regression
+
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :param alphas: penalties to evaluate
+        :type alphas: np.ndarray
+        :param n_folds: number of cross-validation folds
+        :type n_folds: int
+        :return: fitted predictor (see RidgePredictor.cv_r2 and RidgePredictor.create_weight_maps)
+        :rtype: RidgePredictor
+        """
+        return RidgePredictor(alphas, n_folds=n_folds).fit(self.stacked_pbrs, self.subject_ids,
+                                                            scores)
+
     def calculate_linear_model(self, scores: pd.DataFrame):
         results_dict = self.calculate_linear_model_dict(scores)
         df = pd.DataFrame.from_dict(results_dict)
@@ -132,9 +474,8 @@ class CorticalLayersAnalysis:
 
 
     def get_class_probability_by_region_per_subject(self, class_idx: int, region_idx: int):
-        probability_dict = {pbr.subject_id: pbr.data[region_idx, class_idx] for pbr in self.pbrs}
-        return pd.DataFrame(data=list(probability_dict.values()),
-                            index=list(probability_dict.keys()))
+        return pd.DataFrame(data=self.stacked_pbrs[region_idx, class_idx, :],
+                            index=self.subject_ids)
 
     def region_anova(self, class_probability: pd.DataFrame,
                      categorical_df: pd.DataFrame) -> pd.DataFrame:
@@ -146,22 +487,164 @@ class CorticalLayersAnalysis:
     def calculate_effect_size(self, aov_table: pd.DataFrame):
         return aov_table['sum_sq'][0] / (aov_table['sum_sq'][0] + aov_table['sum_sq'][1])
 
-    def calculate_anova(self, class_idx: int, categorical_df: pd.DataFrame):
-        results_dict = {'region_idx': list(range(1000)), 'F': [], 'p': []}
-        for region_idx in range(1000):
+    def calculate_regions_anova(self, class_idx: int, regions: range,
+                                categorical_df: pd.DataFrame) -> list:
+        """
+        Runs a one-way ANOVA of the class probability by group for each of the given regions
+
+        :param class_idx: class index
+        :type class_idx: int
+        :param regions: region indices
+        :type regions: range
+        :param categorical_df: group by subject ID
+        :type categorical_df: pd.DataFrame
+        :return: (F, p) tuple by region
+        :rtype: list
+        """
+        results = []
+        for region_idx in regions:
             region_class_probability = self.get_class_probability_by_region_per_subject(class_idx,
                                                                                         region_idx)
             aov_table = self.region_anova(region_class_probability, categorical_df)
-            results_dict['F'].append(aov_table.loc['group', 'F'])
-            results_dict['p'].append(aov_table.loc['group', 'PR(>F)'])
+            results.append((aov_table.loc['group', 'F'], aov_table.loc['group', 'PR(>F)']))
+        return results
+
+    def calculate_anova(self, class_idx: int, categorical_df: pd.DataFrame):
+        regions = range(self.n_regions)
+        region_results = self.calculate_regions_anova(class_idx, regions, categorical_df)
+        results_dict = {'region_idx': list(regions),
+                        'F': [f for f, _ in region_results],
+                        'p': [p for _, p in region_results]}
+        return pd.DataFrame.from_dict(results_dict).set_index('region_idx')
+
+    def create_rank_results(self, results: dict, class_idx: int) -> pd.DataFrame:
+        results_dict = {name: values[:, class_idx] for name, values in results.items()}
+        results_dict['region_idx'] = list(range(self.n_regions))
         return pd.DataFrame.from_dict(results_dict).set_index('region_idx')
 
+    def calculate_kruskal_wallis(self, class_idx: int, categorical_df: pd.DataFrame):
+        """
+        Rank-based alternative to calculate_anova (Kruskal-Wallis H test by group)
+
+        :param class_idx: class index
+        :type class_idx: int
+        :param categorical_df: group by subject ID
+        :type categorical_df: pd.DataFrame
+        :return: H and p by region index
+        :rtype: pd.DataFrame
+        """
+        return self.create_rank_results(self.rank_tests.kruskal_wallis(categorical_df), class_idx)
+
+    def calculate_spearman(self, class_idx: int, scores: pd.DataFrame):
+        """
+        Rank-based alternative to the linear model of a single score (Spearman correlation)
+
+        :param class_idx: class index
+        :type class_idx: int
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: rho and p by region index
+        :rtype: pd.DataFrame
+        """
+        return self.create_rank_results(self.rank_tests.spearman(scores), class_idx)
+
+    def fit_glm(self, design, covariates: pd.DataFrame = None) -> GeneralLinearModel:
+        """
+        Fits a mass-univariate general linear model of the class probabilities of every region
+
+        :param design: right-hand side formula (evaluated over the covariates) or design matrix
+        indexed by subject ID
+        :type design: str or pd.DataFrame
+        :param covariates: covariates by subject ID (required for formulas)
+        :type covariates: pd.DataFrame
+        :return: fitted model (see GeneralLinearModel.test_contrasts)
+        :rtype: GeneralLinearModel
+        """
+        if isinstance(design, str):
+            model = GeneralLinearModel.from_formula(design, covariates)
+        else:
+            model = GeneralLinearModel(design)
+        return model.fit(self.stacked_pbrs, self.subject_ids)
+
+    def save_statistic_volumes(self, statistics: dict, output_dir: str,
+                               atlas: BrainAtlas = atlas) -> list:
+        """
+        Projects region-level statistics (e.g. GroupContrast or GeneralLinearModel.test_contrast
+        results) onto the atlas and saves a NIfTI volume of each statistic and class. The
+        subjects' data are region-wise, so these projections are the voxel-level results: testing
+        every voxel of a region would only repeat the region's test and weight the FDR
+        correction by region size
+
+        :param statistics: statistic arrays (region x class) by name
+        :type statistics: dict
+        :param output_dir: directory to write the volumes to
+        :type output_dir: str
+        :param atlas: brain atlas to project onto
+        :type atlas: BrainAtlas
+        :return: paths of the written volumes
+        :rtype: list
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        for name, values in statistics.items():
+            for class_idx in range(n_classes):
+                data = atlas.convert_from_array(np.asarray(values)[:, class_idx], cropped=True)
+                path = os.path.join(output_dir, f'{name}_class_{class_idx}.nii')
+                StatisticMap(data, class_idx, name, atlas=atlas).save_nifti(path)
+                paths.append(path)
+        return paths
+
     @property
     def stacked_pbrs(self) -> np.ndarray:
         if not isinstance(self._stacked_data, np.ndarray):
             self._stacked_data = self.get_stacked_pbrs()
         return self._stacked_data
 
+    @property
+    def subject_ids(self) -> list:
+        return [pbr.subject_id for pbr in self.pbrs]
+
+    @property
+    def n_regions(self) -> int:
+        return self.stacked_pbrs.shape[0]
+
+    @property
+    def cohort_hash(self) -> str:
+        if not isinstance(self._cohort_hash, str):
+            self._cohort_hash = self.calculate_cohort_hash()
+        return self._cohort_hash
+
+    @property
+    def structural_covariance(self) -> StructuralCovariance:
+        if not isinstance(self._structural_covariance, StructuralCovariance):
+            cache_dir = os.path.join(self.get_cache_dir(), 'structural_covariance')
+            self._structural_covariance = StructuralCovariance(self.stacked_pbrs, cache_dir)
+        return self._structural_covariance
+
+    @property
+    def rank_tests(self) -> RankTests:
+        if not isinstance(self._rank_tests, RankTests):
+            self._rank_tests = RankTests(self.stacked_pbrs, self.subject_ids)
+        return self._rank_tests
+
+    @property
+    def similarity_index(self) -> SimilarityIndex:
+        if not isinstance(self._similarity_index, SimilarityIndex):
+            self._similarity_index = SimilarityIndex().build(self.stacked_pbrs, self.subject_ids)
+        return self._similarity_index
+
+    @property
+    def distribution(self) -> CohortDistribution:
+        if not isinstance(self._distribution, CohortDistribution):
+            self._distribution = self.get_distribution()
+        return self._distribution
+
+    @property
+    def standardized_pbrs(self) -> np.ndarray:
+        if not isinstance(self._standardized_pbrs, np.ndarray):
+            self._standardized_pbrs = standardize(self.stacked_pbrs)
+        return self._standardized_pbrs
+
     @property
     def mean_pbr(self):
         if not isinstance(self._mean_pbr, ProbabilityByRegionMatrix):
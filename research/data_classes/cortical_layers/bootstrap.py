@@ -0,0 +1,149 @@
+import os
+import tempfile
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from .cfg import precision
+
+_data = None
+
+
+def init_worker(path: str) -> None:
+    """
+    Memory-maps the (feature x subject) storage precision data once per worker process
+    """
+    global _data
+    data = np.load(path, mmap_mode='r')
+    _data = data.reshape(-1, data.shape[-1])
+
+
+def draw_resample_weights(rng: np.random.Generator, batch_size: int, n_subjects: int):
+    """
+    Draws a batch of subject resamples (with replacement) as index arrays and returns the number
+    of times each subject is drawn in each resample
+
+    :param rng: random number generator
+    :type rng: np.random.Generator
+    :param batch_size: number of resamples
+    :type batch_size: int
+    :param n_subjects: number of subjects
+    :type n_subjects: int
+    :return: subject counts (resample x subject)
+    :rtype: np.ndarray
+    """
+    indices = rng.integers(0, n_subjects, size=(batch_size, n_subjects))
+    indices += np.arange(batch_size)[:, np.newaxis] * n_subjects
+    counts = np.bincount(indices.ravel(), minlength=batch_size * n_subjects)
+    return counts.reshape(batch_size, n_subjects)
+
+
+def bootstrap_block(features: slice, seeds: list, batch_sizes: list,
+                    percentiles: list) -> np.ndarray:
+    """
+    Calculates the bootstrap percentiles of a block of features' means, drawing the resamples
+    batch by batch from the given seeds (so every block sees the same resamples)
+
+    :param features: feature indices of the block
+    :type features: slice
+    :param seeds: seeds of the batches' random number streams
+    :type seeds: list of np.random.SeedSequence
+    :param batch_sizes: number of resamples in each batch
+    :type batch_sizes: list
+    :param percentiles: percentiles to calculate
+    :type percentiles: list
+    :return: percentiles of the resampled means (percentile x feature)
+    :rtype: np.ndarray
+    """
+    data = precision.to_accumulation(_data[features])
+    n_subjects = data.shape[1]
+    distribution = np.empty((len(data), sum(batch_sizes)), dtype=np.float32)
+    start = 0
+    for seed, batch_size in zip(seeds, batch_sizes):
+        counts = draw_resample_weights(np.random.default_rng(seed), batch_size, n_subjects)
+        distribution[:, start:start + batch_size] = data @ counts.T / n_subjects
+        start += batch_size
+    return np.percentile(distribution, percentiles, axis=1)
+
+
+class BootstrapEngine:
+    def __init__(self, stacked_pbrs: np.ndarray, n_resamples: int = 2000, batch_size: int = 100,
+                 seed: int = None, n_workers: int = None):
+        """
+        Bootstrap distribution of the mean class probability by region, computed in vectorized
+        batches of resamples for blocks of features spread across a process pool. Workers share
+        the data through a memory-mapped file and read one block at a time.
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param n_resamples: number of resamples
+        :type n_resamples: int
+        :param batch_size: number of resamples per batch, which bounds each worker's memory to
+        about that many resampled means of every feature
+        :type batch_size: int
+        :param seed: random seed (each batch gets an independent stream spawned from it)
+        :type seed: int
+        :param n_workers: number of worker processes (defaults to the number of CPUs)
+        :type n_workers: int
+        """
+        self.stacked_pbrs = stacked_pbrs
+        self.shape = stacked_pbrs.shape[:-1]
+        self.n_features = int(np.prod(self.shape))
+        self.n_resamples = n_resamples
+        self.batch_size = batch_size
+        self.seed = seed
+        self.n_workers = n_workers or os.cpu_count()
+
+    def get_batch_sizes(self) -> list:
+        n_full, remainder = divmod(self.n_resamples, self.batch_size)
+        return [self.batch_size] * n_full + ([remainder] if remainder else [])
+
+    def get_feature_blocks(self) -> list:
+        """
+        Splits the features into blocks whose whole bootstrap distribution holds as many values
+        as one batch of resamples of all features, bounding memory by the batch size
+
+        :return: feature blocks
+        :rtype: list of slices
+        """
+        block_size = max(1, self.n_features * self.batch_size // self.n_resamples)
+        return [slice(start, min(start + block_size, self.n_features))
+                for start in range(0, self.n_features, block_size)]
+
+    def calculate_percentiles(self, percentiles: list) -> np.ndarray:
+        """
+        Returns percentiles of the bootstrap distribution of the means, computed one block of
+        features at a time so the full distribution is never held in memory
+
+        :param percentiles: percentiles to calculate
+        :type percentiles: list
+        :return: percentiles (percentile x feature)
+        :rtype: np.ndarray
+        """
+        batch_sizes = self.get_batch_sizes()
+        seeds = np.random.SeedSequence(self.seed).spawn(len(batch_sizes))
+        blocks = self.get_feature_blocks()
+        results = np.empty((len(percentiles), self.n_features))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'stacked_pbrs.npy')
+            np.save(path, precision.to_storage(self.stacked_pbrs))
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=init_worker,
+                                     initargs=(path,)) as executor:
+                futures = [executor.submit(bootstrap_block, block, seeds, batch_sizes,
+                                           percentiles) for block in blocks]
+                for block, future in zip(blocks, futures):
+                    results[:, block] = future.result()
+        return results
+
+    def calculate_confidence_interval(self, confidence: float = 0.95) -> tuple:
+        """
+        Returns percentile bootstrap confidence intervals of the means
+
+        :param confidence: confidence level
+        :type confidence: float
+        :return: lower and upper bounds (region x class)
+        :rtype: tuple
+        """
+        alpha = (1 - confidence) / 2 * 100
+        lower, upper = self.calculate_percentiles([alpha, 100 - alpha])
+        return lower.reshape(self.shape), upper.reshape(self.shape)
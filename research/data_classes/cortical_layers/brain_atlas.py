@@ -1,19 +1,28 @@
 import nibabel as nib
 import numpy as np
+import scipy.sparse as sparse
+
+from .precision import PrecisionPolicy
 
 
 class BrainAtlas:
     _template = None
+    _affine = None
+    _adjacency = None
+    _bounding_box = None
 
-    def __init__(self, name: str, path: str):
+    def __init__(self, name: str, path: str, precision: PrecisionPolicy = None):
+        if precision is None:
+            from .cfg import precision
         self.name = name
         self.path = path
+        self.precision = precision
         self.region_ids = np.unique(self.template)
         self.n_regions = len(self.region_ids)
 
     def convert_from_dict(self, value_dict: dict) -> np.ndarray:
         linear_template = self.template.ravel()
-        new_array = np.zeros(linear_template.shape)
+        new_array = np.zeros(linear_template.shape, dtype=self.precision.storage)
         if 0 in value_dict:
             keys = [key + 1 for key in value_dict.keys()]
             subtract = True
@@ -27,8 +36,148 @@ class BrainAtlas:
                 new_array[linear_template == region_id] = value_dict[key]
         return new_array.reshape(self.template.shape)
 
+    def convert_from_array(self, values: np.ndarray, cropped: bool = False) -> np.ndarray:
+        """
+        Projects values by region index (region ID - 1) onto the template using a lookup table
+
+        :param values: value by region index
+        :type values: np.ndarray
+        :param cropped: project onto the template's bounding box only (see crop_offset)
+        :type cropped: bool
+        :return: projected volume
+        :rtype: np.ndarray
+        """
+        lookup_table = np.zeros(int(self.template.max()) + 1, dtype=self.precision.storage)
+        n_values = min(len(values), len(lookup_table) - 1)
+        lookup_table[1:n_values + 1] = values[:n_values]
+        template = self.template[self.bounding_box] if cropped else self.template
+        return lookup_table[template]
+
+    def get_bounding_box(self) -> tuple:
+        """
+        Returns the tight bounding box of the labeled template voxels
+
+        :return: slice by axis
+        :rtype: tuple
+        """
+        labeled = self.template > 0
+        bounding_box = []
+        for axis in range(labeled.ndim):
+            other_axes = tuple(i for i in range(labeled.ndim) if i != axis)
+            indices = np.flatnonzero(labeled.any(axis=other_axes))
+            if len(indices):
+                bounding_box.append(slice(int(indices[0]), int(indices[-1]) + 1))
+            else:
+                bounding_box.append(slice(0, 0))
+        return tuple(bounding_box)
+
+    def get_crop_offset(self, shape: tuple) -> tuple:
+        """
+        Infers the offset of a volume in template space from its shape
+
+        :param shape: volume shape
+        :type shape: tuple
+        :return: template coordinates of the volume's origin
+        :rtype: tuple
+        """
+        if tuple(shape) == self.cropped_shape:
+            return self.crop_offset
+        return (0,) * len(shape)
+
+    def create_region_adjacency(self) -> sparse.csr_matrix:
+        """
+        Creates the region adjacency graph by comparing the template with itself shifted by one
+        voxel along each axis (face connectivity)
+
+        :return: symmetric boolean adjacency matrix by region index (region ID - 1)
+        :rtype: sparse.csr_matrix
+        """
+        template = self.template
+        n_labels = int(template.max())
+        rows, columns = [], []
+        for axis in range(template.ndim):
+            lower = [slice(None)] * template.ndim
+            upper = [slice(None)] * template.ndim
+            lower[axis] = slice(None, -1)
+            upper[axis] = slice(1, None)
+            labels_a = template[tuple(lower)].ravel()
+            labels_b = template[tuple(upper)].ravel()
+            border = (labels_a != labels_b) & (labels_a > 0) & (labels_b > 0)
+            rows.append(labels_a[border].astype(np.intp) - 1)
+            columns.append(labels_b[border].astype(np.intp) - 1)
+        rows, columns = np.concatenate(rows), np.concatenate(columns)
+        ones = np.ones(len(rows), dtype=bool)
+        adjacency = sparse.coo_matrix((ones, (rows, columns)), shape=(n_labels, n_labels)).tocsr()
+        return ((adjacency + adjacency.T) > 0).tocsr()
+
+    def get_region_voxel_counts(self) -> np.ndarray:
+        """
+        Returns the number of template voxels of each region by region index (region ID - 1)
+
+        :return: voxel counts
+        :rtype: np.ndarray
+        """
+        return np.bincount(self.template.ravel(), minlength=int(self.template.max()) + 1)[1:]
+
+    def get_region_centroids(self) -> np.ndarray:
+        """
+        Returns the world (affine transformed) coordinates of each region's centroid by region
+        index (NaN for regions with no voxels)
+
+        :return: centroids (region x axis)
+        :rtype: np.ndarray
+        """
+        coordinates = np.nonzero(self.template)
+        labels = self.template[coordinates].astype(np.intp)
+        n_labels = int(self.template.max()) + 1
+        counts = np.bincount(labels, minlength=n_labels)[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centroids = np.column_stack([
+                np.bincount(labels, weights=axis_coordinates, minlength=n_labels)[1:] / counts
+                for axis_coordinates in coordinates])
+        homogeneous = np.column_stack([centroids, np.ones(len(centroids))])
+        return (homogeneous @ self.affine.T)[:, :3]
+
+    def read_template(self) -> np.ndarray:
+        """
+        Reads the template labels, stored in the smallest sufficient integer data type
+
+        :return: template labels
+        :rtype: np.ndarray
+        """
+        data = np.asarray(nib.load(self.path).get_data())
+        if np.array_equal(data, np.round(data)) and data.min() >= 0:
+            return data.astype(np.min_scalar_type(int(data.max())))
+        return data
+
+    @property
+    def affine(self) -> np.ndarray:
+        if not isinstance(self._affine, np.ndarray):
+            self._affine = nib.load(self.path).affine
+        return self._affine
+
+    @property
+    def adjacency(self) -> sparse.csr_matrix:
+        if not isinstance(self._adjacency, sparse.csr_matrix):
+            self._adjacency = self.create_region_adjacency()
+        return self._adjacency
+
+    @property
+    def bounding_box(self) -> tuple:
+        if not isinstance(self._bounding_box, tuple):
+            self._bounding_box = self.get_bounding_box()
+        return self._bounding_box
+
+    @property
+    def crop_offset(self) -> tuple:
+        return tuple(axis_slice.start for axis_slice in self.bounding_box)
+
+    @property
+    def cropped_shape(self) -> tuple:
+        return tuple(axis_slice.stop - axis_slice.start for axis_slice in self.bounding_box)
+
     @property
     def template(self) -> np.ndarray:
         if not isinstance(self._template, np.ndarray):
-            self._template = nib.load(self.path).get_data()
+            self._template = self.read_template()
         return self._template
@@ -4,9 +4,21 @@ import numpy as np
 class BrainMatrix:
     slice_planes = ['sagittal', 'coronal', 'horizontal']
 
-    def __init__(self, data: np.ndarray, info: dict = None):
+    def __init__(self, data: np.ndarray, info: dict = None, offset: tuple = None):
+        """
+        A volume that may be a crop of a larger (template) space, in which case slice indices
+        and voxel coordinates are given in that space
+
+        :param data: volume data
+        :type data: np.ndarray
+        :param info: additional information
+        :type info: dict
+        :param offset: template space coordinates of the volume's origin (defaults to zeros)
+        :type offset: tuple
+        """
         self.data = data
         self.info = info
+        self.offset = tuple(offset) if offset is not None else (0,) * data.ndim
 
     def get_sagittal_slice(self, i_slice: int):
         return np.fliplr(np.rot90(self.data[i_slice, :, :], 3))
@@ -18,12 +30,46 @@ class BrainMatrix:
         return np.rot90(self.data[:, :, i_slice], 3)
 
     def create_slice(self, plane: str, i_slice: int):
-        return self.get_slicer_function(plane)(i_slice)
+        """
+        Returns a slice by its template space index (empty if outside the volume)
+
+        :param plane: 'sagittal', 'coronal' or 'horizontal'
+        :type plane: str
+        :param i_slice: template space slice index
+        :type i_slice: int
+        :return: slice image
+        :rtype: np.ndarray
+        """
+        axis = self.slice_planes.index(plane)
+        local_idx = i_slice - self.offset[axis]
+        n_slices = self.data.shape[axis]
+        slice_image = self.get_slicer_function(plane)(min(max(local_idx, 0), n_slices - 1))
+        if 0 <= local_idx < n_slices:
+            return slice_image
+        return np.zeros_like(slice_image)
+
+    def create_display_slice(self, plane: str, i_slice: int):
+        return self.create_slice(plane, i_slice)
 
     def get_slicer_function(self, plane: str):
         return getattr(self, f'get_{plane}_slice')
 
     def get_multi_planar(self, i_sagittal: int, i_coronal: int, i_horizontal: int):
-        return [self.get_sagittal_slice(i_sagittal),
-                self.get_coronal_slice(i_coronal),
-                self.get_horizontal_slice(i_horizontal)]
+        return [self.create_slice('sagittal', i_sagittal),
+                self.create_slice('coronal', i_coronal),
+                self.create_slice('horizontal', i_horizontal)]
+
+    def get_voxel_values(self, coordinates: np.ndarray) -> np.ndarray:
+        """
+        Returns the values at template space voxel coordinates (NaN outside the volume)
+
+        :param coordinates: voxel coordinates (voxel x axis)
+        :type coordinates: np.ndarray
+        :return: values by voxel
+        :rtype: np.ndarray
+        """
+        local = np.asarray(coordinates) - np.array(self.offset)
+        inside = np.all((local >= 0) & (local < self.data.shape), axis=1)
+        values = np.full(len(local), np.nan)
+        values[inside] = self.data[tuple(local[inside].T)]
+        return values
@@ -1,13 +1,23 @@
 import os
 
 from .brain_atlas import BrainAtlas
+from .precision import PrecisionPolicy
 
 
 n_classes = 6
 
+# Storage, display and accumulation data types (the compact 'float16' or 'uint8' display modes
+# are opt-in, as Bokeh's binary array transport has no float16 path and expects float images)
+precision = PrecisionPolicy(storage='float32', display='float32', accumulation='float64')
+
 cortical_layers_data = os.path.normpath(os.path.abspath('./research/data_classes/cortical_layers/data'))
 results_dir = os.path.normpath(os.path.abspath('./research/data_classes/cortical_layers/results'))
+stacked_store_path = os.path.join(results_dir, 'stacked_pbrs.npy')
+
+# Memory budget (in bytes) for chunked (out-of-core) analysis
+memory_budget = 512 * 1024 ** 2
 
 surface_template_path = os.path.normpath(os.path.abspath('./research/data_classes/cortical_layers/templates/surface_template.nii'))
+surface_mapping_path = os.path.join(results_dir, 'surface_mapping.npz')
 aal_1000_path = os.path.normpath(os.path.abspath('./research/data_classes/cortical_layers/templates/AAL1000.nii'))
-atlas = BrainAtlas(name='AAL', path=aal_1000_path)
\ No newline at end of file
+atlas = BrainAtlas(name='AAL', path=aal_1000_path, precision=precision)
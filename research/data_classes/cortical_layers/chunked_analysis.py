@@ -0,0 +1,200 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor
+from .analysis import CorticalLayersAnalysis
+from .cfg import n_classes, precision, memory_budget, stacked_store_path
+from .probability_by_region_matrix import ProbabilityByRegionMatrix
+
+SUBJECT_IDS_SUFFIX = '_subject_ids.npy'
+MANIFEST_SUFFIX = '_manifest.json'
+
+
+def build_store(files: list, store_path: str = stacked_store_path) -> None:
+    """
+    Streams probability by region matrix files one at a time into a memory-mapped stacked array
+    (region x class x subject) with the subject IDs saved alongside it
+
+    :param files: probability by region matrix files
+    :type files: list
+    :param store_path: destination .npy path
+    :type store_path: str
+    :return:
+    """
+    if os.path.isfile(get_manifest_path(store_path)):
+        os.remove(get_manifest_path(store_path))
+    first = ProbabilityByRegionMatrix(from_file=files[0])
+    shape = first.data.shape + (len(files),)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    store = np.lib.format.open_memmap(store_path, mode='w+', dtype=precision.storage, shape=shape)
+    subject_ids = []
+    for subject_idx, file in enumerate(files):
+        pbr = first if subject_idx == 0 else ProbabilityByRegionMatrix(from_file=file)
+        store[:, :, subject_idx] = pbr.data
+        subject_ids.append(pbr.subject_id)
+    store.flush()
+    del store
+    np.save(get_subject_ids_path(store_path), np.array(subject_ids))
+    # Written last, so an interrupted build is never mistaken for a current store
+    with open(get_manifest_path(store_path), 'w') as f:
+        json.dump(create_manifest(files), f)
+
+
+def get_subject_ids_path(store_path: str) -> str:
+    return store_path[:-len('.npy')] + SUBJECT_IDS_SUFFIX
+
+
+def get_manifest_path(store_path: str) -> str:
+    return store_path[:-len('.npy')] + MANIFEST_SUFFIX
+
+
+def create_manifest(files: list) -> list:
+    """
+    Returns the path, modification time and size of each file the store is built from
+
+    :param files: probability by region matrix files
+    :type files: list
+    :return: [path, modification time (ns), size] by file
+    :rtype: list
+    """
+    manifest = []
+    for file in files:
+        stat = os.stat(file)
+        manifest.append([os.path.abspath(file), stat.st_mtime_ns, stat.st_size])
+    return manifest
+
+
+def is_store_current(files: list, store_path: str = stacked_store_path) -> bool:
+    """
+    Checks whether a store was built from the given files in their current state
+
+    :param files: probability by region matrix files
+    :type files: list
+    :param store_path: memory-mapped stacked array path
+    :type store_path: str
+    :return: whether the store is current
+    :rtype: bool
+    """
+    manifest_path = get_manifest_path(store_path)
+    if not all(os.path.isfile(path) for path in
+               (store_path, get_subject_ids_path(store_path), manifest_path)):
+        return False
+    with open(manifest_path) as f:
+        return json.load(f) == create_manifest(files)
+
+
+def calculate_lm_block(store_path: str, regions: range, scores: pd.DataFrame) -> list:
+    analysis = ChunkedCorticalLayersAnalysis(store_path=store_path)
+    return CorticalLayersAnalysis.calculate_regions_lm_results(analysis, regions, scores)
+
+
+def calculate_anova_block(store_path: str, regions: range, class_idx: int,
+                          categorical_df: pd.DataFrame) -> list:
+    analysis = ChunkedCorticalLayersAnalysis(store_path=store_path)
+    return CorticalLayersAnalysis.calculate_regions_anova(analysis, class_idx, regions,
+                                                          categorical_df)
+
+
+class ChunkedCorticalLayersAnalysis(CorticalLayersAnalysis):
+    def __init__(self, files: list = None, store_path: str = stacked_store_path,
+                 memory_budget: int = memory_budget, n_workers: int = None):
+        """
+        Cortical layers analysis over a memory-mapped stacked array, processing regions in
+        blocks to keep memory bounded. Results are identical to the in-memory analysis.
+
+        :param files: probability by region matrix files to (re)build the store from if the
+        store does not exist yet or was built from a different set or version of the files
+        :type files: list
+        :param store_path: memory-mapped stacked array path
+        :type store_path: str
+        :param memory_budget: maximal number of bytes of stacked data held at once
+        :type memory_budget: int
+        :param n_workers: number of worker processes for region blocks (defaults to the number
+        of CPUs)
+        :type n_workers: int
+        """
+        super(ChunkedCorticalLayersAnalysis, self).__init__([])
+        self.store_path = store_path
+        self.memory_budget = memory_budget
+        self.n_workers = n_workers or os.cpu_count()
+        if files and not is_store_current(files, store_path):
+            build_store(files, store_path)
+        self._stacked_data = np.load(store_path, mmap_mode='r')
+        self._subject_ids = np.load(get_subject_ids_path(store_path)).tolist()
+
+    def get_region_blocks(self, regions: range = None, n_workers: int = 1) -> list:
+        """
+        Splits regions into blocks that fit in the memory budget (divided between workers)
+
+        :param regions: region indices (defaults to all regions)
+        :type regions: range
+        :param n_workers: number of workers holding a block simultaneously
+        :type n_workers: int
+        :return: region blocks
+        :rtype: list of ranges
+        """
+        regions = regions if regions is not None else range(self.n_regions)
+        region_bytes = n_classes * len(self.subject_ids) * precision.accumulation.itemsize
+        block_size = max(1, self.memory_budget // (region_bytes * n_workers))
+        return [regions[start:start + block_size] for start in range(0, len(regions), block_size)]
+
+    def reduce_blocks(self, func) -> np.ndarray:
+        blocks = [func(self.stacked_pbrs[block.start:block.stop]) for block in
+                  self.get_region_blocks()]
+        return np.concatenate(blocks, axis=0)
+
+    def create_mean_pbr(self) -> ProbabilityByRegionMatrix:
+        mean = self.reduce_blocks(
+            lambda block: block.mean(axis=self.subjects_axis, dtype=precision.accumulation))
+        return ProbabilityByRegionMatrix(from_array=mean)
+
+    def create_std_pbr(self) -> ProbabilityByRegionMatrix:
+        std = self.reduce_blocks(
+            lambda block: block.std(axis=self.subjects_axis, dtype=precision.accumulation))
+        return ProbabilityByRegionMatrix(from_array=std)
+
+    def map_region_blocks(self, func, regions: range, *args) -> list:
+        """
+        Runs a block function over blocks of the given regions in worker processes and
+        concatenates the per-region results
+
+        :param func: module level function with the signature func(store_path, regions, *args)
+        :param regions: region indices
+        :type regions: range
+        :param args: additional function arguments
+        :return: per-region results
+        :rtype: list
+        """
+        blocks = self.get_region_blocks(regions, self.n_workers)
+        if self.n_workers == 1:
+            block_results = [func(self.store_path, block, *args) for block in blocks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+                futures = [executor.submit(func, self.store_path, block, *args)
+                           for block in blocks]
+                block_results = [future.result() for future in futures]
+        return [result for block_result in block_results for result in block_result]
+
+    def calculate_regions_lm_results(self, regions: range, scores: pd.DataFrame) -> list:
+        return self.map_region_blocks(calculate_lm_block, regions, scores)
+
+    def calculate_regions_anova(self, class_idx: int, regions: range,
+                                categorical_df: pd.DataFrame) -> list:
+        return self.map_region_blocks(calculate_anova_block, regions, class_idx, categorical_df)
+
+    def get_decomposition(self, n_components: int = 10, block_size: int = None):
+        block_size = block_size or len(self.get_region_blocks()[0])
+        return super(ChunkedCorticalLayersAnalysis, self).get_decomposition(n_components,
+                                                                            block_size)
+
+    def get_pbr_by_subject_id(self, subject_id: str):
+        if subject_id in self.subject_ids:
+            data = self.stacked_pbrs[:, :, self.subject_ids.index(subject_id)]
+            return ProbabilityByRegionMatrix(from_array=np.array(data))
+
+    @property
+    def subject_ids(self) -> list:
+        return self._subject_ids
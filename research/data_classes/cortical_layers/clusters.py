@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+from scipy.sparse.csgraph import connected_components
+
+
+class ClusterInference:
+    def __init__(self, adjacency: sparse.csr_matrix, weights: np.ndarray = None):
+        """
+        Connected-component clusters of thresholded region statistics over a region adjacency
+        graph, with cluster-extent correction against permutation nulls
+
+        :param adjacency: region adjacency matrix (see BrainAtlas.adjacency)
+        :type adjacency: sparse.csr_matrix
+        :param weights: region extents used to measure cluster size (e.g. voxel counts), defaults
+        to one per region
+        :type weights: np.ndarray
+        """
+        self.adjacency = sparse.csr_matrix(adjacency)
+        self.n_regions = self.adjacency.shape[0]
+        self.weights = np.ones(self.n_regions) if weights is None else np.asarray(weights)
+
+    def find_clusters(self, region_mask: np.ndarray) -> np.ndarray:
+        """
+        Labels the connected components of the selected regions
+
+        :param region_mask: selected (e.g. supra-threshold) regions
+        :type region_mask: np.ndarray
+        :return: cluster label by region (-1 for regions not selected)
+        :rtype: np.ndarray
+        """
+        region_mask = np.asarray(region_mask, dtype=bool)
+        labels = np.full(self.n_regions, -1)
+        if region_mask.any():
+            subgraph = self.adjacency[region_mask][:, region_mask]
+            _, labels[region_mask] = connected_components(subgraph, directed=False)
+        return labels
+
+    def get_cluster_extents(self, labels: np.ndarray) -> np.ndarray:
+        selected = labels >= 0
+        return np.bincount(labels[selected], weights=self.weights[selected])
+
+    def get_max_extent(self, region_mask: np.ndarray) -> float:
+        extents = self.get_cluster_extents(self.find_clusters(region_mask))
+        return extents.max() if len(extents) else 0.
+
+    def create_null_distribution(self, region_masks) -> np.ndarray:
+        """
+        Returns the maximal cluster extent of each permuted map
+
+        :param region_masks: selected regions of each permutation
+        :type region_masks: iterable of np.ndarray
+        :return: maximal cluster extents
+        :rtype: np.ndarray
+        """
+        return np.array([self.get_max_extent(region_mask) for region_mask in region_masks])
+
+    def test_clusters(self, region_mask: np.ndarray, null_distribution: np.ndarray) -> tuple:
+        """
+        Returns the observed clusters and their family-wise corrected p-values
+
+        :param region_mask: observed selected regions
+        :type region_mask: np.ndarray
+        :param null_distribution: maximal cluster extents under the null
+        :type null_distribution: np.ndarray
+        :return: cluster label by region and a table of cluster extents and p-values
+        :rtype: tuple
+        """
+        labels = self.find_clusters(region_mask)
+        extents = self.get_cluster_extents(labels)
+        exceeding = (null_distribution[np.newaxis, :] >= extents[:, np.newaxis]).sum(axis=1)
+        p = (exceeding + 1) / (len(null_distribution) + 1)
+        clusters = pd.DataFrame({'extent': extents, 'n_regions': np.bincount(labels[labels >= 0]),
+                                 'p': p})
+        clusters.index.name = 'cluster'
+        return labels, clusters
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from scipy import stats
+from .cfg import precision
+from .multitest import fdr_correction
+
+
+def calculate_masked_correlations(X: np.ndarray, Y: np.ndarray) -> tuple:
+    """
+    Calculates the Pearson correlation of every feature with every measure over the subjects
+    available for each pair, using matrix products of the zero-filled data and its validity masks
+
+    :param X: features (feature x subject, NaN where missing)
+    :type X: np.ndarray
+    :param Y: measures (subject x measure, NaN where missing)
+    :type Y: np.ndarray
+    :return: correlations and numbers of subjects (feature x measure)
+    :rtype: tuple
+    """
+    x_valid, y_valid = np.isfinite(X).astype(float), np.isfinite(Y).astype(float)
+    X, Y = np.nan_to_num(X), np.nan_to_num(Y)
+    n = x_valid @ y_valid
+    sum_x, sum_y = X @ y_valid, x_valid @ Y
+    sum_xx, sum_yy = (X ** 2) @ y_valid, x_valid @ (Y ** 2)
+    sum_xy = X @ Y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * sum_xy - sum_x * sum_y
+        variance = np.maximum(n * sum_xx - sum_x ** 2, 0) * np.maximum(n * sum_yy - sum_y ** 2, 0)
+        r = covariance / np.sqrt(variance)
+    return np.clip(r, -1, 1), n
+
+
+def residualize(values: np.ndarray, design: np.ndarray) -> np.ndarray:
+    """
+    Returns the residuals of each column of values regressed on the design over the subjects
+    where it is available (NaN elsewhere)
+
+    :param values: values (subject x column, NaN where missing)
+    :type values: np.ndarray
+    :param design: design matrix (subject x parameter)
+    :type design: np.ndarray
+    :return: residuals (subject x column)
+    :rtype: np.ndarray
+    """
+    residuals = np.full(values.shape, np.nan)
+    valid = np.isfinite(values)
+    if valid.all():
+        return values - design @ (np.linalg.pinv(design) @ values)
+    for j in range(values.shape[1]):
+        rows = valid[:, j]
+        if rows.any():
+            y = values[rows, j]
+            residuals[rows, j] = y - design[rows] @ (np.linalg.pinv(design[rows]) @ y)
+    return residuals
+
+
+def standardize(stacked_pbrs: np.ndarray) -> np.ndarray:
+    """
+    Standardizes every region x class probability over the subjects (ignoring NaNs)
+
+    :param stacked_pbrs: stacked probability by region data (region x class x subject)
+    :type stacked_pbrs: np.ndarray
+    :return: standardized data (feature x subject)
+    :rtype: np.ndarray
+    """
+    data = precision.to_accumulation(stacked_pbrs).reshape(-1, stacked_pbrs.shape[-1])
+    mean = np.nanmean(data, axis=1, keepdims=True)
+    std = np.nanstd(data, axis=1, keepdims=True)
+    std[std == 0] = 1
+    return (data - mean) / std
+
+
+class CorrelationScreen:
+    _standardized = None
+
+    def __init__(self, stacked_pbrs: np.ndarray, subject_ids: list,
+                 standardized: np.ndarray = None):
+        """
+        Screens the (partial) Pearson correlations of every region x class probability with every
+        measure of a subject x measure feature matrix. The stacked data are standardized once, so
+        a complete feature matrix is screened with a single matrix product; missing measure values
+        are handled pairwise with masked products
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :param standardized: the stacked data already standardized (see standardize), to share
+        between screens of the same data
+        :type standardized: np.ndarray
+        """
+        self.stacked_pbrs = stacked_pbrs
+        self.subject_ids = subject_ids
+        self.shape = stacked_pbrs.shape[:-1]
+        self.measures = None
+        self.r = None
+        self.n = None
+        self.df = None
+        self.p = None
+        self.p_fdr = None
+        self._standardized = standardized
+
+    def create_design(self, covariates: pd.DataFrame) -> pd.DataFrame:
+        """
+        Creates the covariates' design matrix over the subjects of the stacked data (with an
+        intercept and categorical covariates dummy coded, NaN rows for incomplete subjects)
+
+        :param covariates: covariates by subject ID
+        :type covariates: pd.DataFrame
+        :return: design matrix
+        :rtype: pd.DataFrame
+        """
+        covariates = covariates.reindex(self.subject_ids)
+        incomplete = covariates.isnull().any(axis=1)
+        design = pd.get_dummies(covariates, drop_first=True).astype(float)
+        design.insert(0, 'intercept', 1.)
+        design[incomplete] = np.nan
+        return design
+
+    def fit(self, features: pd.DataFrame, covariates: pd.DataFrame = None):
+        """
+        Calculates the correlation cube of the features, partialling out the covariates if given
+        (subjects with incomplete covariates are excluded; with missing feature values, the
+        probabilities are residualized over all remaining subjects and each measure over its
+        available ones)
+
+        :param features: measures by subject ID (one column per measure)
+        :type features: pd.DataFrame
+        :param covariates: covariates to partial out by subject ID
+        :type covariates: pd.DataFrame
+        :return: fitted screen
+        :rtype: CorrelationScreen
+        """
+        self.measures = list(features.columns)
+        Y = features.reindex(self.subject_ids).values.astype(float)
+        n_covariates = 0
+        if covariates is not None and len(covariates.columns):
+            design = self.create_design(covariates)
+            complete = design.notnull().all(axis=1).values
+            Z = design.values[complete]
+            n_covariates = np.linalg.matrix_rank(Z) - 1
+            X = residualize(np.nan_to_num(self.standardized[:, complete]).T, Z).T
+            Y = residualize(Y[complete], Z)
+        else:
+            X = self.standardized
+        if np.isfinite(Y).all() and np.isfinite(X).all():
+            # Both sides are centered, so scaling them to unit RMS (a no-op for the standardized
+            # data unless residualized) makes a single product the correlation matrix
+            n_subjects = X.shape[1]
+            Y = Y - Y.mean(axis=0)
+            x_scale = np.sqrt((X ** 2).mean(axis=1, keepdims=True))
+            y_scale = np.sqrt((Y ** 2).mean(axis=0, keepdims=True))
+            x_scale[x_scale == 0], y_scale[y_scale == 0] = 1, 1
+            r = np.clip((X / x_scale) @ (Y / y_scale) / n_subjects, -1, 1)
+            n = np.full(r.shape, float(n_subjects))
+        else:
+            r, n = calculate_masked_correlations(X, Y)
+        self.df = n - 2 - n_covariates
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = r * np.sqrt(self.df / (1 - r ** 2))
+            p = 2 * stats.t.sf(np.abs(t), np.where(self.df > 0, self.df, np.nan))
+        output_shape = self.shape + (len(self.measures),)
+        self.r = r.reshape(output_shape)
+        self.n = n.reshape(output_shape).astype(int)
+        self.p = p.reshape(output_shape)
+        self.p_fdr = fdr_correction(p, axis=0).reshape(output_shape)
+        return self
+
+    def get_results(self, measure: str) -> pd.DataFrame:
+        """
+        Returns a measure's correlations in long format
+
+        :param measure: measure name
+        :type measure: str
+        :return: correlation, number of subjects, p-value and FDR corrected p-value by region
+        and class index
+        :rtype: pd.DataFrame
+        """
+        measure_idx = self.measures.index(measure)
+        index = pd.MultiIndex.from_product([range(n) for n in self.shape],
+                                           names=['region', 'class'])
+        return pd.DataFrame({'r': self.r[..., measure_idx].ravel(),
+                             'n': self.n[..., measure_idx].ravel(),
+                             'p': self.p[..., measure_idx].ravel(),
+                             'p_fdr': self.p_fdr[..., measure_idx].ravel()}, index=index)
+
+    def get_significant(self, alpha: float = 0.05) -> pd.DataFrame:
+        """
+        Returns all region x class x measure correlations surviving FDR correction
+
+        :param alpha: FDR level
+        :type alpha: float
+        :return: significant correlations (strongest first)
+        :rtype: pd.DataFrame
+        """
+        region_idx, class_idx, measure_idx = np.nonzero(self.p_fdr < alpha)
+        significant = pd.DataFrame({
+            'measure': np.array(self.measures, dtype=object)[measure_idx], 'region': region_idx,
+            'class': class_idx, 'r': self.r[region_idx, class_idx, measure_idx],
+            'n': self.n[region_idx, class_idx, measure_idx],
+            'p_fdr': self.p_fdr[region_idx, class_idx, measure_idx]})
+        return significant.reindex(significant['r'].abs().sort_values(ascending=False).index)
+
+    @property
+    def standardized(self) -> np.ndarray:
+        if not isinstance(self._standardized, np.ndarray):
+            self._standardized = standardize(self.stacked_pbrs)
+        return self._standardized
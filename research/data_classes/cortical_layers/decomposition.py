@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .brain_atlas import BrainAtlas
+from .cfg import n_classes, atlas, precision
+from .statistic_map import StatisticMap
+
+
+class CohortDecomposition:
+    def __init__(self, n_components: int = 10, n_oversamples: int = 10, n_iter: int = 4,
+                 block_size: int = None, seed: int = 0):
+        """
+        Principal component analysis of the subjects' flattened (region x class) probability
+        profiles using a randomized SVD that reads the stacked array one block of regions at a
+        time, so memory-mapped cohorts need never be fully loaded
+
+        :param n_components: number of components
+        :type n_components: int
+        :param n_oversamples: additional random projections improving the approximation
+        :type n_oversamples: int
+        :param n_iter: number of power iterations (each one pass over the data)
+        :type n_iter: int
+        :param block_size: number of regions read at once (None to read all at once)
+        :type block_size: int
+        :param seed: random seed
+        :type seed: int
+        """
+        self.n_components = n_components
+        self.n_oversamples = n_oversamples
+        self.n_iter = n_iter
+        self.block_size = block_size
+        self.seed = seed
+        self.mean = None
+        self.components = None
+        self.singular_values = None
+        self.total_variance = None
+        self.scores = None
+
+    def get_blocks(self, stacked_pbrs: np.ndarray, centered: bool = True):
+        """
+        Yields the feature indices and (centered) data of each block of regions
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param centered: subtract the mean across subjects from each feature
+        :type centered: bool
+        :return: feature slice and data (feature x subject) by block
+        """
+        n_regions = stacked_pbrs.shape[0]
+        block_size = self.block_size or n_regions
+        for start in range(0, n_regions, block_size):
+            data = precision.to_accumulation(stacked_pbrs[start:start + block_size])
+            data = np.nan_to_num(data.reshape(-1, data.shape[-1]))
+            features = slice(start * n_classes, start * n_classes + len(data))
+            yield features, data - self.mean[features, np.newaxis] if centered else data
+
+    def multiply(self, stacked_pbrs: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        n_features = stacked_pbrs.shape[0] * n_classes
+        product = np.empty((n_features, matrix.shape[1]))
+        for features, data in self.get_blocks(stacked_pbrs):
+            product[features] = data @ matrix
+        return product
+
+    def multiply_transposed(self, stacked_pbrs: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        product = np.zeros((stacked_pbrs.shape[-1], matrix.shape[1]))
+        for features, data in self.get_blocks(stacked_pbrs):
+            product += data.T @ matrix[features]
+        return product
+
+    def calculate_mean(self, stacked_pbrs: np.ndarray) -> None:
+        self.mean = np.zeros(stacked_pbrs.shape[0] * n_classes)
+        self.total_variance = 0.
+        for features, data in self.get_blocks(stacked_pbrs, centered=False):
+            self.mean[features] = data.mean(axis=1)
+            self.total_variance += ((data - self.mean[features, np.newaxis]) ** 2).sum()
+        self.total_variance /= stacked_pbrs.shape[-1] - 1
+
+    def fit(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Fits the components to the stacked cohort array (at most as many components as there
+        are subjects or features)
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :return: fitted decomposition
+        :rtype: CohortDecomposition
+        """
+        n_subjects = stacked_pbrs.shape[-1]
+        max_components = min(n_subjects, stacked_pbrs.shape[0] * n_classes)
+        if self.n_components > max_components:
+            print(f'Only {max_components} components can be fitted, reducing the number of '
+                  f'components from {self.n_components}!')
+            self.n_components = max_components
+        n_random = min(self.n_components + self.n_oversamples, max_components)
+        rng = np.random.default_rng(self.seed)
+        self.calculate_mean(stacked_pbrs)
+        # Range finder with power iterations (re-orthonormalized at every pass)
+        basis, _ = np.linalg.qr(self.multiply(stacked_pbrs, rng.standard_normal(
+            (n_subjects, n_random))))
+        for _ in range(self.n_iter):
+            subject_basis, _ = np.linalg.qr(self.multiply_transposed(stacked_pbrs, basis))
+            basis, _ = np.linalg.qr(self.multiply(stacked_pbrs, subject_basis))
+        projected = self.multiply_transposed(stacked_pbrs, basis).T
+        u, s, vt = np.linalg.svd(projected, full_matrices=False)
+        self.components = (basis @ u[:, :self.n_components]).T
+        self.singular_values = s[:self.n_components]
+        scores = vt[:self.n_components].T * self.singular_values
+        self.scores = pd.DataFrame(scores, index=subject_ids, columns=self.component_names)
+        return self
+
+    def transform(self, data: np.ndarray) -> np.ndarray:
+        """
+        Returns the component scores of new probability by region data
+
+        :param data: probability by region data (region x class [x subject])
+        :type data: np.ndarray
+        :return: component scores ([subject x] component)
+        :rtype: np.ndarray
+        """
+        profiles = precision.to_accumulation(data).reshape(self.components.shape[1], -1)
+        scores = self.components @ (np.nan_to_num(profiles) - self.mean[:, np.newaxis])
+        return scores.T if data.ndim > 2 else scores[:, 0]
+
+    @property
+    def component_names(self) -> list:
+        return [f'pc{i + 1}' for i in range(self.n_components)]
+
+    @property
+    def explained_variance(self) -> np.ndarray:
+        return self.singular_values ** 2 / (len(self.scores) - 1)
+
+    @property
+    def explained_variance_ratio(self) -> np.ndarray:
+        return self.explained_variance / self.total_variance
+
+    def get_component(self, component_idx: int) -> np.ndarray:
+        """
+        Returns a component's loadings as a (region x class) matrix
+
+        :param component_idx: component index
+        :type component_idx: int
+        :return: loadings
+        :rtype: np.ndarray
+        """
+        return self.components[component_idx].reshape(-1, n_classes)
+
+    def create_component_maps(self, component_idx: int, atlas: BrainAtlas = atlas) -> list:
+        """
+        Projects a component's loadings onto the atlas
+
+        :param component_idx: component index
+        :type component_idx: int
+        :param atlas: brain atlas to project onto
+        :type atlas: BrainAtlas
+        :return: loadings map by class
+        :rtype: list of StatisticMap instances
+        """
+        loadings = self.get_component(component_idx)
+        name = self.component_names[component_idx]
+        return [StatisticMap(atlas.convert_from_array(loadings[:, class_idx], cropped=True),
+                             class_idx, name, atlas=atlas) for class_idx in range(n_classes)]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components,
+                 singular_values=self.singular_values, total_variance=self.total_variance,
+                 scores=self.scores.values, subject_ids=np.array(self.scores.index, dtype=str))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Loads a saved decomposition
+
+        :param path: saved decomposition path
+        :type path: str
+        :return: fitted decomposition
+        :rtype: CohortDecomposition
+        """
+        saved = np.load(path)
+        decomposition = cls(n_components=len(saved['singular_values']))
+        decomposition.mean = saved['mean']
+        decomposition.components = saved['components']
+        decomposition.singular_values = saved['singular_values']
+        decomposition.total_variance = float(saved['total_variance'])
+        decomposition.scores = pd.DataFrame(saved['scores'],
+                                            index=saved['subject_ids'].tolist(),
+                                            columns=decomposition.component_names)
+        return decomposition
@@ -0,0 +1,156 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from .cfg import precision
+from .rank_tests import rank_data
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def calculate_sorted_quantiles(sorted_data: np.ndarray, n_valid: np.ndarray,
+                               quantiles: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolates quantiles of each row of sorted data (missing values sorted last)
+
+    :param sorted_data: sorted values (row x observation)
+    :type sorted_data: np.ndarray
+    :param n_valid: number of non-missing values of each row
+    :type n_valid: np.ndarray
+    :param quantiles: quantiles (between 0 and 1)
+    :type quantiles: np.ndarray
+    :return: quantile values (row x quantile, NaN for rows without values)
+    :rtype: np.ndarray
+    """
+    positions = quantiles[np.newaxis, :] * np.maximum(n_valid - 1, 0)[:, np.newaxis]
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    fraction = positions - lower
+    lower_values = np.take_along_axis(sorted_data, lower, axis=1)
+    upper_values = np.take_along_axis(sorted_data, upper, axis=1)
+    values = lower_values + fraction * (upper_values - lower_values)
+    values[n_valid == 0] = np.nan
+    return values
+
+
+class CohortDistribution:
+    def __init__(self, quantiles=DEFAULT_QUANTILES, n_bins: int = 20):
+        """
+        Distribution summaries (quantiles, IQR, histogram counts and percentile ranks) of every
+        region x class probability along the subjects axis, computed for all regions at once
+
+        :param quantiles: quantiles to calculate (between 0 and 1)
+        :type quantiles: iterable of float
+        :param n_bins: number of equal-width histogram bins between 0 and 1
+        :type n_bins: int
+        """
+        self.quantiles = np.asarray(quantiles, dtype=float)
+        self.n_bins = n_bins
+        self.quantile_values = None
+        self.counts = None
+        self.percentile_ranks = None
+        self.subject_ids = None
+
+    def fit(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Calculates the summaries of the stacked cohort array
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :return: fitted distribution
+        :rtype: CohortDistribution
+        """
+        shape = stacked_pbrs.shape[:-1]
+        data = precision.to_accumulation(stacked_pbrs).reshape(-1, len(subject_ids))
+        valid = np.isfinite(data)
+        n_valid = valid.sum(axis=1)
+        quantile_values = calculate_sorted_quantiles(np.sort(data, axis=1), n_valid,
+                                                     self.quantiles)
+        self.quantile_values = quantile_values.reshape(shape + (len(self.quantiles),))
+        bins = np.clip((np.nan_to_num(data) * self.n_bins).astype(int), 0, self.n_bins - 1)
+        offsets = np.arange(len(data))[:, np.newaxis] * self.n_bins
+        counts = np.bincount((bins + offsets)[valid], minlength=len(data) * self.n_bins)
+        self.counts = counts.reshape(shape + (self.n_bins,))
+        # Mid-rank percentiles (missing values are ranked last and masked)
+        ranks, _ = rank_data(data)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentile_ranks = 100 * (ranks - 0.5) / n_valid[:, np.newaxis]
+        percentile_ranks[~valid] = np.nan
+        self.percentile_ranks = percentile_ranks.reshape(shape + (-1,)).astype(np.float32)
+        self.subject_ids = list(subject_ids)
+        return self
+
+    @property
+    def bin_edges(self) -> np.ndarray:
+        return np.linspace(0, 1, self.n_bins + 1)
+
+    @property
+    def iqr(self) -> np.ndarray:
+        return self.get_quantile(0.75) - self.get_quantile(0.25)
+
+    def get_quantile(self, quantile: float) -> np.ndarray:
+        """
+        Returns a calculated quantile of every region x class
+
+        :param quantile: quantile (between 0 and 1)
+        :type quantile: float
+        :return: quantile values (region x class)
+        :rtype: np.ndarray
+        """
+        matches = np.flatnonzero(np.isclose(self.quantiles, quantile))
+        if not len(matches):
+            raise ValueError(f'Quantile {quantile} was not calculated!')
+        return self.quantile_values[..., matches[0]]
+
+    def get_subject_percentiles(self, subject_id: str) -> np.ndarray:
+        """
+        Returns a cohort subject's percentile rank in every region x class
+
+        :param subject_id: subject ID
+        :type subject_id: str
+        :return: percentile ranks (region x class)
+        :rtype: np.ndarray
+        """
+        return self.percentile_ranks[..., self.subject_ids.index(subject_id)]
+
+    def create_summary(self, region_idx: int) -> pd.DataFrame:
+        """
+        Summarizes a region's distribution in each class
+
+        :param region_idx: region index
+        :type region_idx: int
+        :return: quantiles and IQR by class index
+        :rtype: pd.DataFrame
+        """
+        columns = [f'q{100 * quantile:g}' for quantile in self.quantiles]
+        summary = pd.DataFrame(self.quantile_values[region_idx], columns=columns)
+        summary['iqr'] = self.iqr[region_idx]
+        summary.index.name = 'class'
+        return summary
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, quantiles=self.quantiles, quantile_values=self.quantile_values,
+                 counts=self.counts, percentile_ranks=self.percentile_ranks,
+                 subject_ids=np.array(self.subject_ids, dtype=str))
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Loads a saved distribution
+
+        :param path: saved distribution path
+        :type path: str
+        :return: fitted distribution
+        :rtype: CohortDistribution
+        """
+        saved = np.load(path)
+        distribution = cls(quantiles=saved['quantiles'], n_bins=saved['counts'].shape[-1])
+        distribution.quantile_values = saved['quantile_values']
+        distribution.counts = saved['counts']
+        distribution.percentile_ranks = saved['percentile_ranks']
+        distribution.subject_ids = saved['subject_ids'].tolist()
+        return distribution
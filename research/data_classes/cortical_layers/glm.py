@@ -0,0 +1,148 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import patsy
+
+from collections import OrderedDict
+from scipy import stats
+from .cfg import precision
+from .multitest import fdr_correction
+
+
+class GeneralLinearModel:
+    # Shared between models (e.g. of several measurements with the same covariates)
+    _design_cache = OrderedDict()
+    design_cache_size = 16
+
+    def __init__(self, design: pd.DataFrame):
+        """
+        Mass-univariate general linear model fitting every region x class probability to a
+        shared design matrix in one batched solve
+
+        :param design: design matrix indexed by subject ID (include an intercept column
+        explicitly, formulas do so by default)
+        :type design: pd.DataFrame
+        """
+        self.design = design.dropna().astype(float)
+        self.columns = list(self.design.columns)
+        self.betas = None
+        self.sigma2 = None
+        self.shape = None
+        self.n_subjects = None
+        self.df_resid = None
+        self.XtX_inv = None
+
+    @classmethod
+    def from_formula(cls, formula: str, covariates: pd.DataFrame):
+        """
+        Creates a model from a right-hand side formula (e.g. 'age + C(sex) + age:C(sex)')
+
+        :param formula: patsy formula
+        :type formula: str
+        :param covariates: covariates by subject ID
+        :type covariates: pd.DataFrame
+        :return: model
+        :rtype: GeneralLinearModel
+        """
+        return cls(patsy.dmatrix(formula, covariates, return_type='dataframe'))
+
+    def get_design_terms(self, X: np.ndarray) -> tuple:
+        """
+        Returns the pseudo-inverse of a design matrix, the inverse of its cross product and its
+        rank, LRU cached by the design's content so any model sharing it is solved only once
+
+        :param X: design matrix
+        :type X: np.ndarray
+        :return: pseudo-inverse, (X'X)^-1 and rank
+        :rtype: tuple
+        """
+        key = hashlib.sha1(X.tobytes() + str(X.shape).encode()).hexdigest()
+        if key in self._design_cache:
+            self._design_cache.move_to_end(key)
+        else:
+            pinv = np.linalg.pinv(X)
+            self._design_cache[key] = pinv, pinv @ pinv.T, np.linalg.matrix_rank(X)
+            if len(self._design_cache) > self.design_cache_size:
+                self._design_cache.popitem(last=False)
+        return self._design_cache[key]
+
+    def fit(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Fits the model to all regions and classes at once
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :return: fitted model
+        :rtype: GeneralLinearModel
+        """
+        design = self.design[self.design.index.isin(subject_ids)]
+        subject_idx = [subject_ids.index(subject_id) for subject_id in design.index]
+        X = design.values
+        Y = precision.to_accumulation(stacked_pbrs[:, :, subject_idx])
+        self.shape = Y.shape[:-1]
+        Y = Y.reshape(-1, len(subject_idx)).T
+        pinv, self.XtX_inv, rank = self.get_design_terms(X)
+        self.n_subjects = len(subject_idx)
+        self.df_resid = self.n_subjects - rank
+        if self.df_resid < 1:
+            raise ValueError('Not enough subjects to fit the design!')
+        self.betas = pinv @ Y
+        residuals = Y - X @ self.betas
+        self.sigma2 = (residuals ** 2).sum(axis=0) / self.df_resid
+        return self
+
+    def get_contrast_matrix(self, contrast) -> np.ndarray:
+        """
+        Returns a contrast as a matrix (contrast x design column)
+
+        :param contrast: design column name, dictionary of weights by column name, vector or
+        matrix of weights
+        :return: contrast matrix
+        :rtype: np.ndarray
+        """
+        if isinstance(contrast, str):
+            contrast = {contrast: 1}
+        if isinstance(contrast, dict):
+            unknown = set(contrast) - set(self.columns)
+            if unknown:
+                raise ValueError(f'Unknown design columns: {unknown}! Available: {self.columns}')
+            contrast = [contrast.get(column, 0) for column in self.columns]
+        return np.atleast_2d(np.asarray(contrast, dtype=float))
+
+    def test_contrast(self, contrast) -> dict:
+        """
+        Tests a t (single row) or F (multiple rows) contrast for every region and class
+
+        :param contrast: design column name, dictionary of weights by column name, vector or
+        matrix of weights
+        :return: statistic arrays (region x class) by name ('effect', 't' or 'F', 'p' and 'p_fdr')
+        :rtype: dict
+        """
+        if self.betas is None:
+            raise RuntimeError('Model must be fit before testing contrasts!')
+        C = self.get_contrast_matrix(contrast)
+        effect = C @ self.betas
+        middle = C @ self.XtX_inv @ C.T
+        results = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if C.shape[0] == 1:
+                t = effect[0] / np.sqrt(self.sigma2 * middle[0, 0])
+                results['effect'] = effect[0].reshape(self.shape)
+                results['t'] = t.reshape(self.shape)
+                p = 2 * stats.t.sf(np.abs(t), self.df_resid)
+            else:
+                n_rows = C.shape[0]
+                quadratic = np.einsum('if,ij,jf->f', effect, np.linalg.pinv(middle), effect)
+                F = quadratic / (n_rows * self.sigma2)
+                results['F'] = F.reshape(self.shape)
+                p = stats.f.sf(F, n_rows, self.df_resid)
+        results['p'] = p.reshape(self.shape)
+        # Correct for multiple comparisons across regions separately for each class
+        results['p_fdr'] = fdr_correction(results['p'], axis=0)
+        return results
+
+    def test_contrasts(self, contrasts: dict) -> dict:
+        return {name: self.test_contrast(contrast) for name, contrast in contrasts.items()}
@@ -0,0 +1,33 @@
+from .cfg import n_classes
+from .probability_by_region_matrix import ProbabilityByRegionMatrix
+
+
+class GroupAggregates:
+    _probability_maps = None
+
+    def __init__(self, subject_ids: tuple, mean_pbr: ProbabilityByRegionMatrix,
+                 std_pbr: ProbabilityByRegionMatrix):
+        """
+        Summary statistics of a sub-cohort's probability by region matrices
+
+        :param subject_ids: IDs of the subjects in the group
+        :type subject_ids: tuple
+        :param mean_pbr: mean probability by region across the group
+        :type mean_pbr: ProbabilityByRegionMatrix
+        :param std_pbr: STD of class probability by region across the group
+        :type std_pbr: ProbabilityByRegionMatrix
+        """
+        self.subject_ids = subject_ids
+        self.mean_pbr = mean_pbr
+        self.std_pbr = std_pbr
+
+    @property
+    def n_subjects(self) -> int:
+        return len(self.subject_ids)
+
+    @property
+    def probability_maps(self) -> list:
+        if not isinstance(self._probability_maps, list):
+            self._probability_maps = [self.mean_pbr.create_class_probability_map(class_idx) for
+                                      class_idx in range(n_classes)]
+        return self._probability_maps
@@ -0,0 +1,112 @@
+import numpy as np
+
+from scipy import stats
+from .brain_atlas import BrainAtlas
+from .cfg import n_classes, atlas, precision
+from .multitest import fdr_correction
+from .statistic_map import StatisticMap
+
+
+def welch_t_test(group_a: np.ndarray, group_b: np.ndarray) -> tuple:
+    """
+    Vectorized two-sided Welch's t-test along the last (subjects) axis
+
+    :param group_a: first group's values (... x subject)
+    :type group_a: np.ndarray
+    :param group_b: second group's values (... x subject)
+    :type group_b: np.ndarray
+    :return: t statistics, degrees of freedom and p-values
+    :rtype: tuple
+    """
+    n_a, n_b = group_a.shape[-1], group_b.shape[-1]
+    mean_a = group_a.mean(axis=-1, dtype=precision.accumulation)
+    mean_b = group_b.mean(axis=-1, dtype=precision.accumulation)
+    var_a = group_a.var(axis=-1, ddof=1, dtype=precision.accumulation) / n_a
+    var_b = group_b.var(axis=-1, ddof=1, dtype=precision.accumulation) / n_b
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = (mean_a - mean_b) / np.sqrt(var_a + var_b)
+        df = (var_a + var_b) ** 2 / (var_a ** 2 / (n_a - 1) + var_b ** 2 / (n_b - 1))
+    p = 2 * stats.t.sf(np.abs(t), df)
+    return t, df, p
+
+
+def cohens_d(group_a: np.ndarray, group_b: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Cohen's d (pooled standard deviation) along the last (subjects) axis
+
+    :param group_a: first group's values (... x subject)
+    :type group_a: np.ndarray
+    :param group_b: second group's values (... x subject)
+    :type group_b: np.ndarray
+    :return: effect sizes
+    :rtype: np.ndarray
+    """
+    n_a, n_b = group_a.shape[-1], group_b.shape[-1]
+    var_a = group_a.var(axis=-1, ddof=1, dtype=precision.accumulation)
+    var_b = group_b.var(axis=-1, ddof=1, dtype=precision.accumulation)
+    pooled_std = np.sqrt(((n_a - 1) * var_a + (n_b - 1) * var_b) / (n_a + n_b - 2))
+    difference = (group_a.mean(axis=-1, dtype=precision.accumulation) -
+                  group_b.mean(axis=-1, dtype=precision.accumulation))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return difference / pooled_std
+
+
+class GroupContrast:
+    statistics = ('t', 'df', 'p', 'd', 'p_fdr')
+
+    def __init__(self, group_a: np.ndarray, group_b: np.ndarray, atlas: BrainAtlas = atlas):
+        """
+        Two-group comparison (Welch's t-test and Cohen's d) of every region and class in a
+        single vectorized pass
+
+        :param group_a: first group's stacked probability by region data (region x class x
+        subject)
+        :type group_a: np.ndarray
+        :param group_b: second group's stacked probability by region data (region x class x
+        subject)
+        :type group_b: np.ndarray
+        :param atlas: brain atlas to project results onto
+        :type atlas: BrainAtlas
+        """
+        if group_a.shape[-1] < 2 or group_b.shape[-1] < 2:
+            raise ValueError('Both groups must contain at least two subjects!')
+        self.n_a = group_a.shape[-1]
+        self.n_b = group_b.shape[-1]
+        self.atlas = atlas
+        self.t, self.df, self.p = welch_t_test(group_a, group_b)
+        self.d = cohens_d(group_a, group_b)
+        # Correct for multiple comparisons across regions separately for each class
+        self.p_fdr = fdr_correction(self.p, axis=0)
+
+    def get_statistic(self, statistic: str) -> np.ndarray:
+        """
+        Returns a statistic by region and class
+
+        :param statistic: 't', 'df', 'p', 'd' or 'p_fdr'
+        :type statistic: str
+        :return: statistic (region x class)
+        :rtype: np.ndarray
+        """
+        if statistic not in self.statistics:
+            raise ValueError(f'Invalid statistic: {statistic}! Must be one of {self.statistics}')
+        return getattr(self, statistic)
+
+    def create_map(self, statistic: str, class_idx: int) -> StatisticMap:
+        """
+        Projects a statistic of a class onto the atlas (regions that could not be tested remain
+        NaN, rather than e.g. appearing maximally significant in p-value maps, and are masked in
+        the display)
+
+        :param statistic: 't', 'df', 'p', 'd' or 'p_fdr'
+        :type statistic: str
+        :param class_idx: class index
+        :type class_idx: int
+        :return: statistic map
+        :rtype: StatisticMap
+        """
+        values = self.get_statistic(statistic)[:, class_idx]
+        data = self.atlas.convert_from_array(values, cropped=True)
+        return StatisticMap(data, class_idx, statistic, atlas=self.atlas, region_values=values)
+
+    def create_maps(self, statistic: str) -> list:
+        return [self.create_map(statistic, class_idx) for class_idx in range(n_classes)]
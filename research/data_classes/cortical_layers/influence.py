@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from .cfg import precision
+
+
+class RegressionInfluence:
+    leverage_tolerance = 1e-10
+
+    def __init__(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Influence diagnostics (leverage, Cook's distance and DFBETAS) of every subject in the
+        per-region regressions of a score on the region's class probabilities (without an
+        intercept, as in CorticalLayersAnalysis.calculate_region_mlr_model), computed for all
+        regions at once with batched linear algebra rather than leave-one-out refits. Subjects
+        with a leverage of one are fitted exactly, so their Cook's distance and DFBETAS are
+        undefined (NaN).
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        """
+        self.stacked_pbrs = stacked_pbrs
+        self.all_subject_ids = subject_ids
+        self.subject_ids = None
+        self.leverage = None
+        self.cooks_distance = None
+        self.dfbetas = None
+
+    def fit(self, scores: pd.DataFrame):
+        """
+        Calculates the diagnostics for the given scores
+
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: fitted diagnostics
+        :rtype: RegressionInfluence
+        """
+        scores = scores.iloc[:, 0].dropna()
+        subject_mask = np.isin(self.all_subject_ids, scores.index)
+        self.subject_ids = [subject_id for subject_id, included in
+                            zip(self.all_subject_ids, subject_mask) if included]
+        y = scores.reindex(self.subject_ids).values.astype(float)
+        # Design matrices (region x subject x class)
+        X = precision.to_accumulation(self.stacked_pbrs[:, :, subject_mask]).transpose(0, 2, 1)
+        n_subjects, n_parameters = X.shape[1:]
+        df_resid = n_subjects - n_parameters
+        if df_resid < 2:
+            raise ValueError('Not enough subjects to calculate influence diagnostics!')
+        XtX_inv = np.linalg.pinv(np.einsum('rnp,rnq->rpq', X, X))
+        betas = np.einsum('rpq,rnq,n->rp', XtX_inv, X, y)
+        residuals = y[np.newaxis, :] - np.einsum('rnp,rp->rn', X, betas)
+        self.leverage = np.einsum('rnp,rpq,rnq->rn', X, XtX_inv, X)
+        sigma2 = (residuals ** 2).sum(axis=1, keepdims=True) / df_resid
+        with np.errstate(divide='ignore', invalid='ignore'):
+            one_minus_h = 1 - self.leverage
+            # Rounding leaves a leverage of one slightly below it, which would blow up the ratios
+            one_minus_h[one_minus_h < self.leverage_tolerance] = np.nan
+            self.cooks_distance = residuals ** 2 * self.leverage / (
+                n_parameters * sigma2 * one_minus_h ** 2)
+            # Leave-one-out coefficient changes and residual variances in closed form
+            loo_weights = (residuals / one_minus_h)[..., np.newaxis]
+            dfbeta = np.einsum('rpq,rnq->rnp', XtX_inv, X) * loo_weights
+            sigma2_loo = (df_resid * sigma2 - residuals ** 2 / one_minus_h) / (df_resid - 1)
+            scale = np.sqrt(sigma2_loo[..., np.newaxis] *
+                            np.diagonal(XtX_inv, axis1=1, axis2=2)[:, np.newaxis, :])
+            self.dfbetas = dfbeta / scale
+        return self
+
+    def get_thresholds(self) -> dict:
+        """
+        Returns the conventional thresholds of high leverage (2p / n), Cook's distance (4 / n)
+        and DFBETAS (2 / sqrt(n))
+
+        :return: threshold by diagnostic
+        :rtype: dict
+        """
+        n_subjects, n_parameters = len(self.subject_ids), self.dfbetas.shape[-1]
+        return {'leverage': 2 * n_parameters / n_subjects, 'cooks_distance': 4 / n_subjects,
+                'dfbetas': 2 / np.sqrt(n_subjects)}
+
+    def get_influential_subjects(self) -> pd.DataFrame:
+        """
+        Summarizes how often each subject is a high-influence point across regions
+
+        :return: numbers of regions in which each diagnostic exceeds its threshold and the
+        maximal Cook's distance by subject ID (most often influential first)
+        :rtype: pd.DataFrame
+        """
+        thresholds = self.get_thresholds()
+        influential = pd.DataFrame({
+            'n_high_leverage': (self.leverage > thresholds['leverage']).sum(axis=0),
+            'n_high_cooks_distance': (self.cooks_distance > thresholds['cooks_distance']).sum(
+                axis=0),
+            'n_high_dfbetas': (np.abs(self.dfbetas) > thresholds['dfbetas']).any(axis=2).sum(
+                axis=0),
+            'max_cooks_distance': np.nanmax(self.cooks_distance, axis=0),
+        }, index=pd.Index(self.subject_ids, name='subject_id'))
+        return influential.sort_values(['n_high_cooks_distance', 'max_cooks_distance'],
+                                       ascending=False)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from statsmodels.stats.multitest import fdrcorrection
+
+
+def fdr_correction(pvalues: np.ndarray, axis: int = 0) -> np.ndarray:
+    """
+    Applies Benjamini-Hochberg FDR correction to each 1D slice of an array of p-values along the
+    given axis, ignoring (and preserving) missing values
+
+    :param pvalues: p-values
+    :type pvalues: np.ndarray
+    :param axis: axis along which the tests are corrected together
+    :type axis: int
+    :return: corrected p-values
+    :rtype: np.ndarray
+    """
+    pvalues = np.moveaxis(np.asarray(pvalues, dtype=np.float64), axis, 0)
+    corrected = np.full(pvalues.shape, np.nan)
+    flat_pvalues = pvalues.reshape(pvalues.shape[0], -1)
+    flat_corrected = corrected.reshape(corrected.shape[0], -1)
+    for i in range(flat_pvalues.shape[1]):
+        valid = np.isfinite(flat_pvalues[:, i])
+        if valid.any():
+            flat_corrected[valid, i] = fdrcorrection(flat_pvalues[valid, i])[1]
+    return np.moveaxis(corrected, 0, axis)
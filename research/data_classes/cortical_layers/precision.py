@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class PrecisionPolicy:
+    display_modes = ('float32', 'float16', 'uint8')
+    # The largest uint8 value is reserved for missing values, the others quantize the range
+    uint8_nan = np.iinfo(np.uint8).max
+    uint8_max = uint8_nan - 1
+
+    def __init__(self, storage: type = np.float32, display: str = 'float32',
+                 accumulation: type = np.float64, display_range: tuple = (0., 1.)):
+        """
+        Defines the data types used to store, display and accumulate class probability data
+
+        :param storage: data type of loaded probability by region matrices and projected maps
+        :type storage: type
+        :param display: display slice mode ('float32', 'float16' or 'uint8' quantized, with
+        missing values as uint8_nan)
+        :type display: str
+        :param accumulation: data type used for accumulation within statistical calculations
+        :type accumulation: type
+        :param display_range: value range mapped onto the uint8 range when quantizing
+        :type display_range: tuple
+        """
+        if display not in self.display_modes:
+            raise ValueError(f'Invalid display mode: {display}! '
+                             f'Must be one of {self.display_modes}')
+        self.storage = np.dtype(storage)
+        self.display = display
+        self.accumulation = np.dtype(accumulation)
+        self.display_range = display_range
+
+    def to_storage(self, data: np.ndarray) -> np.ndarray:
+        """
+        Returns the data in the storage data type (without copying if possible)
+
+        :param data: class probability data
+        :type data: np.ndarray
+        :return: data in storage precision
+        :rtype: np.ndarray
+        """
+        return np.asarray(data, dtype=self.storage)
+
+    def to_accumulation(self, data: np.ndarray) -> np.ndarray:
+        return np.asarray(data, dtype=self.accumulation)
+
+    def to_display(self, data: np.ndarray) -> np.ndarray:
+        """
+        Returns the data in the display data type, quantizing to uint8 if required
+
+        :param data: image data
+        :type data: np.ndarray
+        :return: display image
+        :rtype: np.ndarray
+        """
+        if self.display == 'uint8':
+            return self.quantize(data)
+        return np.asarray(data, dtype=self.display)
+
+    def quantize(self, data: np.ndarray) -> np.ndarray:
+        """
+        Linearly maps the display range onto the uint8 values up to uint8_max (values outside the
+        range are clipped) and missing values onto uint8_nan
+
+        :param data: image data
+        :type data: np.ndarray
+        :return: quantized image
+        :rtype: np.ndarray
+        """
+        low, high = self.display_range
+        data = np.asarray(data, dtype=np.float32)
+        with np.errstate(invalid='ignore'):
+            scaled = np.rint(np.clip((data - low) * (self.uint8_max / (high - low)), 0,
+                                     self.uint8_max))
+        return np.where(np.isnan(data), self.uint8_nan, scaled).astype(np.uint8)
+
+    def dequantize(self, data: np.ndarray) -> np.ndarray:
+        low, high = self.display_range
+        values = data.astype(np.float32) * ((high - low) / self.uint8_max) + low
+        values[data == self.uint8_nan] = np.nan
+        return values
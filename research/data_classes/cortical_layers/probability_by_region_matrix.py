@@ -51,10 +51,10 @@ class ProbabilityByRegionMatrix:
         """
         # Read .mat files
         if path.endswith('.mat'):
-            self.data = loadmat(path)[MAT_DATA_KEY]
+            self.data = self.atlas.precision.to_storage(loadmat(path)[MAT_DATA_KEY])
         # Read .npy files
         elif path.endswith('.npy'):
-            self.data = np.load(path)
+            self.data = self.atlas.precision.to_storage(np.load(path))
         # Update path
         self.path = path
 
@@ -66,7 +66,7 @@ class ProbabilityByRegionMatrix:
         :type pbr_matrix: np.ndarray
         :return:
         """
-        self.data = pbr_matrix
+        self.data = self.atlas.precision.to_storage(pbr_matrix)
 
     def save(self, path: str = None) -> None:
         """
@@ -137,8 +137,9 @@ class ProbabilityByRegionMatrix:
         :return: probability map
         :rtype: np.ndarray
         """
-        data = self.atlas.convert_from_dict(self.get_region_probability_dict(class_idx))
-        return ProbabilityMap(data, class_idx)
+        values = self.data[:, class_idx]
+        data = self.atlas.convert_from_array(values, cropped=True)
+        return ProbabilityMap(data, class_idx, region_values=values)
 
     def save_class_probability_map(self, class_idx: int, path: str) -> None:
         """
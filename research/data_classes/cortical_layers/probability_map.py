@@ -4,11 +4,19 @@ from .brain_atlas import BrainAtlas
 from .brain_matrix import BrainMatrix
 from .cfg import atlas
 
+
 class ProbabilityMap(BrainMatrix):
-    def __init__(self, data: np.ndarray, class_idx: int, atlas: BrainAtlas = atlas):
-        super(ProbabilityMap, self).__init__(data)
+    def __init__(self, data: np.ndarray, class_idx: int, atlas: BrainAtlas = atlas,
+                 offset: tuple = None, region_values: np.ndarray = None):
+        offset = offset if offset is not None else atlas.get_crop_offset(data.shape)
+        super(ProbabilityMap, self).__init__(atlas.precision.to_storage(data), offset=offset)
         self.class_idx = class_idx
         self.atlas = atlas
+        # Probabilities by region index the map was projected from
+        self.region_values = region_values
+
+    def create_display_slice(self, plane: str, i_slice: int) -> np.ndarray:
+        return self.atlas.precision.to_display(self.create_slice(plane, i_slice))
 
     def save(self, path: str) -> None:
-        np.save(path, self.data)
\ No newline at end of file
+        np.save(path, self.data)
@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+from .cfg import precision
+
+# Scales the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 0.6745
+
+
+def calculate_robust_z(data: np.ndarray, axis: int = -1) -> np.ndarray:
+    """
+    Returns the robust (median and MAD based) z-scores of an array along an axis, with zero
+    scores where the MAD is zero
+
+    :param data: values
+    :type data: np.ndarray
+    :param axis: axis to standardize along
+    :type axis: int
+    :return: robust z-scores
+    :rtype: np.ndarray
+    """
+    median = np.nanmedian(data, axis=axis, keepdims=True)
+    deviation = data - median
+    mad = np.nanmedian(np.abs(deviation), axis=axis, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(mad > 0, MAD_SCALE * deviation / mad, 0.)
+    return z
+
+
+class QualityControl:
+    def __init__(self, stacked_pbrs: np.ndarray, subject_ids: list, sum_tolerance: float = 0.01,
+                 z_threshold: float = 3.5):
+        """
+        Data quality checks of every subject's probability by region matrix, run over the stacked
+        cohort array at once
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :param sum_tolerance: maximal deviation of a region's class probabilities sum from 1
+        :type sum_tolerance: float
+        :param z_threshold: absolute robust z-score above which a value is an outlier
+        :type z_threshold: float
+        """
+        self.stacked_pbrs = stacked_pbrs
+        self.subject_ids = subject_ids
+        self.sum_tolerance = sum_tolerance
+        self.z_threshold = z_threshold
+
+    def create_report(self) -> pd.DataFrame:
+        """
+        Returns a per-subject report of the number of regions with NaN or negative class
+        probabilities, class probabilities not summing to 1, no class probability at all or an
+        outlier class probability relative to the cohort, along with the robust z-score of the
+        subject's median absolute deviation from the cohort (outlier_score)
+
+        :return: QC report by subject ID (passed if no check fails)
+        :rtype: pd.DataFrame
+        """
+        data = precision.to_accumulation(self.stacked_pbrs)
+        is_nan = np.isnan(data)
+        sums = np.nansum(data, axis=1)
+        region_z = np.abs(calculate_robust_z(data, axis=2))
+        region_z[is_nan] = 0
+        distance = np.median(region_z.reshape(-1, data.shape[2]), axis=0)
+        outlier_score = calculate_robust_z(distance)
+        report = pd.DataFrame({
+            'n_nan': is_nan.any(axis=1).sum(axis=0),
+            'n_negative': (data < 0).any(axis=1).sum(axis=0),
+            'n_bad_sum': (np.abs(sums - 1) > self.sum_tolerance).sum(axis=0),
+            'n_empty': (sums == 0).sum(axis=0),
+            'n_outlier_regions': (region_z > self.z_threshold).any(axis=1).sum(axis=0),
+            'outlier_score': outlier_score,
+            'is_outlier': outlier_score > self.z_threshold,
+        }, index=pd.Index(self.subject_ids, name='subject_id'))
+        counts = ['n_nan', 'n_negative', 'n_bad_sum', 'n_empty']
+        report['passed'] = (report[counts] == 0).all(axis=1) & ~report['is_outlier']
+        return report
+
+    def get_region_outliers(self) -> pd.DataFrame:
+        """
+        Returns the number of subjects for which each region is an outlier, along with the
+        robust z-score of the region's cohort mean probabilities relative to other regions
+
+        :return: outlier counts and maximal absolute z-score across classes by region index
+        :rtype: pd.DataFrame
+        """
+        data = precision.to_accumulation(self.stacked_pbrs)
+        region_z = np.abs(calculate_robust_z(data, axis=2))
+        mean_z = np.abs(calculate_robust_z(np.nanmean(data, axis=2), axis=0))
+        region_outliers = pd.DataFrame({
+            'n_outlier_subjects': (region_z > self.z_threshold).any(axis=1).sum(axis=1),
+            'mean_z': mean_z.max(axis=1),
+        })
+        region_outliers.index.name = 'region_idx'
+        return region_outliers
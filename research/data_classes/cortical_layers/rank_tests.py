@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+
+from scipy import stats
+from .cfg import precision
+
+
+def rank_data(data: np.ndarray) -> tuple:
+    """
+    Ranks each row of a 2D array (ties receive their average rank). Missing values are
+    excluded: they are sorted last, so the ranks of the other values are unaffected, and receive
+    NaN ranks
+
+    :param data: values (row x observation, NaN where missing)
+    :type data: np.ndarray
+    :return: ranks (starting at 1) and the tie correction term (sum of t^3 - t over tie groups)
+    of each row
+    :rtype: tuple
+    """
+    n_rows, n = data.shape
+    order = np.argsort(data, axis=1, kind='mergesort')
+    sorted_data = np.take_along_axis(data, order, axis=1)
+    positions = np.broadcast_to(np.arange(n), (n_rows, n))
+    starts = np.ones((n_rows, n), dtype=bool)
+    starts[:, 1:] = sorted_data[:, 1:] != sorted_data[:, :-1]
+    ends = np.ones((n_rows, n), dtype=bool)
+    ends[:, :-1] = starts[:, 1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+    last = np.minimum.accumulate(np.where(ends, positions, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    ranks = np.empty((n_rows, n))
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=1)
+    ranks[np.isnan(data)] = np.nan
+    # Every missing value forms its own group of size one and adds nothing to the tie term
+    tie_sizes = last - first + 1
+    return ranks, (tie_sizes ** 2 - 1).sum(axis=1)
+
+
+def correlate_ranks(ranks: np.ndarray, score_ranks: np.ndarray) -> np.ndarray:
+    """
+    Calculates the Pearson correlation of each row of complete ranks with a score's ranks
+
+    :param ranks: ranks (row x observation)
+    :type ranks: np.ndarray
+    :param score_ranks: score ranks (observation)
+    :type score_ranks: np.ndarray
+    :return: correlation of each row
+    :rtype: np.ndarray
+    """
+    n = ranks.shape[-1]
+    centered = ranks - (n + 1) / 2
+    centered_scores = score_ranks - (n + 1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return centered @ centered_scores / np.sqrt(
+            (centered ** 2).sum(axis=-1) * (centered_scores ** 2).sum())
+
+
+class RankTests:
+    _ranks = None
+    _tie_terms = None
+
+    def __init__(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Rank-based tests of every region x class along the subjects axis, ranking the complete
+        cohort once (subsets of subjects with missing values are ranked on demand). Missing
+        class probabilities are excluded from the tests of their region and class only
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        """
+        self.shape = stacked_pbrs.shape[:-1]
+        self.data = stacked_pbrs.reshape(-1, stacked_pbrs.shape[-1])
+        self.subject_ids = subject_ids
+
+    def get_ranks(self, subject_mask: np.ndarray) -> tuple:
+        if subject_mask.all():
+            return self.ranks, self.tie_terms
+        return rank_data(self.data[:, subject_mask])
+
+    def align(self, df: pd.DataFrame) -> pd.Series:
+        return df.iloc[:, 0].reindex(self.subject_ids)
+
+    def kruskal_wallis(self, categorical_df: pd.DataFrame) -> dict:
+        """
+        Kruskal-Wallis H test of the class probabilities by group (subjects without a group or
+        with a missing class probability are excluded)
+
+        :param categorical_df: group by subject ID
+        :type categorical_df: pd.DataFrame
+        :return: 'H' and 'p' arrays (region x class)
+        :rtype: dict
+        """
+        groups = self.align(categorical_df)
+        subject_mask = groups.notnull().values
+        ranks, tie_terms = self.get_ranks(subject_mask)
+        codes, uniques = pd.factorize(groups[subject_mask])
+        one_hot = np.eye(len(uniques))[codes]
+        valid = np.isfinite(ranks)
+        n = valid.sum(axis=1)
+        rank_sums = np.nan_to_num(ranks) @ one_hot
+        group_sizes = valid @ one_hot
+        with np.errstate(divide='ignore', invalid='ignore'):
+            group_terms = np.where(group_sizes > 0, rank_sums ** 2 / group_sizes, 0)
+            H = 12 / (n * (n + 1)) * group_terms.sum(axis=1) - 3 * (n + 1)
+            H /= 1 - tie_terms / (n ** 3 - n)
+        p = stats.chi2.sf(H, (group_sizes > 0).sum(axis=1) - 1)
+        return {'H': H.reshape(self.shape), 'p': p.reshape(self.shape)}
+
+    def spearman(self, scores: pd.DataFrame) -> dict:
+        """
+        Spearman rank correlation of the class probabilities with a score (over the subjects
+        with both values; region x classes with missing class probabilities are re-ranked
+        individually)
+
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: 'rho' and 'p' arrays (region x class)
+        :rtype: dict
+        """
+        scores = self.align(scores).astype(float)
+        subject_mask = scores.notnull().values
+        score_values = scores.values[subject_mask]
+        ranks, _ = self.get_ranks(subject_mask)
+        score_ranks, _ = rank_data(score_values[np.newaxis, :])
+        complete = np.isfinite(ranks).all(axis=1)
+        rho = np.full(len(ranks), np.nan)
+        n = np.full(len(ranks), subject_mask.sum())
+        rho[complete] = correlate_ranks(ranks[complete], score_ranks[0])
+        data = self.data[:, subject_mask]
+        for row in np.flatnonzero(~complete):
+            valid = np.isfinite(data[row])
+            row_ranks, _ = rank_data(data[row, valid][np.newaxis, :])
+            row_score_ranks, _ = rank_data(score_values[valid][np.newaxis, :])
+            rho[row] = correlate_ranks(row_ranks, row_score_ranks[0])[0]
+            n[row] = valid.sum()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = rho * np.sqrt((n - 2) / (1 - rho ** 2))
+            p = 2 * stats.t.sf(np.abs(t), n - 2)
+        return {'rho': rho.reshape(self.shape), 'p': p.reshape(self.shape)}
+
+    @property
+    def ranks(self) -> np.ndarray:
+        if not isinstance(self._ranks, np.ndarray):
+            self._ranks, self._tie_terms = rank_data(precision.to_accumulation(self.data))
+        return self._ranks
+
+    @property
+    def tie_terms(self) -> np.ndarray:
+        if not isinstance(self._tie_terms, np.ndarray):
+            self._ranks, self._tie_terms = rank_data(precision.to_accumulation(self.data))
+        return self._tie_terms
@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+def calculate_squared_distances(features: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Returns the squared euclidean distances between every sample and center
+
+    :param features: samples (sample x feature)
+    :type features: np.ndarray
+    :param centers: cluster centers (cluster x feature)
+    :type centers: np.ndarray
+    :return: squared distances (sample x cluster)
+    :rtype: np.ndarray
+    """
+    distances = (features ** 2).sum(axis=1)[:, np.newaxis] - 2 * features @ centers.T + \
+        (centers ** 2).sum(axis=1)[np.newaxis, :]
+    return np.maximum(distances, 0)
+
+
+def initialize_centers(features: np.ndarray, n_clusters: int,
+                       rng: np.random.Generator) -> np.ndarray:
+    """
+    Chooses initial centers with k-means++ seeding
+
+    :param features: samples (sample x feature)
+    :type features: np.ndarray
+    :param n_clusters: number of clusters
+    :type n_clusters: int
+    :param rng: random number generator
+    :type rng: np.random.Generator
+    :return: initial centers (cluster x feature)
+    :rtype: np.ndarray
+    """
+    centers = np.empty((n_clusters, features.shape[1]))
+    centers[0] = features[rng.integers(len(features))]
+    closest = calculate_squared_distances(features, centers[:1])[:, 0]
+    for i in range(1, n_clusters):
+        total = closest.sum()
+        probabilities = closest / total if total > 0 else None
+        centers[i] = features[rng.choice(len(features), p=probabilities)]
+        distances = calculate_squared_distances(features, centers[i:i + 1])[:, 0]
+        closest = np.minimum(closest, distances)
+    return centers
+
+
+def update_centers(features: np.ndarray, labels: np.ndarray, centers: np.ndarray) -> tuple:
+    """
+    Returns the sum of the samples assigned to each cluster and their number
+
+    :param features: samples (sample x feature)
+    :type features: np.ndarray
+    :param labels: cluster index by sample
+    :type labels: np.ndarray
+    :param centers: current cluster centers (cluster x feature)
+    :type centers: np.ndarray
+    :return: sums (cluster x feature) and counts by cluster
+    :rtype: tuple
+    """
+    n_clusters = len(centers)
+    counts = np.bincount(labels, minlength=n_clusters)
+    sums = np.zeros_like(centers)
+    np.add.at(sums, labels, features)
+    return sums, counts
+
+
+def kmeans(features: np.ndarray, n_clusters: int, batch_size: int = None, n_init: int = 4,
+           max_iter: int = 100, tol: float = 1e-6, seed: int = 0) -> tuple:
+    """
+    Clusters samples with (mini-batch) k-means, keeping the best of several initializations
+
+    :param features: samples (sample x feature)
+    :type features: np.ndarray
+    :param n_clusters: number of clusters
+    :type n_clusters: int
+    :param batch_size: number of samples in each mini-batch (None for full-batch k-means)
+    :type batch_size: int
+    :param n_init: number of initializations
+    :type n_init: int
+    :param max_iter: maximal number of iterations
+    :type max_iter: int
+    :param tol: center shift (squared) below which full-batch k-means has converged
+    :type tol: float
+    :param seed: random seed
+    :type seed: int
+    :return: labels (ordered by first appearance), centers and inertia
+    :rtype: tuple
+    """
+    features = np.asarray(features, dtype=float)
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(n_init):
+        centers = initialize_centers(features, n_clusters, rng)
+        total_counts = np.zeros(n_clusters)
+        for _ in range(max_iter):
+            if batch_size:
+                batch = features[rng.choice(len(features), min(batch_size, len(features)),
+                                            replace=False)]
+            else:
+                batch = features
+            labels = calculate_squared_distances(batch, centers).argmin(axis=1)
+            sums, counts = update_centers(batch, labels, centers)
+            assigned = counts > 0
+            previous = centers.copy()
+            if batch_size:
+                # Per-center learning rate of one over the number of samples seen so far
+                total_counts += counts
+                centers[assigned] += (sums[assigned] - counts[assigned, np.newaxis] *
+                                      centers[assigned]) / total_counts[assigned, np.newaxis]
+            else:
+                centers[assigned] = sums[assigned] / counts[assigned, np.newaxis]
+                if ((centers - previous) ** 2).sum() < tol:
+                    break
+        distances = calculate_squared_distances(features, centers)
+        labels = distances.argmin(axis=1)
+        inertia = distances[np.arange(len(features)), labels].sum()
+        if best is None or inertia < best[2]:
+            best = labels, centers, inertia
+    labels, centers, inertia = best
+    # Relabel clusters by order of first appearance so labels are comparable between runs
+    _, first = np.unique(labels, return_index=True)
+    order = labels[np.sort(first)]
+    relabel = np.full(n_clusters, -1)
+    relabel[order] = np.arange(len(order))
+    return relabel[labels], centers[order], inertia
+
+
+class RegionClustering:
+    def __init__(self, batch_size: int = None, n_init: int = 4, seed: int = 0,
+                 n_threads: int = None):
+        """
+        Clusters regions by their class probability profiles for several numbers of clusters in
+        parallel
+
+        :param batch_size: mini-batch size (None for full-batch k-means)
+        :type batch_size: int
+        :param n_init: number of initializations for each number of clusters
+        :type n_init: int
+        :param seed: random seed
+        :type seed: int
+        :param n_threads: number of threads (defaults to the number of CPUs)
+        :type n_threads: int
+        """
+        self.batch_size = batch_size
+        self.n_init = n_init
+        self.seed = seed
+        self.n_threads = n_threads or os.cpu_count()
+
+    def fit(self, profiles: np.ndarray, n_clusters_options) -> dict:
+        """
+        Fits k-means for each number of clusters
+
+        :param profiles: region profiles (region x feature)
+        :type profiles: np.ndarray
+        :param n_clusters_options: numbers of clusters
+        :type n_clusters_options: iterable of int
+        :return: (labels, centers, inertia) by number of clusters
+        :rtype: dict
+        """
+        profiles = np.nan_to_num(np.asarray(profiles, dtype=float))
+        n_clusters_options = list(n_clusters_options)
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            futures = [executor.submit(kmeans, profiles, n_clusters, self.batch_size,
+                                       self.n_init, seed=self.seed)
+                       for n_clusters in n_clusters_options]
+            return {n_clusters: future.result()
+                    for n_clusters, future in zip(n_clusters_options, futures)}
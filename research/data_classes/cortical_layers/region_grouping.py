@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+
+from .brain_atlas import BrainAtlas
+from .cfg import atlas
+
+
+class RegionGrouping:
+    _matrix = None
+
+    def __init__(self, labels: np.ndarray, weights: np.ndarray = None, names: list = None):
+        """
+        A parcellation of the atlas regions into groups, rolling region-wise values up to group
+        level as (weighted) means through a precomputed sparse grouping matrix
+
+        :param labels: group index by region index (-1 for regions not in any group)
+        :type labels: np.ndarray
+        :param weights: weight of each region within its group (e.g. voxel counts), defaults to
+        equal weights
+        :type weights: np.ndarray
+        :param names: group names (defaults to group indices)
+        :type names: list
+        """
+        self.labels = np.asarray(labels, dtype=int)
+        self.n_regions = len(self.labels)
+        self.weights = np.ones(self.n_regions) if weights is None else np.asarray(weights, float)
+        self.n_groups = self.labels.max() + 1 if self.n_regions else 0
+        self.names = list(names) if names is not None else list(range(self.n_groups))
+
+    @classmethod
+    def from_mapping(cls, mapping, n_regions: int, weights: np.ndarray = None):
+        """
+        Creates a grouping from a region to parent mapping (e.g. region index to lobe name)
+
+        :param mapping: parent by region index (regions missing from the mapping are left out)
+        :type mapping: dict or pd.Series
+        :param n_regions: number of regions
+        :type n_regions: int
+        :param weights: weight of each region within its group
+        :type weights: np.ndarray
+        :return: region grouping
+        :rtype: RegionGrouping
+        """
+        parents = pd.Series(mapping).reindex(range(n_regions))
+        names = sorted(parents.dropna().unique())
+        labels = np.full(n_regions, -1)
+        mapped = parents.notnull().values
+        labels[mapped] = pd.Categorical(parents[mapped], categories=names).codes
+        return cls(labels, weights=weights, names=names)
+
+    @classmethod
+    def from_hemispheres(cls, atlas: BrainAtlas = atlas, midline: float = 0.,
+                         weighted: bool = True):
+        """
+        Groups regions into hemispheres by the side of the midline their centroid lies on
+
+        :param atlas: atlas defining the regions
+        :type atlas: BrainAtlas
+        :param midline: world x coordinate of the midline (RAS orientation)
+        :type midline: float
+        :param weighted: weight regions by their voxel counts
+        :type weighted: bool
+        :return: region grouping
+        :rtype: RegionGrouping
+        """
+        centroids = atlas.get_region_centroids()
+        labels = np.where(centroids[:, 0] >= midline, 1, 0)
+        labels[np.isnan(centroids[:, 0])] = -1
+        weights = atlas.get_region_voxel_counts() if weighted else None
+        return cls(labels, weights=weights, names=['left', 'right'])
+
+    def nest(self, mapping):
+        """
+        Returns a coarser grouping of the regions by mapping each group to a parent (e.g. clusters
+        to lobes), keeping the region weights
+
+        :param mapping: parent by group name
+        :type mapping: dict or pd.Series
+        :return: region grouping
+        :rtype: RegionGrouping
+        """
+        group_parents = pd.Series(mapping).reindex(self.names).values
+        grouped = np.flatnonzero(self.labels >= 0)
+        region_parents = pd.Series(group_parents[self.labels[grouped]], index=grouped)
+        return RegionGrouping.from_mapping(region_parents, self.n_regions, weights=self.weights)
+
+    def create_matrix(self) -> sparse.csr_matrix:
+        """
+        Creates the (group x region) matrix whose rows hold the normalized weights of each group's
+        regions
+
+        :return: grouping matrix
+        :rtype: sparse.csr_matrix
+        """
+        grouped = np.flatnonzero(self.labels >= 0)
+        group_weights = np.bincount(self.labels[grouped], weights=self.weights[grouped],
+                                    minlength=self.n_groups)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = self.weights[grouped] / group_weights[self.labels[grouped]]
+        return sparse.csr_matrix((np.nan_to_num(values), (self.labels[grouped], grouped)),
+                                 shape=(self.n_groups, self.n_regions))
+
+    def roll_up(self, values: np.ndarray) -> np.ndarray:
+        """
+        Returns the weighted mean of region-wise values within each group
+
+        :param values: values by region index (along the first axis)
+        :type values: np.ndarray
+        :return: values by group index
+        :rtype: np.ndarray
+        """
+        values = np.asarray(values, dtype=float)
+        flat = np.nan_to_num(values.reshape(self.n_regions, -1))
+        return (self.matrix @ flat).reshape((self.n_groups,) + values.shape[1:])
+
+    def expand(self, group_values: np.ndarray) -> np.ndarray:
+        """
+        Returns each region's group value (NaN for regions not in any group)
+
+        :param group_values: values by group index (along the first axis)
+        :type group_values: np.ndarray
+        :return: values by region index
+        :rtype: np.ndarray
+        """
+        group_values = np.asarray(group_values, dtype=float)
+        padded = np.concatenate([group_values, np.full((1,) + group_values.shape[1:], np.nan)])
+        return padded[self.labels]
+
+    def get_group_regions(self, group_idx: int) -> np.ndarray:
+        return np.flatnonzero(self.labels == group_idx)
+
+    def create_template(self, atlas: BrainAtlas = atlas) -> np.ndarray:
+        """
+        Returns the atlas template relabeled by group (group index + 1, 0 outside any group) to
+        be used as an alternative parcellation
+
+        :param atlas: atlas defining the regions
+        :type atlas: BrainAtlas
+        :return: group template
+        :rtype: np.ndarray
+        """
+        return atlas.convert_from_array(self.labels + 1).astype(atlas.template.dtype)
+
+    @property
+    def matrix(self) -> sparse.csr_matrix:
+        if not isinstance(self._matrix, sparse.csr_matrix):
+            self._matrix = self.create_matrix()
+        return self._matrix
@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ThreadPoolExecutor
+from .brain_atlas import BrainAtlas
+from .cfg import n_classes, atlas, precision
+from .statistic_map import StatisticMap
+
+DEFAULT_ALPHAS = np.logspace(-2, 5, 15)
+
+
+def standardize(X_train: np.ndarray, X_test: np.ndarray) -> tuple:
+    """
+    Standardizes features by the training set's mean and STD (constant features are only
+    centered)
+
+    :param X_train: training features (subject x feature)
+    :type X_train: np.ndarray
+    :param X_test: test features (subject x feature)
+    :type X_test: np.ndarray
+    :return: standardized training and test features
+    :rtype: tuple
+    """
+    mean = X_train.mean(axis=0)
+    std = X_train.std(axis=0)
+    std[std == 0] = 1
+    return (X_train - mean) / std, (X_test - mean) / std
+
+
+def ridge_path(X: np.ndarray, y: np.ndarray, alphas: np.ndarray) -> tuple:
+    """
+    Solves ridge regression for a whole path of penalties from a single thin SVD of the
+    (centered) training features
+
+    :param X: centered features (subject x feature)
+    :type X: np.ndarray
+    :param y: centered targets
+    :type y: np.ndarray
+    :param alphas: penalties
+    :type alphas: np.ndarray
+    :return: right singular vectors (feature x component) and the coefficients in their basis
+    (component x penalty)
+    :rtype: tuple
+    """
+    u, s, vt = np.linalg.svd(X, full_matrices=False)
+    shrinkage = s[:, np.newaxis] / (s[:, np.newaxis] ** 2 + alphas[np.newaxis, :])
+    return vt.T, shrinkage * (u.T @ y)[:, np.newaxis]
+
+
+def predict_fold(X: np.ndarray, y: np.ndarray, train: np.ndarray, test: np.ndarray,
+                 alphas: np.ndarray) -> np.ndarray:
+    """
+    Fits the ridge path to a fold's training subjects and predicts its test subjects
+
+    :param X: features (subject x feature)
+    :type X: np.ndarray
+    :param y: targets
+    :type y: np.ndarray
+    :param train: training subject indices
+    :type train: np.ndarray
+    :param test: test subject indices
+    :type test: np.ndarray
+    :param alphas: penalties
+    :type alphas: np.ndarray
+    :return: predictions (test subject x penalty)
+    :rtype: np.ndarray
+    """
+    X_train, X_test = standardize(X[train], X[test])
+    y_mean = y[train].mean()
+    v, coefficients = ridge_path(X_train, y[train] - y_mean, alphas)
+    return (X_test @ v) @ coefficients + y_mean
+
+
+def calculate_r2(y: np.ndarray, predictions: np.ndarray) -> np.ndarray:
+    residual = ((y[:, np.newaxis] - predictions) ** 2).sum(axis=0)
+    total = ((y - y.mean()) ** 2).sum()
+    return 1 - residual / total
+
+
+class RidgePredictor:
+    def __init__(self, alphas: np.ndarray = DEFAULT_ALPHAS, n_folds: int = 5, seed: int = 0,
+                 n_threads: int = None):
+        """
+        Predicts a score from all (region x class) features with ridge regression, choosing the
+        penalty by K-fold cross-validation (folds run in parallel threads)
+
+        :param alphas: penalties to evaluate
+        :type alphas: np.ndarray
+        :param n_folds: number of cross-validation folds
+        :type n_folds: int
+        :param seed: random seed of the fold assignment
+        :type seed: int
+        :param n_threads: number of threads (defaults to the number of CPUs)
+        :type n_threads: int
+        """
+        self.alphas = np.asarray(alphas, dtype=float)
+        self.n_folds = n_folds
+        self.seed = seed
+        self.n_threads = n_threads or os.cpu_count()
+        self.cv_r2 = None
+        self.predictions = None
+        self.weights = None
+
+    def get_folds(self, n_subjects: int) -> list:
+        order = np.random.default_rng(self.seed).permutation(n_subjects)
+        return [np.sort(test) for test in np.array_split(order, self.n_folds)]
+
+    def fit(self, stacked_pbrs: np.ndarray, subject_ids: list, scores: pd.DataFrame):
+        """
+        Cross-validates the penalty path and refits all subjects with the best penalty
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :param scores: scores by subject ID
+        :type scores: pd.DataFrame
+        :return: fitted predictor
+        :rtype: RidgePredictor
+        """
+        scores = scores.iloc[:, 0].dropna()
+        subject_mask = np.isin(subject_ids, scores.index)
+        included_ids = [subject_id for subject_id, included in zip(subject_ids, subject_mask)
+                        if included]
+        if len(included_ids) < self.n_folds:
+            raise ValueError('Not enough subjects for cross-validation!')
+        y = scores.reindex(included_ids).values.astype(float)
+        data = precision.to_accumulation(stacked_pbrs[:, :, subject_mask])
+        X = np.nan_to_num(data.reshape(-1, len(included_ids)).T)
+        folds = self.get_folds(len(y))
+        predictions = np.empty((len(y), len(self.alphas)))
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            futures = [executor.submit(predict_fold, X, y, np.setdiff1d(np.arange(len(y)), test),
+                                       test, self.alphas) for test in folds]
+            for test, future in zip(folds, futures):
+                predictions[test] = future.result()
+        self.cv_r2 = pd.Series(calculate_r2(y, predictions), index=self.alphas, name='r2')
+        self.cv_r2.index.name = 'alpha'
+        best_idx = int(np.argmax(self.cv_r2.values))
+        self.predictions = pd.Series(predictions[:, best_idx], index=included_ids)
+        X_all, _ = standardize(X, X[:0])
+        v, coefficients = ridge_path(X_all, y - y.mean(), self.alphas[best_idx:best_idx + 1])
+        self.weights = (v @ coefficients[:, 0]).reshape(-1, n_classes)
+        return self
+
+    @property
+    def best_alpha(self) -> float:
+        return self.cv_r2.idxmax()
+
+    @property
+    def r2(self) -> float:
+        """
+        Out-of-sample R-squared of the best penalty (slightly optimistic, as the penalty is
+        chosen on the same folds)
+        """
+        return self.cv_r2.max()
+
+    def create_weight_maps(self, atlas: BrainAtlas = atlas) -> list:
+        """
+        Projects the (standardized feature) weights onto the atlas
+
+        :param atlas: brain atlas to project onto
+        :type atlas: BrainAtlas
+        :return: weight map by class
+        :rtype: list of StatisticMap instances
+        """
+        return [StatisticMap(atlas.convert_from_array(self.weights[:, class_idx], cropped=True),
+                             class_idx, 'weight', atlas=atlas) for class_idx in range(n_classes)]
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from .cfg import precision
+
+METRICS = ('cosine', 'correlation')
+
+
+class SimilarityIndex:
+    def __init__(self, metric: str = 'correlation', n_components: int = None):
+        """
+        Nearest-neighbour index of subjects by their flattened (region x class) probability
+        profiles, stored as unit vectors so that a query is a single matrix-vector product. The
+        profiles are centered by the cohort mean first: raw probability profiles are all
+        positive and share the same overall pattern, so every pair of subjects would otherwise
+        be nearly identical
+
+        :param metric: 'cosine' or 'correlation' distance
+        :type metric: str
+        :param n_components: number of principal components to reduce the profiles to (None to
+        use the full profiles)
+        :type n_components: int
+        """
+        if metric not in METRICS:
+            raise ValueError(f'Invalid metric: {metric}! Must be one of {METRICS}')
+        self.metric = metric
+        self.n_components = n_components
+        self.mean = None
+        self.components = None
+        self.vectors = None
+        self.subject_ids = []
+
+    def get_profiles(self, stacked_pbrs: np.ndarray) -> np.ndarray:
+        profiles = precision.to_accumulation(stacked_pbrs).reshape(-1, stacked_pbrs.shape[-1]).T
+        return np.nan_to_num(profiles)
+
+    def fit_components(self, profiles: np.ndarray) -> None:
+        _, _, vt = np.linalg.svd(profiles - self.mean, full_matrices=False)
+        self.components = vt[:self.n_components]
+
+    def transform(self, profiles: np.ndarray) -> np.ndarray:
+        """
+        Converts profiles (subject x feature) to the index's unit vectors
+
+        :param profiles: flattened probability by region profiles
+        :type profiles: np.ndarray
+        :return: unit vectors (subject x dimension)
+        :rtype: np.ndarray
+        """
+        profiles = profiles - self.mean
+        if self.components is not None:
+            profiles = profiles @ self.components.T
+        if self.metric == 'correlation':
+            profiles = profiles - profiles.mean(axis=1, keepdims=True)
+        norms = np.linalg.norm(profiles, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return profiles / norms
+
+    def build(self, stacked_pbrs: np.ndarray, subject_ids: list):
+        """
+        Builds the index from the stacked cohort array
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :return: built index
+        :rtype: SimilarityIndex
+        """
+        profiles = self.get_profiles(stacked_pbrs)
+        self.mean = profiles.mean(axis=0)
+        if self.n_components:
+            self.fit_components(profiles)
+        self.vectors = self.transform(profiles)
+        self.subject_ids = list(subject_ids)
+        return self
+
+    def add(self, stacked_pbrs: np.ndarray, subject_ids: list) -> None:
+        """
+        Adds (or replaces) subjects, reusing the cohort mean and principal components fitted at
+        build time (builds the index if it is empty)
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param subject_ids: subject IDs of the stacked data's subjects axis
+        :type subject_ids: list
+        :return:
+        """
+        if self.mean is None:
+            self.build(stacked_pbrs, subject_ids)
+            return
+        vectors = self.transform(self.get_profiles(stacked_pbrs))
+        new_ids = []
+        for subject_id, vector in zip(subject_ids, vectors):
+            if subject_id in self.subject_ids:
+                self.vectors[self.subject_ids.index(subject_id)] = vector
+            else:
+                new_ids.append(subject_id)
+        is_new = np.isin(subject_ids, new_ids)
+        self.vectors = np.vstack([self.vectors, vectors[is_new]])
+        self.subject_ids += new_ids
+
+    def query_vector(self, vector: np.ndarray, k: int = 5, exclude: str = None) -> pd.Series:
+        distances = 1 - self.vectors @ vector
+        if exclude is not None:
+            distances[self.subject_ids.index(exclude)] = np.inf
+        k = min(k, len(distances) - (exclude is not None))
+        nearest = np.argpartition(distances, k - 1)[:k] if k > 0 else np.array([], dtype=int)
+        nearest = nearest[np.argsort(distances[nearest])]
+        return pd.Series(distances[nearest], index=[self.subject_ids[i] for i in nearest],
+                         name='distance')
+
+    def query(self, subject_id: str, k: int = 5) -> pd.Series:
+        """
+        Returns an indexed subject's k nearest neighbours
+
+        :param subject_id: subject ID
+        :type subject_id: str
+        :param k: number of neighbours
+        :type k: int
+        :return: distance by subject ID (ascending)
+        :rtype: pd.Series
+        """
+        if subject_id not in self.subject_ids:
+            raise KeyError(f'Subject {subject_id} is not indexed!')
+        vector = self.vectors[self.subject_ids.index(subject_id)]
+        return self.query_vector(vector, k=k, exclude=subject_id)
+
+    def query_profile(self, data: np.ndarray, k: int = 5) -> pd.Series:
+        """
+        Returns the k nearest neighbours of a (region x class) probability by region matrix
+
+        :param data: class probability by region data
+        :type data: np.ndarray
+        :param k: number of neighbours
+        :type k: int
+        :return: distance by subject ID (ascending)
+        :rtype: pd.Series
+        """
+        vector = self.transform(self.get_profiles(data[..., np.newaxis]))[0]
+        return self.query_vector(vector, k=k)
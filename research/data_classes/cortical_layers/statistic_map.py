@@ -0,0 +1,50 @@
+import nibabel as nib
+import numpy as np
+
+from .brain_atlas import BrainAtlas
+from .brain_matrix import BrainMatrix
+from .cfg import atlas
+
+
+class StatisticMap(BrainMatrix):
+    def __init__(self, data: np.ndarray, class_idx: int, statistic: str,
+                 atlas: BrainAtlas = atlas, offset: tuple = None, region_values: np.ndarray = None):
+        """
+        Projection of a statistic by region onto an atlas template
+
+        :param data: projected statistic
+        :type data: np.ndarray
+        :param class_idx: class index
+        :type class_idx: int
+        :param statistic: statistic name
+        :type statistic: str
+        :param atlas: associated brain atlas
+        :type atlas: BrainAtlas
+        :param offset: template space coordinates of a cropped map's origin (inferred from the
+        data's shape by default)
+        :type offset: tuple
+        :param region_values: statistic by region index the map was projected from
+        :type region_values: np.ndarray
+        """
+        offset = offset if offset is not None else atlas.get_crop_offset(data.shape)
+        super(StatisticMap, self).__init__(atlas.precision.to_storage(data), offset=offset)
+        self.class_idx = class_idx
+        self.statistic = statistic
+        self.atlas = atlas
+        self.region_values = region_values
+
+    def save(self, path: str) -> None:
+        np.save(path, self.data)
+
+    def save_nifti(self, path: str) -> None:
+        """
+        Saves the map as a NIfTI volume in the atlas template's space (zeros outside the map)
+
+        :param path: destination path
+        :type path: str
+        :return:
+        """
+        volume = np.zeros(self.atlas.template.shape, dtype=np.float32)
+        region = tuple(slice(start, start + n) for start, n in zip(self.offset, self.data.shape))
+        volume[region] = self.data
+        nib.save(nib.Nifti1Image(volume, self.atlas.affine), path)
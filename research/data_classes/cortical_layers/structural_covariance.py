@@ -0,0 +1,202 @@
+import os
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from .cfg import precision
+
+
+def get_packed_offset(region_idx, n_regions: int):
+    """
+    Returns the offset of a row in a packed (row-major) upper triangle
+
+    :param region_idx: row index (or indices)
+    :param n_regions: matrix size
+    :type n_regions: int
+    :return: packed offset of the diagonal element of the row
+    """
+    return region_idx * n_regions - region_idx * (region_idx - 1) // 2
+
+
+class StructuralCovariance:
+    kinds = ('correlation', 'partial')
+
+    def __init__(self, stacked_pbrs: np.ndarray, cache_dir: str, block_size: int = 256,
+                 n_threads: int = None, shrinkage: float = 0.1):
+        """
+        Inter-region correlation matrices across subjects for each cortical class, stored as
+        memory-mapped float32 packed upper triangles
+
+        :param stacked_pbrs: stacked probability by region data (region x class x subject)
+        :type stacked_pbrs: np.ndarray
+        :param cache_dir: directory to store the packed matrices in
+        :type cache_dir: str
+        :param block_size: number of regions in each block of the blocked matrix product
+        :type block_size: int
+        :param n_threads: number of threads computing blocks (defaults to the number of CPUs)
+        :type n_threads: int
+        :param shrinkage: shrinkage of the correlation matrix towards the identity before
+        inversion for partial correlations (required when there are fewer subjects than regions)
+        :type shrinkage: float
+        """
+        self.stacked_pbrs = stacked_pbrs
+        self.n_regions = stacked_pbrs.shape[0]
+        self.cache_dir = cache_dir
+        self.block_size = block_size
+        self.n_threads = n_threads or os.cpu_count()
+        self.shrinkage = shrinkage
+
+    @property
+    def packed_size(self) -> int:
+        return self.n_regions * (self.n_regions + 1) // 2
+
+    def get_path(self, kind: str, class_idx: int) -> str:
+        if kind not in self.kinds:
+            raise ValueError(f'Invalid kind: {kind}! Must be one of {self.kinds}')
+        return os.path.join(self.cache_dir, f'{kind}_class_{class_idx}.npy')
+
+    def get_standardized(self, class_idx: int) -> np.ndarray:
+        """
+        Returns the class probabilities standardized across subjects and scaled so that the
+        product with its own transpose is the correlation matrix
+
+        :param class_idx: class index
+        :type class_idx: int
+        :return: standardized class probabilities (region x subject)
+        :rtype: np.ndarray
+        """
+        data = precision.to_accumulation(self.stacked_pbrs[:, class_idx, :])
+        centered = data - data.mean(axis=1, keepdims=True)
+        norms = np.sqrt((centered ** 2).sum(axis=1, keepdims=True))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return centered / norms
+
+    def write_block(self, packed: np.ndarray, standardized: np.ndarray, start_i: int,
+                    start_j: int) -> None:
+        """
+        Computes one block of the correlation matrix and writes its upper triangle part
+
+        :param packed: packed upper triangle
+        :type packed: np.ndarray
+        :param standardized: standardized class probabilities (region x subject)
+        :type standardized: np.ndarray
+        :param start_i: first row of the block
+        :type start_i: int
+        :param start_j: first column of the block
+        :type start_j: int
+        :return:
+        """
+        stop_i = min(start_i + self.block_size, self.n_regions)
+        stop_j = min(start_j + self.block_size, self.n_regions)
+        block = standardized[start_i:stop_i] @ standardized[start_j:stop_j].T
+        for row_idx in range(start_i, stop_i):
+            first_column = max(row_idx, start_j)
+            if first_column >= stop_j:
+                continue
+            offset = get_packed_offset(row_idx, self.n_regions) + first_column - row_idx
+            packed[offset:offset + stop_j - first_column] = \
+                block[row_idx - start_i, first_column - start_j:]
+
+    def compute_correlation(self, class_idx: int) -> None:
+        """
+        Computes the inter-region correlation matrix of a class with blocked matrix products
+        distributed between threads and writes it as a packed upper triangle
+
+        :param class_idx: class index
+        :type class_idx: int
+        :return:
+        """
+        standardized = self.get_standardized(class_idx)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        packed = np.lib.format.open_memmap(self.get_path('correlation', class_idx), mode='w+',
+                                           dtype=np.float32, shape=(self.packed_size,))
+        starts = range(0, self.n_regions, self.block_size)
+        with ThreadPoolExecutor(max_workers=self.n_threads) as executor:
+            futures = [executor.submit(self.write_block, packed, standardized, start_i, start_j)
+                       for start_i in starts for start_j in starts if start_j >= start_i]
+            for future in futures:
+                future.result()
+        packed.flush()
+
+    def compute_partial(self, class_idx: int) -> None:
+        """
+        Computes the inter-region partial correlation matrix of a class from the inverse of the
+        (shrunk) correlation matrix and writes it as a packed upper triangle
+
+        :param class_idx: class index
+        :type class_idx: int
+        :return:
+        """
+        correlation = np.nan_to_num(self.get_matrix('correlation', class_idx).astype(np.float64))
+        np.fill_diagonal(correlation, 1)
+        shrunk = (1 - self.shrinkage) * correlation + self.shrinkage * np.eye(self.n_regions)
+        inverse = np.linalg.inv(shrunk)
+        scale = np.sqrt(np.diag(inverse))
+        partial = -inverse / np.outer(scale, scale)
+        np.fill_diagonal(partial, 1)
+        packed = np.lib.format.open_memmap(self.get_path('partial', class_idx), mode='w+',
+                                           dtype=np.float32, shape=(self.packed_size,))
+        packed[:] = partial[np.triu_indices(self.n_regions)]
+        packed.flush()
+
+    def get_packed(self, kind: str, class_idx: int) -> np.ndarray:
+        """
+        Returns the memory-mapped packed upper triangle, computing it if it does not exist
+
+        :param kind: 'correlation' or 'partial'
+        :type kind: str
+        :param class_idx: class index
+        :type class_idx: int
+        :return: packed upper triangle
+        :rtype: np.ndarray
+        """
+        path = self.get_path(kind, class_idx)
+        if not os.path.isfile(path):
+            getattr(self, f'compute_{kind}')(class_idx)
+        return np.load(path, mmap_mode='r')
+
+    def get_row(self, kind: str, class_idx: int, region_idx: int) -> np.ndarray:
+        """
+        Returns the correlations of one region with all regions
+
+        :param kind: 'correlation' or 'partial'
+        :type kind: str
+        :param class_idx: class index
+        :type class_idx: int
+        :param region_idx: region index
+        :type region_idx: int
+        :return: correlation by region
+        :rtype: np.ndarray
+        """
+        packed = self.get_packed(kind, class_idx)
+        rows = np.minimum(np.arange(self.n_regions), region_idx)
+        columns = np.maximum(np.arange(self.n_regions), region_idx)
+        return np.asarray(packed[get_packed_offset(rows, self.n_regions) + columns - rows])
+
+    def get_matrix(self, kind: str, class_idx: int) -> np.ndarray:
+        packed = self.get_packed(kind, class_idx)
+        matrix = np.zeros((self.n_regions, self.n_regions), dtype=np.float32)
+        upper = np.triu_indices(self.n_regions)
+        matrix[upper] = packed
+        matrix.T[upper] = packed
+        return matrix
+
+    def get_covarying_regions(self, kind: str, class_idx: int, region_idx: int,
+                              n: int = 10) -> np.ndarray:
+        """
+        Returns the regions most strongly (absolutely) correlated with a given region
+
+        :param kind: 'correlation' or 'partial'
+        :type kind: str
+        :param class_idx: class index
+        :type class_idx: int
+        :param region_idx: region index
+        :type region_idx: int
+        :param n: number of regions to return
+        :type n: int
+        :return: region indices sorted by descending absolute correlation
+        :rtype: np.ndarray
+        """
+        row = np.abs(np.nan_to_num(self.get_row(kind, class_idx, region_idx)))
+        row[region_idx] = -1
+        return np.argsort(row)[::-1][:n]
@@ -0,0 +1,116 @@
+import os
+
+import nibabel as nib
+import numpy as np
+
+from scipy import ndimage
+from .brain_atlas import BrainAtlas
+from .brain_matrix import BrainMatrix
+from .cfg import atlas, surface_template_path, surface_mapping_path
+
+
+class SurfaceProjection:
+    _coordinates = None
+    _region_indices = None
+    _shape = None
+
+    def __init__(self, path: str = surface_template_path, atlas: BrainAtlas = atlas,
+                 mapping_path: str = surface_mapping_path, max_distance: float = 3.):
+        """
+        Projects values by region onto the (non-zero) voxels of a surface template using a
+        precomputed surface voxel to region index mapping
+
+        :param path: surface template path
+        :type path: str
+        :param atlas: brain atlas defining the regions
+        :type atlas: BrainAtlas
+        :param mapping_path: path to cache the mapping at
+        :type mapping_path: str
+        :param max_distance: maximal distance (in atlas voxels) of a surface voxel outside the
+        labeled atlas to the nearest labeled voxel for it to be assigned that voxel's region
+        :type max_distance: float
+        """
+        self.path = path
+        self.atlas = atlas
+        self.mapping_path = mapping_path
+        self.max_distance = max_distance
+
+    def create_mapping(self) -> tuple:
+        """
+        Maps each surface voxel through the templates' affines to the region of the nearest
+        labeled atlas voxel
+
+        :return: surface voxel coordinates, region index by surface voxel (-1 for none) and the
+        surface template's shape
+        :rtype: tuple
+        """
+        surface = nib.load(self.path)
+        coordinates = np.argwhere(np.asarray(surface.get_data()) != 0)
+        homogeneous = np.column_stack([coordinates, np.ones(len(coordinates))])
+        transform = np.linalg.inv(self.atlas.affine) @ surface.affine
+        atlas_coordinates = np.rint(homogeneous @ transform.T)[:, :3].astype(np.intp)
+        template = self.atlas.template
+        in_bounds = np.all((atlas_coordinates >= 0) & (atlas_coordinates < template.shape), axis=1)
+        distances, nearest = ndimage.distance_transform_edt(template == 0, return_indices=True)
+        region_indices = np.full(len(coordinates), -1, dtype=np.int16)
+        i, j, k = atlas_coordinates[in_bounds].T
+        nearest_labels = template[nearest[0, i, j, k], nearest[1, i, j, k], nearest[2, i, j, k]]
+        within = distances[i, j, k] <= self.max_distance
+        region_indices[np.flatnonzero(in_bounds)[within]] = nearest_labels[within].astype(
+            np.int16) - 1
+        return coordinates.astype(np.int16), region_indices, surface.shape[:3]
+
+    def load_mapping(self) -> None:
+        if os.path.isfile(self.mapping_path):
+            mapping = np.load(self.mapping_path)
+            coordinates, region_indices = mapping['coordinates'], mapping['region_indices']
+            shape = tuple(mapping['shape'])
+        else:
+            coordinates, region_indices, shape = self.create_mapping()
+            os.makedirs(os.path.dirname(self.mapping_path), exist_ok=True)
+            np.savez(self.mapping_path, coordinates=coordinates, region_indices=region_indices,
+                     shape=np.array(shape))
+        self._coordinates, self._region_indices, self._shape = coordinates, region_indices, shape
+
+    def project(self, values: np.ndarray) -> np.ndarray:
+        """
+        Returns the value of each surface voxel's region with a single gather
+
+        :param values: value by region index
+        :type values: np.ndarray
+        :return: value by surface voxel (NaN for unassigned voxels)
+        :rtype: np.ndarray
+        """
+        padded = np.append(np.asarray(values, dtype=self.atlas.precision.storage), np.nan)
+        return padded[self.region_indices]
+
+    def create_map(self, values: np.ndarray) -> BrainMatrix:
+        """
+        Renders values by region into the surface template's volume
+
+        :param values: value by region index
+        :type values: np.ndarray
+        :return: surface map
+        :rtype: BrainMatrix
+        """
+        data = np.zeros(self.shape, dtype=self.atlas.precision.storage)
+        data[tuple(self.coordinates.T)] = np.nan_to_num(self.project(values))
+        return BrainMatrix(data)
+
+    @property
+    def coordinates(self) -> np.ndarray:
+        if not isinstance(self._coordinates, np.ndarray):
+            self.load_mapping()
+        return self._coordinates
+
+    @property
+    def region_indices(self) -> np.ndarray:
+        if not isinstance(self._region_indices, np.ndarray):
+            self.load_mapping()
+        return self._region_indices
+
+    @property
+    def shape(self) -> tuple:
+        if not isinstance(self._shape, tuple):
+            self.load_mapping()
+        return self._shape
@@ -8,6 +8,7 @@ class Measurements:
     subject_id_column_name = 'subject_id'
     measurement_name_column_name = 'measurement'
     _melted = None
+    _time_index = None
 
     def __init__(self, df: pd.DataFrame):
         self.df = df
@@ -24,6 +25,70 @@ class Measurements:
             value_vars=[*self.measurement_columns], var_name=self.measurement_name_column_name,
             value_name='value').set_index(self.subject_id_column_name)
 
+    def create_time_index(self) -> pd.DataFrame:
+        """
+        Returns the dated, non-missing measurement values sorted by measurement, subject and date
+
+        :return: time index
+        :rtype: pd.DataFrame
+        """
+        time_index = self.melted.reset_index().dropna(subset=[self.date_column_name, 'value'])
+        time_index[self.date_column_name] = pd.to_datetime(time_index[self.date_column_name])
+        sort_columns = [self.measurement_name_column_name, self.subject_id_column_name,
+                        self.date_column_name]
+        return time_index.sort_values(sort_columns, kind='mergesort').reset_index(drop=True)
+
+    def get_measurement_series(self, measurement_name: str) -> pd.DataFrame:
+        is_measurement = self.time_index[self.measurement_name_column_name] == measurement_name
+        return self.time_index.loc[is_measurement,
+                                   [self.subject_id_column_name, self.date_column_name, 'value']]
+
+    def get_latest_values(self, measurement_name: str) -> pd.Series:
+        """
+        Returns the latest (non-missing) value of a measurement by subject ID. Dated values are
+        preferred; an undated value is only used if the subject has no dated value (the same rule
+        as SubjectMeasurements.get_latest_values).
+
+        :param measurement_name: measurement name
+        :type measurement_name: str
+        :return: latest values by subject ID
+        :rtype: pd.Series
+        """
+        values = self.get_measurement_data(measurement_name).reset_index().dropna(
+            subset=['value'])
+        values[self.date_column_name] = pd.to_datetime(values[self.date_column_name])
+        # Undated values sort first, so any dated value is the last one
+        values = values.sort_values(self.date_column_name, na_position='first', kind='mergesort')
+        return values.groupby(self.subject_id_column_name)['value'].last()
+
+    def get_values_as_of(self, measurement_name: str, dates: pd.Series,
+                         direction: str = 'backward', tolerance: pd.Timedelta = None) -> pd.Series:
+        """
+        Returns the value of a measurement as of a date for every subject at once (e.g. the
+        weight closest to each subject's scan date)
+
+        :param measurement_name: measurement name
+        :type measurement_name: str
+        :param dates: date by subject ID
+        :type dates: pd.Series
+        :param direction: 'backward' (last value on or before the date), 'forward' or 'nearest'
+        :type direction: str
+        :param tolerance: maximal distance between the measurement and the given date
+        :type tolerance: pd.Timedelta
+        :return: values aligned to the given dates' index (NaN where no measurement matches)
+        :rtype: pd.Series
+        """
+        queries = pd.DataFrame({self.subject_id_column_name: dates.index,
+                                self.date_column_name: pd.to_datetime(dates.values)})
+        queries = queries.dropna().sort_values(self.date_column_name, kind='mergesort')
+        series = self.get_measurement_series(measurement_name).sort_values(
+            self.date_column_name, kind='mergesort')
+        matched = pd.merge_asof(queries, series, on=self.date_column_name,
+                                by=self.subject_id_column_name, direction=direction,
+                                tolerance=tolerance)
+        values = matched.set_index(self.subject_id_column_name)['value']
+        return values.reindex(dates.index).rename(measurement_name)
+
     def get_measurement_data(self, measurement_name: str):
         return self.melted.loc[self.melted[self.measurement_name_column_name] == measurement_name]
 
@@ -36,7 +101,7 @@ class Measurements:
     def get_subject_measurements(self, subject_id: str):
         subject_data = self.get_subject_data(subject_id)
         if not subject_data.empty:
-            return SubjectMeasurements(self.get_subject_data(subject_id))
+            return SubjectMeasurements(subject_data)
         return None
 
     @property
@@ -44,3 +109,9 @@ class Measurements:
         if not isinstance(self._melted, pd.DataFrame):
             self._melted = self.melt()
         return self._melted
+
+    @property
+    def time_index(self) -> pd.DataFrame:
+        if not isinstance(self._time_index, pd.DataFrame):
+            self._time_index = self.create_time_index()
+        return self._time_index
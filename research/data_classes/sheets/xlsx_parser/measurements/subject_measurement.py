@@ -2,15 +2,38 @@ import pandas as pd
 
 
 class SubjectMeasurements:
+    _latest_values = None
+
     def __init__(self, df: pd.DataFrame):
         self.df = df
         self.subject_id = self.df.name
 
     def get_measurement_data(self, name: str):
-        rows = self.df.loc[self.df['measurement'] == name].copy()
+        rows = self.df.loc[self.df['measurement'] == name].sort_values('date').copy()
         del rows['measurement']
         rows.name = f'{self.subject_id}/{name}'
         return rows
 
+    def get_latest_values(self) -> pd.Series:
+        """
+        Returns the latest (non-missing) value of each measurement by date. Dated values are
+        preferred; an undated value is only used if the measurement has no dated value (the same
+        rule as Measurements.get_latest_values).
+
+        :return: latest value by measurement name
+        :rtype: pd.Series
+        """
+        rows = self.df.dropna(subset=['value'])
+        # Undated values sort first, so any dated value is the last one
+        rows = rows.assign(date=pd.to_datetime(rows['date'])).sort_values(
+            'date', na_position='first', kind='mergesort')
+        return rows.groupby('measurement')['value'].last()
+
     def get_last_measurement_value(self, name:str):
-        return self.get_measurement_data(name)['value'].values[0]
+        return self.latest_values.get(name)
+
+    @property
+    def latest_values(self) -> pd.Series:
+        if not isinstance(self._latest_values, pd.Series):
+            self._latest_values = self.get_latest_values()
+        return self._latest_values
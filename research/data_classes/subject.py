@@ -1,5 +1,7 @@
 import datetime
 
+import pandas as pd
+
 from .cantab.cantab_results import CantabResults
 from .cortical_layers.probability_by_region_matrix import ProbabilityByRegionMatrix
 from .sheets.xlsx_parser.neo_ffi.neo_ffi import NeoFfiResult
@@ -9,6 +11,7 @@ from .sheets.xlsx_parser.measurements.subject_measurement import SubjectMeasurem
 class Subject:
     _id = None
     _id_length = 9
+    attributes = ('id', 'name_id', 'sex', 'date_of_birth', 'dominant_hand', 'gender', 'scan_date')
     additional_data_classes = {
         'measurements': SubjectMeasurements,
         'pbr': ProbabilityByRegionMatrix,
@@ -18,13 +21,15 @@ class Subject:
 
     def __init__(self, id: str, name_id: str = None, sex: str = None,
                  date_of_birth: datetime.date = None,
-                 dominant_hand: str = None, gender: str = None):
+                 dominant_hand: str = None, gender: str = None,
+                 scan_date: datetime.date = None):
         self.id = id
         self.name_id = name_id
         self.sex = sex
         self.date_of_birth = date_of_birth
         self.dominant_hand = dominant_hand
         self.gender = gender
+        self.scan_date = scan_date
 
     def __eq__(self, other) -> bool:
         return self.id == other.id
@@ -38,9 +43,27 @@ class Subject:
             if isinstance(data, expected_type):
                 setattr(self, data_attribute, data)
 
+    def get_age(self, date: datetime.date = None) -> float:
+        """
+        Returns the subject's age in years at a given date
+
+        :param date: date to calculate age at (defaults to today)
+        :type date: datetime.date
+        :return: age in years
+        :rtype: float
+        """
+        if pd.isnull(self.date_of_birth):
+            return None
+        date = date or datetime.date.today()
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        date_of_birth = self.date_of_birth
+        if isinstance(date_of_birth, datetime.datetime):
+            date_of_birth = date_of_birth.date()
+        return (date - date_of_birth).days / 365.25
+
     def to_dict(self):
-        attributes = ('id', 'name_id', 'sex', 'date_of_birth', 'dominant_hand', 'gender')
-        return {key: getattr(self, key) for key in attributes}
+        return {key: getattr(self, key) for key in self.attributes}
 
     def __str__(self):
         return f'{self.name_id}/{self.id}'
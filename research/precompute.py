@@ -0,0 +1,138 @@
+"""
+Headless precomputation of all linear model and ANOVA results
+
+Usage (from the repository root):
+
+    python -m research.precompute [--workers N] [--force]
+"""
+import argparse
+import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .dao import DataAccessObject, measurements, categorical_attributes, n_classes
+from .results_cache import ResultsCache, DEFAULT_PATH
+
+_dao = None
+
+
+def init_worker() -> None:
+    """
+    Creates a data access object once per worker process
+    """
+    global _dao
+    _dao = DataAccessObject()
+
+
+def run_lm_task(measurement: str):
+    return _dao.calculate_lm_results(measurement)
+
+
+def run_anova_task(categorical_attr: str, class_idx: int):
+    return _dao.calculate_anova_results(categorical_attr, class_idx)
+
+
+def create_tasks(cache: ResultsCache, lm_measurements: list, anova_attributes: list,
+                 force: bool = False) -> list:
+    """
+    Returns a list of (file name, function, arguments) tuples for every result missing from the
+    cache (or all of them if forced)
+
+    :param cache: results cache
+    :type cache: ResultsCache
+    :param lm_measurements: measurements to fit linear models for
+    :type lm_measurements: list
+    :param anova_attributes: categorical attributes to run ANOVA for
+    :type anova_attributes: list
+    :param force: recompute cached results
+    :type force: bool
+    :return: tasks
+    :rtype: list
+    """
+    tasks = [(cache.get_lm_file_name(measurement), run_lm_task, (measurement,))
+             for measurement in lm_measurements]
+    tasks += [(cache.get_anova_file_name(attr, class_idx), run_anova_task, (attr, class_idx))
+              for attr in anova_attributes for class_idx in range(n_classes)]
+    if force:
+        return tasks
+    return [task for task in tasks if not cache.exists(task[0])]
+
+
+def create_cache(path: str = DEFAULT_PATH) -> ResultsCache:
+    """
+    Returns the results cache of the current cohort, so results cached for a previous cohort are
+    recomputed rather than skipped
+
+    :param path: results cache directory
+    :type path: str
+    :return: results cache
+    :rtype: ResultsCache
+    """
+    return ResultsCache(path, cohort_hash=DataAccessObject().cla.cohort_hash)
+
+
+def precompute(lm_measurements: list = measurements,
+               anova_attributes: list = categorical_attributes,
+               n_workers: int = None, force: bool = False,
+               cache: ResultsCache = None) -> dict:
+    """
+    Computes all linear model and ANOVA results across a process pool and writes them to the
+    results cache
+
+    :param lm_measurements: measurements to fit linear models for
+    :type lm_measurements: list
+    :param anova_attributes: categorical attributes to run ANOVA for
+    :type anova_attributes: list
+    :param n_workers: number of worker processes (defaults to the number of CPUs)
+    :type n_workers: int
+    :param force: recompute cached results
+    :type force: bool
+    :param cache: results cache (defaults to the current cohort's)
+    :type cache: ResultsCache
+    :return: run summary
+    :rtype: dict
+    """
+    cache = cache or create_cache()
+    tasks = create_tasks(cache, lm_measurements, anova_attributes, force)
+    n_workers = n_workers or os.cpu_count()
+    print(f'Precomputing {len(tasks)} results using {n_workers} workers...')
+    failed = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker) as executor:
+        futures = {executor.submit(func, *args): file_name for file_name, func, args in tasks}
+        for i, future in enumerate(as_completed(futures), 1):
+            file_name = futures[future]
+            try:
+                cache.save(file_name, future.result())
+            except Exception as e:
+                failed.append(file_name)
+                print(f'[{i}/{len(tasks)}] {file_name} failed: {e}')
+                continue
+            elapsed = time.perf_counter() - start
+            print(f'[{i}/{len(tasks)}] {file_name} done ({i / elapsed:.2f} results/s)')
+    elapsed = time.perf_counter() - start
+    n_done = len(tasks) - len(failed)
+    throughput = n_done / elapsed if elapsed else 0
+    print(f'Computed {n_done} results in {elapsed:.1f}s ({throughput:.2f} results/s), '
+          f'{len(failed)} failed.')
+    return {'computed': n_done, 'failed': failed, 'elapsed': elapsed, 'throughput': throughput}
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Precompute linear model and ANOVA results')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--force', action='store_true', help='recompute cached results')
+    parser.add_argument('--measurements', nargs='*', default=measurements,
+                        help='measurements to fit linear models for')
+    parser.add_argument('--attributes', nargs='*', default=categorical_attributes,
+                        help='categorical attributes to run ANOVA for')
+    parser.add_argument('--cache', default=None, help='results cache directory')
+    args = parser.parse_args(argv)
+    cache = create_cache(args.cache or DEFAULT_PATH)
+    precompute(args.measurements, args.attributes, n_workers=args.workers, force=args.force,
+               cache=cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import os
+import pickle
+
+DEFAULT_PATH = os.path.normpath(os.path.abspath('./app/obj'))
+
+
+class ResultsCache:
+    def __init__(self, path: str = DEFAULT_PATH, cohort_hash: str = None):
+        """
+        Pickle based cache for linear model and ANOVA results, kept in a subdirectory per cohort
+        so results calculated for a previous cohort are never served
+
+        :param path: cache directory
+        :type path: str
+        :param cohort_hash: hash of the cohort the results are calculated for (see
+        CorticalLayersAnalysis.cohort_hash)
+        :type cohort_hash: str
+        """
+        self.path = os.path.join(path, cohort_hash[:16]) if cohort_hash else path
+
+    def get_lm_file_name(self, measurement: str) -> str:
+        return f'{measurement}_lm_results.pkl'
+
+    def get_anova_file_name(self, categorical_attr: str, class_idx: int) -> str:
+        return f'{categorical_attr}_{class_idx}_anova_result.pkl'
+
+    def get_file_path(self, file_name: str) -> str:
+        return os.path.join(self.path, file_name)
+
+    def exists(self, file_name: str) -> bool:
+        return os.path.isfile(self.get_file_path(file_name))
+
+    def load(self, file_name: str):
+        """
+        Loads a cached result
+
+        :param file_name: cached result file name
+        :type file_name: str
+        :return: cached result
+        """
+        with open(self.get_file_path(file_name), 'rb') as f:
+            return pickle.load(f)
+
+    def save(self, file_name: str, result) -> None:
+        """
+        Serializes a result to the cache directory
+
+        :param file_name: cached result file name
+        :type file_name: str
+        :param result: result to serialize
+        :return:
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.get_file_path(file_name), 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,321 @@
+"""
+Asynchronous HTTP API over the research package
+
+Usage (from the repository root):
+
+    python -m research.server [--port 5007] [--workers N]
+
+Endpoints (add ?format=binary or an "Accept: application/octet-stream" header to receive raw
+array bytes with X-Array-Shape and X-Array-Dtype headers instead of JSON):
+
+    /slices/<results set>/<plane>/<class index>/<slice index>
+    /regions/<region index>?results_set=<mean|subject ID|all>
+    /lm/<measurement>
+    /anova/<categorical attribute>/<class index>
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import tornado.ioloop
+import tornado.web
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .dao import DataAccessObject, measurements, categorical_attributes, n_classes
+from .results_cache import ResultsCache
+
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+
+
+def to_serializable(obj):
+    """
+    Converts results (arrays, pandas objects and nested containers) to JSON serializable objects
+    """
+    if isinstance(obj, np.ndarray):
+        return np.where(np.isfinite(obj), obj, None).tolist() if obj.dtype.kind == 'f' else \
+            obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return {'index': to_serializable(obj.index.values),
+                **{str(column): to_serializable(obj[column].values) for column in obj.columns}}
+    if isinstance(obj, pd.Series):
+        return to_serializable(obj.values)
+    if isinstance(obj, dict):
+        return {str(key): to_serializable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_serializable(value) for value in obj]
+    if isinstance(obj, np.generic):
+        return to_serializable(obj.item())
+    if isinstance(obj, float) and not np.isfinite(obj):
+        return None
+    return obj
+
+
+class ApiService:
+    results_set_cache_size = 8
+
+    def __init__(self, dao: DataAccessObject, cache: ResultsCache = None, n_workers: int = None):
+        """
+        Shared state of the API handlers: a single data access object, the results cache and
+        the executor CPU bound work is offloaded to. The data access object's lazily computed
+        state is not thread-safe, so calls into it are serialized with a lock while other work
+        (e.g. slicing cached maps) runs concurrently
+
+        :param dao: data access object
+        :type dao: DataAccessObject
+        :param cache: LM and ANOVA results cache
+        :type cache: ResultsCache
+        :param n_workers: number of executor threads (defaults to the number of CPUs)
+        :type n_workers: int
+        """
+        self.dao = dao
+        self.cache = cache or ResultsCache(cohort_hash=dao.cla.cohort_hash)
+        self.executor = ThreadPoolExecutor(max_workers=n_workers or os.cpu_count())
+        self.lock = threading.Lock()
+        self._pending = {}
+        self._results_sets = OrderedDict()
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def call_locked(self, func, *args):
+        with self.lock:
+            return func(*args)
+
+    async def run_locked(self, func, *args):
+        return await self.run(self.call_locked, func, *args)
+
+    async def run_once(self, key: tuple, func, *args):
+        """
+        Runs a function using the data access object in the executor (holding the lock), sharing
+        the result between concurrent identical requests
+
+        :param key: request key
+        :type key: tuple
+        :param func: function to run
+        :param args: function arguments
+        :return: function result
+        """
+        if key not in self._pending:
+            self._pending[key] = asyncio.ensure_future(self.run_locked(func, *args))
+            self._pending[key].add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(self._pending[key])
+
+    def is_valid_identifier(self, identifier: str) -> bool:
+        return identifier == 'mean' or identifier in self.dao.cla.subject_ids
+
+    async def get_results_set(self, identifier: str) -> list:
+        """
+        Returns a results set, keeping the most recently used ones in an LRU cache keyed by the
+        cohort hash and identifier
+
+        :param identifier: 'mean' or a subject ID
+        :type identifier: str
+        :return: results set
+        :rtype: list of BrainMatrix instances
+        """
+        key = (self.cohort_hash, identifier)
+        if key in self._results_sets:
+            self._results_sets.move_to_end(key)
+            return self._results_sets[key]
+        results_set = await self.run_once(('results_set',) + key, self.dao.get_results_set,
+                                          identifier)
+        if not results_set:
+            raise tornado.web.HTTPError(404, f'Invalid results set: {identifier}')
+        self._results_sets[key] = results_set
+        if len(self._results_sets) > self.results_set_cache_size:
+            self._results_sets.popitem(last=False)
+        return results_set
+
+    def get_cache_state(self, file_name: str) -> str:
+        """
+        Returns the state of a cached result (its modification time, or 'missing'), which
+        changes whenever the result is (re)calculated
+
+        :param file_name: cached result file name
+        :type file_name: str
+        :return: cached result state
+        :rtype: str
+        """
+        path = self.cache.get_file_path(file_name)
+        return str(os.stat(path).st_mtime_ns) if os.path.isfile(path) else 'missing'
+
+    def load_or_calculate(self, file_name: str, func, *args):
+        if self.cache.exists(file_name):
+            return self.cache.load(file_name)
+        result = func(*args)
+        self.cache.save(file_name, result)
+        return result
+
+    def get_lm_results(self, measurement: str) -> dict:
+        return self.load_or_calculate(self.cache.get_lm_file_name(measurement),
+                                      self.dao.calculate_lm_results, measurement)
+
+    def get_anova_results(self, categorical_attr: str, class_idx: int) -> pd.DataFrame:
+        return self.load_or_calculate(self.cache.get_anova_file_name(categorical_attr, class_idx),
+                                      self.dao.calculate_anova_results, categorical_attr,
+                                      class_idx)
+
+    def get_region_data(self, region_idx: int, identifier: str) -> tuple:
+        """
+        Returns a region's class probabilities of the mean, a single subject or all subjects
+
+        :param region_idx: region index
+        :type region_idx: int
+        :param identifier: 'mean', 'all' or a subject ID
+        :type identifier: str
+        :return: class probabilities and the corresponding subject IDs
+        :rtype: tuple
+        """
+        cla = self.dao.cla
+        if region_idx >= cla.n_regions:
+            raise tornado.web.HTTPError(404, f'Invalid region index: {region_idx}')
+        if identifier == 'mean':
+            return cla.mean_pbr.data[region_idx], []
+        if identifier == 'all':
+            return np.asarray(cla.get_region_data(region_idx)), cla.subject_ids
+        if identifier in cla.subject_ids:
+            subject_idx = cla.subject_ids.index(identifier)
+            return np.asarray(cla.stacked_pbrs[region_idx, :, subject_idx]), [identifier]
+        raise tornado.web.HTTPError(404, f'Invalid results set: {identifier}')
+
+    @property
+    def cohort_hash(self) -> str:
+        return self.dao.cla.cohort_hash
+
+
+class BaseHandler(tornado.web.RequestHandler):
+    def initialize(self, service: ApiService):
+        self.service = service
+
+    @property
+    def binary(self) -> bool:
+        return self.get_argument('format', '') == 'binary' or \
+            BINARY_CONTENT_TYPE in self.request.headers.get('Accept', '')
+
+    def compute_request_etag(self, state: str = '') -> str:
+        key = f'{self.service.cohort_hash}:{state}:{self.request.uri}:{self.binary}'
+        return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+    def check_not_modified(self, state: str = '') -> bool:
+        """
+        Sets the ETag header and checks whether the client already holds the response, which is
+        determined by the cohort hash, the state of any cached result it is read from and the
+        request alone (and so is checked after validating the request but before computing)
+
+        :param state: cached result state (see ApiService.get_cache_state)
+        :type state: str
+        :return: whether the response is not modified
+        :rtype: bool
+        """
+        etag = self.compute_request_etag(state)
+        self.set_header('Etag', etag)
+        if etag in self.request.headers.get('If-None-Match', ''):
+            self.set_status(304)
+            return True
+        return False
+
+    def write_array(self, array: np.ndarray, **metadata) -> None:
+        if self.binary:
+            array = np.ascontiguousarray(array)
+            self.set_header('Content-Type', BINARY_CONTENT_TYPE)
+            self.set_header('X-Array-Shape', ','.join(str(n) for n in array.shape))
+            self.set_header('X-Array-Dtype', array.dtype.str)
+            self.write(array.tobytes())
+        else:
+            self.write_json({'shape': list(array.shape), 'dtype': array.dtype.str,
+                             'data': array, **metadata})
+
+    def write_json(self, obj) -> None:
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps(to_serializable(obj)))
+
+
+class SliceHandler(BaseHandler):
+    async def get(self, identifier: str, plane: str, class_idx: str, i_slice: str):
+        if plane not in ('sagittal', 'coronal', 'horizontal') or int(class_idx) >= n_classes:
+            raise tornado.web.HTTPError(400)
+        if not self.service.is_valid_identifier(identifier):
+            raise tornado.web.HTTPError(404, f'Invalid results set: {identifier}')
+        if self.check_not_modified():
+            return
+        results_set = await self.service.get_results_set(identifier)
+        image = await self.service.run(results_set[int(class_idx)].create_display_slice, plane,
+                                       int(i_slice))
+        self.write_array(image)
+
+
+class RegionHandler(BaseHandler):
+    async def get(self, region_idx: str):
+        identifier = self.get_argument('results_set', 'mean')
+        if int(region_idx) >= self.service.dao.cla.n_regions:
+            raise tornado.web.HTTPError(404, f'Invalid region index: {region_idx}')
+        if identifier != 'all' and not self.service.is_valid_identifier(identifier):
+            raise tornado.web.HTTPError(404, f'Invalid results set: {identifier}')
+        if self.check_not_modified():
+            return
+        data, subject_ids = await self.service.run_locked(self.service.get_region_data,
+                                                          int(region_idx), identifier)
+        self.write_array(data, subject_ids=subject_ids)
+
+
+class LinearModelHandler(BaseHandler):
+    async def get(self, measurement: str):
+        if measurement not in measurements:
+            raise tornado.web.HTTPError(404, f'Invalid measurement: {measurement}')
+        if self.check_not_modified(self.service.get_cache_state(
+                self.service.cache.get_lm_file_name(measurement))):
+            return
+        results = await self.service.run_once(('lm', measurement),
+                                              self.service.get_lm_results, measurement)
+        if self.binary:
+            self.write_array(np.array(results['corr_pvalues'], dtype=np.float32))
+        else:
+            self.write_json(results)
+
+
+class AnovaHandler(BaseHandler):
+    async def get(self, categorical_attr: str, class_idx: str):
+        if categorical_attr not in categorical_attributes or int(class_idx) >= n_classes:
+            raise tornado.web.HTTPError(404)
+        file_name = self.service.cache.get_anova_file_name(categorical_attr, int(class_idx))
+        if self.check_not_modified(self.service.get_cache_state(file_name)):
+            return
+        results = await self.service.run_once(('anova', categorical_attr, int(class_idx)),
+                                              self.service.get_anova_results, categorical_attr,
+                                              int(class_idx))
+        if self.binary:
+            self.write_array(results[['F', 'p']].values.astype(np.float32))
+        else:
+            self.write_json(results)
+
+
+def create_app(service: ApiService) -> tornado.web.Application:
+    kwargs = dict(service=service)
+    return tornado.web.Application([
+        (r'/slices/(\w+)/(\w+)/(\d+)/(\d+)', SliceHandler, kwargs),
+        (r'/regions/(\d+)', RegionHandler, kwargs),
+        (r'/lm/(\w+)', LinearModelHandler, kwargs),
+        (r'/anova/(\w+)/(\d+)', AnovaHandler, kwargs),
+    ])
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Serve slices and region statistics')
+    parser.add_argument('--port', type=int, default=5007)
+    parser.add_argument('--workers', type=int, default=None, help='number of executor threads')
+    args = parser.parse_args(argv)
+    service = ApiService(DataAccessObject(), n_workers=args.workers)
+    create_app(service).listen(args.port)
+    # Hash the cohort data before serving rather than on the first request
+    print(f'Serving cohort {service.cohort_hash[:16]} on port {args.port}...')
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+The research package reads its atlas template (relative to the working directory) on import, so
+the tests run from a temporary directory holding a small synthetic atlas in the same layout
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import nibabel as nib
+import numpy as np
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATES_DIR = os.path.join('research', 'data_classes', 'cortical_layers', 'templates')
+TEMPLATE_SHAPE = (16, 18, 14)
+N_REGIONS = 40
+
+_original_dir = os.getcwd()
+_fixture_dir = None
+
+
+def create_fixture_templates(path: str) -> None:
+    """
+    Creates an ellipsoid brain template split into N_REGIONS connected regions and its surface
+    template (the outer shell)
+
+    :param path: fixture directory
+    :type path: str
+    :return:
+    """
+    x, y, z = np.indices(TEMPLATE_SHAPE)
+    center = (np.array(TEMPLATE_SHAPE) - 1) / 2
+
+    def ellipsoid(scale: float) -> np.ndarray:
+        radii = scale * np.array(TEMPLATE_SHAPE) / 2
+        return sum(((axis - c) / r) ** 2 for axis, c, r in zip((x, y, z), center, radii)) < 1
+
+    brain = ellipsoid(0.95)
+    # Voronoi cells of evenly spread seed voxels, so every region is a connected set of voxels
+    coordinates = np.column_stack(np.nonzero(brain))
+    seeds = coordinates[np.linspace(0, len(coordinates) - 1, N_REGIONS).astype(int)]
+    distances = ((coordinates[:, np.newaxis, :] - seeds[np.newaxis, :, :]) ** 2).sum(axis=2)
+    template = np.zeros(TEMPLATE_SHAPE, dtype=np.int16)
+    template[tuple(coordinates.T)] = distances.argmin(axis=1) + 1
+    surface = (brain & ~ellipsoid(0.75)).astype(np.int16)
+    templates_dir = os.path.join(path, TEMPLATES_DIR)
+    os.makedirs(templates_dir)
+    nib.save(nib.Nifti1Image(template, np.eye(4)), os.path.join(templates_dir, 'AAL1000.nii'))
+    nib.save(nib.Nifti1Image(surface, np.eye(4)),
+             os.path.join(templates_dir, 'surface_template.nii'))
+
+
+def pytest_configure(config):
+    global _fixture_dir
+    _fixture_dir = tempfile.mkdtemp(prefix='research_tests_')
+    create_fixture_templates(_fixture_dir)
+    os.chdir(_fixture_dir)
+    sys.path.insert(0, REPOSITORY_DIR)
+
+
+def pytest_unconfigure(config):
+    os.chdir(_original_dir)
+    shutil.rmtree(_fixture_dir, ignore_errors=True)
+
+
+def create_stacked_pbrs(n_subjects: int, n_regions: int = N_REGIONS, seed: int = 0) -> tuple:
+    """
+    Creates random class probabilities (Dirichlet distributed over the six classes)
+
+    :param n_subjects: number of subjects
+    :type n_subjects: int
+    :param n_regions: number of regions
+    :type n_regions: int
+    :param seed: random seed
+    :type seed: int
+    :return: stacked data (region x class x subject) and subject IDs
+    :rtype: tuple
+    """
+    rng = np.random.default_rng(seed)
+    data = rng.dirichlet(np.ones(6), (n_regions, n_subjects)).transpose(0, 2, 1)
+    subject_ids = [f'subject_{i:03d}' for i in range(n_subjects)]
+    return data.astype(np.float32), subject_ids
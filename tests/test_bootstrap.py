@@ -0,0 +1,24 @@
+import numpy as np
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.bootstrap import BootstrapEngine, \
+    draw_resample_weights
+
+
+def test_percentiles_match_the_full_bootstrap_distribution():
+    stacked, _ = create_stacked_pbrs(15, n_regions=10)
+    engine = BootstrapEngine(stacked, n_resamples=250, batch_size=60, seed=7, n_workers=2)
+    assert len(engine.get_feature_blocks()) > 1
+    lower, upper = engine.calculate_confidence_interval(0.9)
+    # The full distribution, drawn from the same batch seeds
+    data = stacked.reshape(-1, 15).astype(float)
+    seeds = np.random.SeedSequence(7).spawn(len(engine.get_batch_sizes()))
+    distribution = np.concatenate([
+        data @ draw_resample_weights(np.random.default_rng(seed), batch_size, 15).T / 15
+        for seed, batch_size in zip(seeds, engine.get_batch_sizes())], axis=1)
+    expected_lower, expected_upper = np.percentile(distribution.astype(np.float32), [5, 95],
+                                                   axis=1)
+    np.testing.assert_allclose(lower.ravel(), expected_lower, rtol=1e-6)
+    np.testing.assert_allclose(upper.ravel(), expected_upper, rtol=1e-6)
+    mean = stacked.mean(axis=-1, dtype=float)
+    assert (lower <= mean + 1e-6).all() and (mean <= upper + 1e-6).all()
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.analysis import CorticalLayersAnalysis
+from research.data_classes.cortical_layers.chunked_analysis import \
+    ChunkedCorticalLayersAnalysis, is_store_current
+from research.data_classes.cortical_layers.probability_by_region_matrix import \
+    ProbabilityByRegionMatrix
+
+N_SUBJECTS = 24
+
+
+@pytest.fixture
+def pbr_files(tmp_path) -> list:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS)
+    files = []
+    for subject_idx, subject_id in enumerate(subject_ids):
+        path = str(tmp_path / f'{subject_id}.npy')
+        np.save(path, stacked[:, :, subject_idx])
+        files.append(path)
+    return files
+
+
+def create_analyses(files: list, store_path: str, n_workers: int = 1) -> tuple:
+    in_memory = CorticalLayersAnalysis([ProbabilityByRegionMatrix(from_file=file)
+                                        for file in files])
+    # A budget of a few regions splits the analysis into several blocks
+    region_bytes = 6 * len(files) * 8
+    chunked = ChunkedCorticalLayersAnalysis(files=files, store_path=store_path,
+                                            memory_budget=3 * region_bytes, n_workers=n_workers)
+    return in_memory, chunked
+
+
+def test_store_matches_in_memory_data(pbr_files, tmp_path):
+    in_memory, chunked = create_analyses(pbr_files, str(tmp_path / 'store' / 'stacked.npy'))
+    assert len(chunked.get_region_blocks()) > 1
+    assert chunked.subject_ids == in_memory.subject_ids
+    np.testing.assert_array_equal(chunked.stacked_pbrs, in_memory.stacked_pbrs)
+    np.testing.assert_array_equal(chunked.mean_pbr.data, in_memory.mean_pbr.data)
+    np.testing.assert_array_equal(chunked.std_pbr.data, in_memory.std_pbr.data)
+    subject_id = in_memory.subject_ids[5]
+    np.testing.assert_array_equal(chunked.get_pbr_by_subject_id(subject_id).data,
+                                  in_memory.get_pbr_by_subject_id(subject_id).data)
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_region_models_match_in_memory_results(pbr_files, tmp_path, n_workers):
+    in_memory, chunked = create_analyses(pbr_files, str(tmp_path / 'stacked.npy'), n_workers)
+    rng = np.random.default_rng(1)
+    scores = pd.DataFrame({'score': rng.normal(size=N_SUBJECTS)}, index=in_memory.subject_ids)
+    groups = pd.DataFrame({'group': rng.choice(['a', 'b', 'c'], N_SUBJECTS)},
+                          index=in_memory.subject_ids)
+    regions = range(in_memory.n_regions)
+    expected = in_memory.calculate_regions_lm_results(regions, scores)
+    for (r2, r2_adj, pvalues), (expected_r2, expected_r2_adj, expected_pvalues) in zip(
+            chunked.calculate_regions_lm_results(regions, scores), expected):
+        assert r2 == pytest.approx(expected_r2)
+        assert r2_adj == pytest.approx(expected_r2_adj)
+        np.testing.assert_allclose(pvalues.values, expected_pvalues.values)
+    pd.testing.assert_frame_equal(chunked.calculate_anova(2, groups),
+                                  in_memory.calculate_anova(2, groups))
+
+
+def test_store_is_rebuilt_when_a_file_changes(pbr_files, tmp_path):
+    store_path = str(tmp_path / 'stacked.npy')
+    ChunkedCorticalLayersAnalysis(files=pbr_files, store_path=store_path, n_workers=1)
+    assert is_store_current(pbr_files, store_path)
+    modified = np.load(pbr_files[3])[::-1]
+    np.save(pbr_files[3], modified)
+    stat = os.stat(pbr_files[3])
+    os.utime(pbr_files[3], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert not is_store_current(pbr_files, store_path)
+    chunked = ChunkedCorticalLayersAnalysis(files=pbr_files, store_path=store_path, n_workers=1)
+    np.testing.assert_array_equal(chunked.stacked_pbrs[:, :, 3], modified)
+    assert not is_store_current(pbr_files[:-1], store_path)
@@ -0,0 +1,56 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from scipy import ndimage
+from conftest import N_REGIONS
+from research.data_classes.cortical_layers.cfg import atlas
+from research.data_classes.cortical_layers.clusters import ClusterInference
+
+
+def test_adjacency_matches_face_neighbouring_voxels():
+    template = atlas.template
+    expected = set()
+    for voxel in itertools.product(*(range(n) for n in template.shape)):
+        label = template[voxel]
+        for axis in range(3):
+            neighbour = list(voxel)
+            neighbour[axis] += 1
+            if label and neighbour[axis] < template.shape[axis]:
+                neighbour_label = template[tuple(neighbour)]
+                if neighbour_label and neighbour_label != label:
+                    expected.add((label - 1, neighbour_label - 1))
+                    expected.add((neighbour_label - 1, label - 1))
+    rows, columns = atlas.adjacency.nonzero()
+    assert atlas.adjacency.shape == (N_REGIONS, N_REGIONS)
+    assert set(zip(rows.tolist(), columns.tolist())) == expected
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_clusters_match_connected_voxels(seed):
+    # Every synthetic region is connected, so clusters of regions are connected voxel components
+    region_mask = np.random.default_rng(seed).random(N_REGIONS) < 0.15
+    voxel_counts = atlas.get_region_voxel_counts()
+    inference = ClusterInference(atlas.adjacency, weights=voxel_counts)
+    labels = inference.find_clusters(region_mask)
+    assert (labels[~region_mask] == -1).all()
+    selected_voxels = region_mask[np.maximum(atlas.template, 1) - 1] & (atlas.template > 0)
+    voxel_labels, n_components = ndimage.label(selected_voxels)
+    assert labels.max() + 1 == n_components > 1
+    expected_extents = np.bincount(voxel_labels[voxel_labels > 0])[1:]
+    extents = inference.get_cluster_extents(labels)
+    assert sorted(extents.tolist()) == sorted(expected_extents.tolist())
+    assert inference.get_max_extent(region_mask) == expected_extents.max()
+
+
+def test_cluster_p_values():
+    region_mask = np.zeros(N_REGIONS, dtype=bool)
+    region_mask[[0, 1]] = True
+    inference = ClusterInference(atlas.adjacency)
+    null_distribution = np.array([0., 1., 2., 3., 5.])
+    labels, clusters = inference.test_clusters(region_mask, null_distribution)
+    for cluster_idx, cluster in clusters.iterrows():
+        assert cluster['n_regions'] == (labels == cluster_idx).sum()
+        expected = ((null_distribution >= cluster['extent']).sum() + 1) / 6
+        assert cluster['p'] == pytest.approx(expected)
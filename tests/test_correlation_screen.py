@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scipy import stats
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.correlation_screen import CorrelationScreen
+
+N_SUBJECTS = 35
+PAIRS = [(0, 0), (6, 2), (12, 5)]
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS, n_regions=15)
+    rng = np.random.default_rng(7)
+    features = pd.DataFrame({'x': rng.normal(size=N_SUBJECTS),
+                             'y': stacked[6, 2] + rng.normal(scale=0.05, size=N_SUBJECTS)},
+                            index=subject_ids)
+    covariates = pd.DataFrame({'age': rng.uniform(20, 80, N_SUBJECTS),
+                               'sex': rng.choice(['f', 'm'], N_SUBJECTS)}, index=subject_ids)
+    return stacked, subject_ids, features, covariates
+
+
+def test_correlations_match_scipy(cohort):
+    stacked, subject_ids, features, _ = cohort
+    screen = CorrelationScreen(stacked, subject_ids).fit(features)
+    for region_idx, class_idx in PAIRS:
+        for measure_idx, measure in enumerate(features.columns):
+            r, p = stats.pearsonr(stacked[region_idx, class_idx].astype(float),
+                                  features[measure])
+            assert screen.r[region_idx, class_idx, measure_idx] == pytest.approx(r)
+            assert screen.p[region_idx, class_idx, measure_idx] == pytest.approx(p)
+    significant = screen.get_significant()
+    assert (significant['measure'] == 'y').any()
+    assert significant.iloc[0][['region', 'class']].tolist() == [6, 2]
+
+
+def test_pairwise_missing_correlations_match_pandas(cohort):
+    stacked, subject_ids, features, _ = cohort
+    features = features.copy()
+    features.iloc[[1, 4, 9], 0] = np.nan
+    features.iloc[[4, 20], 1] = np.nan
+    screen = CorrelationScreen(stacked, subject_ids).fit(features)
+    for region_idx, class_idx in PAIRS:
+        probabilities = pd.Series(stacked[region_idx, class_idx].astype(float),
+                                  index=subject_ids)
+        for measure_idx, measure in enumerate(features.columns):
+            valid = features[measure].notnull()
+            assert screen.r[region_idx, class_idx, measure_idx] == pytest.approx(
+                probabilities.corr(features[measure]))
+            assert screen.n[region_idx, class_idx, measure_idx] == valid.sum()
+            _, p = stats.pearsonr(probabilities[valid], features[measure][valid])
+            assert screen.p[region_idx, class_idx, measure_idx] == pytest.approx(p)
+
+
+def test_partial_correlations_match_residual_correlations(cohort):
+    stacked, subject_ids, features, covariates = cohort
+    covariates = covariates.copy()
+    covariates.iloc[3, 0] = np.nan
+    screen = CorrelationScreen(stacked, subject_ids).fit(features, covariates)
+    complete = covariates.notnull().all(axis=1).values
+    design = np.column_stack([np.ones(complete.sum()), covariates['age'][complete],
+                              covariates['sex'][complete] == 'm']).astype(float)
+
+    def residualize(values: np.ndarray) -> np.ndarray:
+        return values - design @ np.linalg.lstsq(design, values, rcond=None)[0]
+
+    for region_idx, class_idx in PAIRS:
+        x = residualize(stacked[region_idx, class_idx][complete].astype(float))
+        for measure_idx, measure in enumerate(features.columns):
+            y = residualize(features[measure].values[complete])
+            r = np.corrcoef(x, y)[0, 1]
+            df = complete.sum() - 2 - 2
+            p = 2 * stats.t.sf(abs(r) * np.sqrt(df / (1 - r ** 2)), df)
+            assert screen.r[region_idx, class_idx, measure_idx] == pytest.approx(r)
+            assert screen.p[region_idx, class_idx, measure_idx] == pytest.approx(p)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.decomposition import CohortDecomposition
+
+
+def calculate_exact_svd(stacked: np.ndarray) -> tuple:
+    profiles = stacked.astype(float).reshape(-1, stacked.shape[-1])
+    centered = profiles - profiles.mean(axis=1, keepdims=True)
+    u, s, vt = np.linalg.svd(centered, full_matrices=False)
+    return u.T, s, centered
+
+
+def assert_components_match(components: np.ndarray, expected: np.ndarray) -> None:
+    # Components are only defined up to their sign
+    signs = np.sign((components * expected).sum(axis=1))
+    np.testing.assert_allclose(components * signs[:, np.newaxis], expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('block_size', [None, 7])
+def test_components_match_exact_svd(block_size):
+    stacked, subject_ids = create_stacked_pbrs(30)
+    decomposition = CohortDecomposition(n_components=5, block_size=block_size).fit(
+        stacked, subject_ids)
+    components, s, centered = calculate_exact_svd(stacked)
+    # The random stacked data has a flat spectrum, so compare the exactly determined case
+    exact = CohortDecomposition(n_components=5, n_oversamples=30,
+                                block_size=block_size).fit(stacked, subject_ids)
+    np.testing.assert_allclose(exact.singular_values, s[:5], rtol=1e-8)
+    assert_components_match(exact.components, components[:5])
+    assert exact.total_variance == pytest.approx((centered ** 2).sum() / 29)
+    assert decomposition.singular_values[0] <= s[0] * (1 + 1e-8)
+    assert decomposition.explained_variance_ratio.sum() <= 1
+    np.testing.assert_allclose(exact.transform(stacked), exact.scores.values, atol=1e-8)
+    np.testing.assert_allclose(exact.transform(stacked[:, :, 4]), exact.scores.values[4],
+                               atol=1e-8)
+
+
+def test_components_are_clamped_to_the_number_of_subjects():
+    stacked, subject_ids = create_stacked_pbrs(8)
+    decomposition = CohortDecomposition(n_components=10).fit(stacked, subject_ids)
+    assert decomposition.n_components == 8
+    assert decomposition.component_names == [f'pc{i}' for i in range(1, 9)]
+    assert decomposition.scores.shape == (8, 8)
+    _, s, _ = calculate_exact_svd(stacked)
+    np.testing.assert_allclose(decomposition.singular_values, s[:8], rtol=1e-8, atol=1e-8)
+
+
+def test_components_are_clamped_to_the_number_of_features():
+    stacked, subject_ids = create_stacked_pbrs(20, n_regions=1)
+    decomposition = CohortDecomposition(n_components=10).fit(stacked, subject_ids)
+    assert decomposition.n_components == 6
+    assert decomposition.components.shape == (6, 6)
+    _, s, _ = calculate_exact_svd(stacked)
+    np.testing.assert_allclose(decomposition.singular_values, s, rtol=1e-8, atol=1e-8)
+
+
+def test_save_and_load(tmp_path):
+    stacked, subject_ids = create_stacked_pbrs(12)
+    decomposition = CohortDecomposition(n_components=3).fit(stacked, subject_ids)
+    path = str(tmp_path / 'decomposition.npz')
+    decomposition.save(path)
+    loaded = CohortDecomposition.load(path)
+    np.testing.assert_array_equal(loaded.components, decomposition.components)
+    assert loaded.component_names == decomposition.component_names
+    assert list(loaded.scores.index) == subject_ids
+    np.testing.assert_allclose(loaded.explained_variance_ratio,
+                               decomposition.explained_variance_ratio)
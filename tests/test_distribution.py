@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from scipy import stats
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.distribution import CohortDistribution
+
+N_SUBJECTS = 30
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS, n_regions=10)
+    # Ties, missing values, an empty row and values on the histogram's edges
+    stacked = np.round(stacked, 2)
+    stacked[1, 0, [2, 5, 11]] = np.nan
+    stacked[2, 1] = np.nan
+    stacked[3, 2, :3] = [0, 1, 0.5]
+    return stacked, subject_ids
+
+
+def test_quantiles_match_nanquantile(cohort):
+    stacked, subject_ids = cohort
+    distribution = CohortDistribution().fit(stacked, subject_ids)
+    with np.errstate(invalid='ignore'), pytest.warns(RuntimeWarning):
+        expected = np.nanquantile(stacked.astype(float), distribution.quantiles, axis=-1)
+    np.testing.assert_allclose(distribution.quantile_values, np.moveaxis(expected, 0, -1),
+                               rtol=1e-6)
+    assert np.isnan(distribution.quantile_values[2, 1]).all()
+    np.testing.assert_allclose(distribution.iqr, expected[3] - expected[1], rtol=1e-6)
+    with pytest.raises(ValueError):
+        distribution.get_quantile(0.1)
+
+
+def test_percentile_ranks_match_scipy(cohort):
+    stacked, subject_ids = cohort
+    distribution = CohortDistribution().fit(stacked, subject_ids)
+    for region_idx, class_idx in [(0, 0), (1, 0), (3, 2), (7, 4)]:
+        values = stacked[region_idx, class_idx]
+        valid = values[np.isfinite(values)]
+        expected = [stats.percentileofscore(valid, value, kind='mean')
+                    if np.isfinite(value) else np.nan for value in values]
+        np.testing.assert_allclose(distribution.percentile_ranks[region_idx, class_idx],
+                                   expected, rtol=1e-5)
+    np.testing.assert_array_equal(distribution.get_subject_percentiles(subject_ids[4]),
+                                  distribution.percentile_ranks[..., 4])
+
+
+def test_counts_match_histogram(cohort):
+    stacked, subject_ids = cohort
+    distribution = CohortDistribution().fit(stacked, subject_ids)
+    for region_idx in range(stacked.shape[0]):
+        for class_idx in range(stacked.shape[1]):
+            values = stacked[region_idx, class_idx]
+            expected, _ = np.histogram(values[np.isfinite(values)], bins=distribution.bin_edges)
+            np.testing.assert_array_equal(distribution.counts[region_idx, class_idx], expected)
+
+
+def test_save_and_load(cohort, tmp_path):
+    stacked, subject_ids = cohort
+    distribution = CohortDistribution().fit(stacked, subject_ids)
+    path = str(tmp_path / 'distribution' / 'cohort.npz')
+    distribution.save(path)
+    loaded = CohortDistribution.load(path)
+    np.testing.assert_array_equal(loaded.quantiles, distribution.quantiles)
+    np.testing.assert_array_equal(loaded.quantile_values, distribution.quantile_values)
+    np.testing.assert_array_equal(loaded.counts, distribution.counts)
+    np.testing.assert_array_equal(loaded.percentile_ranks, distribution.percentile_ranks)
+    assert loaded.subject_ids == subject_ids
+    assert loaded.n_bins == distribution.n_bins
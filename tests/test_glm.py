@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.glm import GeneralLinearModel
+
+N_SUBJECTS = 40
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS)
+    rng = np.random.default_rng(2)
+    covariates = pd.DataFrame({'age': rng.uniform(20, 80, N_SUBJECTS),
+                               'sex': rng.choice(['f', 'm'], N_SUBJECTS),
+                               'site': rng.choice(['x', 'y', 'z'], N_SUBJECTS)},
+                              index=subject_ids)
+    covariates.iloc[[3, 17], 0] = np.nan
+    return stacked, subject_ids, covariates
+
+
+def fit_ols(stacked: np.ndarray, subject_ids: list, model: GeneralLinearModel, region_idx: int,
+            class_idx: int):
+    design = model.design
+    y = pd.Series(stacked[region_idx, class_idx].astype(float), index=subject_ids)
+    return sm.OLS(y.reindex(design.index), design).fit()
+
+
+def test_t_contrast_matches_ols(cohort):
+    stacked, subject_ids, covariates = cohort
+    model = GeneralLinearModel.from_formula('age + C(sex) + C(site)', covariates)
+    model.fit(stacked, subject_ids)
+    assert model.n_subjects == N_SUBJECTS - 2
+    results = model.test_contrast('age')
+    for region_idx, class_idx in [(0, 0), (7, 3), (39, 5)]:
+        ols = fit_ols(stacked, subject_ids, model, region_idx, class_idx)
+        assert results['effect'][region_idx, class_idx] == pytest.approx(ols.params['age'])
+        assert results['t'][region_idx, class_idx] == pytest.approx(ols.tvalues['age'])
+        assert results['p'][region_idx, class_idx] == pytest.approx(ols.pvalues['age'])
+
+
+def test_f_contrast_matches_ols(cohort):
+    stacked, subject_ids, covariates = cohort
+    model = GeneralLinearModel.from_formula('age + C(site)', covariates).fit(stacked,
+                                                                            subject_ids)
+    site_columns = [column for column in model.columns if column.startswith('C(site)')]
+    contrast = np.zeros((len(site_columns), len(model.columns)))
+    for row, column in enumerate(site_columns):
+        contrast[row, model.columns.index(column)] = 1
+    results = model.test_contrast(contrast)
+    ols = fit_ols(stacked, subject_ids, model, 11, 2)
+    f_test = ols.f_test(contrast)
+    assert results['F'][11, 2] == pytest.approx(float(np.squeeze(f_test.fvalue)))
+    assert results['p'][11, 2] == pytest.approx(float(f_test.pvalue))
+
+
+def test_design_matrix_subjects_are_aligned(cohort):
+    stacked, subject_ids, covariates = cohort
+    design = pd.DataFrame({'intercept': 1., 'age': covariates['age']}).iloc[::-1]
+    model = GeneralLinearModel(design).fit(stacked, subject_ids)
+    expected = GeneralLinearModel.from_formula('age', covariates).fit(stacked, subject_ids)
+    np.testing.assert_allclose(model.test_contrast('age')['t'],
+                               expected.test_contrast('age')['t'])
+
+
+def test_invalid_contrasts_and_designs(cohort):
+    stacked, subject_ids, covariates = cohort
+    model = GeneralLinearModel.from_formula('age', covariates)
+    with pytest.raises(RuntimeError):
+        model.test_contrast('age')
+    model.fit(stacked, subject_ids)
+    with pytest.raises(ValueError):
+        model.test_contrast('height')
+    with pytest.raises(ValueError):
+        GeneralLinearModel.from_formula('age', covariates).fit(stacked[:, :, :2],
+                                                               subject_ids[:2])
+
+
+def test_design_cache_is_bounded(cohort):
+    stacked, subject_ids, covariates = cohort
+    for n_subjects in range(10, 10 + GeneralLinearModel.design_cache_size + 5):
+        GeneralLinearModel.from_formula('age', covariates.iloc[:n_subjects]).fit(stacked,
+                                                                                 subject_ids)
+    assert len(GeneralLinearModel._design_cache) == GeneralLinearModel.design_cache_size
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from scipy import stats
+from statsmodels.stats.multitest import fdrcorrection
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.group_contrast import GroupContrast
+from research.data_classes.cortical_layers.multitest import fdr_correction
+
+
+@pytest.fixture
+def groups() -> tuple:
+    stacked, _ = create_stacked_pbrs(30)
+    # Unequal group sizes and variances
+    group_a = stacked[:, :, :12]
+    group_b = np.clip(stacked[:, :, 12:] * 1.5 - 0.05, 0, 1).astype(np.float32)
+    return group_a, group_b
+
+
+def test_welch_t_test_matches_scipy(groups):
+    group_a, group_b = groups
+    contrast = GroupContrast(group_a, group_b)
+    expected = stats.ttest_ind(group_a.astype(float), group_b.astype(float), axis=-1,
+                               equal_var=False)
+    np.testing.assert_allclose(contrast.t, expected.statistic, rtol=1e-10)
+    np.testing.assert_allclose(contrast.p, expected.pvalue, rtol=1e-8)
+
+
+def test_cohens_d_matches_pooled_definition(groups):
+    group_a, group_b = groups
+    contrast = GroupContrast(group_a, group_b)
+    a, b = group_a[3, 1].astype(float), group_b[3, 1].astype(float)
+    pooled_std = np.sqrt(((len(a) - 1) * a.var(ddof=1) + (len(b) - 1) * b.var(ddof=1)) /
+                         (len(a) + len(b) - 2))
+    assert contrast.d[3, 1] == pytest.approx((a.mean() - b.mean()) / pooled_std)
+
+
+def test_fdr_is_corrected_across_regions_per_class(groups):
+    contrast = GroupContrast(*groups)
+    for class_idx in range(contrast.p.shape[1]):
+        np.testing.assert_allclose(contrast.p_fdr[:, class_idx],
+                                   fdrcorrection(contrast.p[:, class_idx])[1])
+
+
+def test_fdr_correction_ignores_missing_pvalues():
+    pvalues = np.array([[0.01, 0.2], [np.nan, 0.03], [0.04, np.nan], [0.5, 0.001]])
+    corrected = fdr_correction(pvalues, axis=0)
+    np.testing.assert_array_equal(np.isnan(corrected), np.isnan(pvalues))
+    for column in range(pvalues.shape[1]):
+        valid = np.isfinite(pvalues[:, column])
+        np.testing.assert_allclose(corrected[valid, column],
+                                   fdrcorrection(pvalues[valid, column])[1])
+
+
+def test_constant_regions_remain_missing_in_maps(groups):
+    group_a, group_b = groups
+    group_a, group_b = group_a.copy(), group_b.copy()
+    group_a[0], group_b[0] = 0.5, 0.5
+    contrast = GroupContrast(group_a, group_b)
+    assert np.isnan(contrast.p[0]).all() and np.isnan(contrast.p_fdr[0]).all()
+    statistic_map = contrast.create_map('p', 0)
+    assert np.isnan(statistic_map.region_values[0])
+    assert np.isfinite(statistic_map.region_values[1:]).all()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from statsmodels.stats.outliers_influence import OLSInfluence
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.influence import RegressionInfluence
+
+N_SUBJECTS = 30
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS, n_regions=6)
+    rng = np.random.default_rng(4)
+    scores = pd.DataFrame({'score': rng.normal(size=N_SUBJECTS)}, index=subject_ids)
+    scores.iloc[[2, 20], 0] = np.nan
+    return stacked, subject_ids, scores
+
+
+def test_diagnostics_match_statsmodels(cohort):
+    stacked, subject_ids, scores = cohort
+    influence = RegressionInfluence(stacked, subject_ids).fit(scores)
+    assert len(influence.subject_ids) == N_SUBJECTS - 2
+    subject_mask = np.isin(subject_ids, influence.subject_ids)
+    y = scores['score'].reindex(influence.subject_ids).values
+    for region_idx in range(stacked.shape[0]):
+        X = stacked[region_idx][:, subject_mask].T.astype(float)
+        expected = OLSInfluence(sm.OLS(y, X).fit())
+        np.testing.assert_allclose(influence.leverage[region_idx], expected.hat_matrix_diag,
+                                   atol=1e-8)
+        np.testing.assert_allclose(influence.cooks_distance[region_idx],
+                                   expected.cooks_distance[0], rtol=1e-6)
+        np.testing.assert_allclose(influence.dfbetas[region_idx], expected.dfbetas, rtol=1e-6,
+                                   atol=1e-10)
+
+
+def test_subjects_with_leverage_one(cohort):
+    stacked, subject_ids, scores = cohort
+    stacked = stacked.copy()
+    # Only one subject has any probability of the first class in region 0
+    stacked[0, 0] = 0
+    stacked[0, 0, 5] = 0.5
+    influence = RegressionInfluence(stacked, subject_ids).fit(scores)
+    subject_idx = influence.subject_ids.index(subject_ids[5])
+    assert influence.leverage[0, subject_idx] == pytest.approx(1)
+    assert np.isnan(influence.cooks_distance[0, subject_idx])
+    assert np.isnan(influence.dfbetas[0, subject_idx]).all()
+    other = np.arange(len(influence.subject_ids)) != subject_idx
+    assert np.isfinite(influence.cooks_distance[0, other]).all()
+    assert np.isfinite(influence.dfbetas[0, other]).all()
+    assert np.isfinite(influence.cooks_distance[1:]).all()
+    summary = influence.get_influential_subjects()
+    assert summary.loc[subject_ids[5], 'n_high_leverage'] >= 1
+    assert summary['max_cooks_distance'].notnull().all()
+
+
+def test_too_few_subjects(cohort):
+    stacked, subject_ids, scores = cohort
+    with pytest.raises(ValueError):
+        RegressionInfluence(stacked, subject_ids).fit(scores.iloc[:7])
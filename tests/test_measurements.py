@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from research.data_classes.sheets.xlsx_parser.measurements.measurements import Measurements
+
+
+@pytest.fixture
+def measurements() -> Measurements:
+    df = pd.DataFrame({
+        'subject_id': ['a', 'a', 'a', 'b', 'b', 'c'],
+        'date': ['2019-01-01', None, '2020-06-01', '2018-03-01', '2018-01-01', None],
+        'weight': [70., 90., 72., 60., 61., 80.],
+        'height': [180., 181., np.nan, 165., np.nan, np.nan],
+    }).set_index('subject_id')
+    return Measurements(df)
+
+
+def test_latest_values_prefer_dated_values(measurements):
+    latest = measurements.get_latest_values('weight')
+    # Subject c only has an undated value, which is used
+    assert latest.to_dict() == {'a': 72., 'b': 60., 'c': 80.}
+    assert measurements.get_latest_values('height').to_dict() == {'a': 180., 'b': 165.}
+
+
+def test_subject_latest_values_match_cohort_latest_values(measurements):
+    for measurement in ('weight', 'height'):
+        latest = measurements.get_latest_values(measurement)
+        for subject_id in ('a', 'b', 'c'):
+            subject_measurements = measurements.get_subject_measurements(subject_id)
+            value = subject_measurements.get_last_measurement_value(measurement)
+            assert value == latest.get(subject_id)
+
+
+def test_values_as_of(measurements):
+    dates = pd.Series({'a': '2019-12-31', 'b': '2018-02-15', 'c': '2019-01-01', 'd': None})
+    backward = measurements.get_values_as_of('weight', dates)
+    assert backward['a'] == 70. and backward['b'] == 61.
+    assert np.isnan(backward['c']) and np.isnan(backward['d'])
+    nearest = measurements.get_values_as_of('weight', dates, direction='nearest')
+    assert nearest['a'] == 72. and nearest['b'] == 60.
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from research.data_classes.cortical_layers.brain_atlas import BrainAtlas
+from research.data_classes.cortical_layers.cfg import aal_1000_path, precision
+from research.data_classes.cortical_layers.precision import PrecisionPolicy
+
+
+def test_uint8_display_keeps_missing_values():
+    policy = PrecisionPolicy(display='uint8')
+    data = np.array([[0., 0.5, np.nan], [1., 2., -1.]], dtype=np.float32)
+    quantized = policy.to_display(data)
+    assert quantized.dtype == np.uint8
+    assert quantized[0, 2] == policy.uint8_nan
+    assert quantized[[0, 1, 1, 1], [0, 0, 1, 2]].tolist() == [0, policy.uint8_max,
+                                                            policy.uint8_max, 0]
+    restored = policy.dequantize(quantized)
+    assert np.isnan(restored[0, 2])
+    np.testing.assert_allclose(restored[0, :2], data[0, :2], atol=0.5 / policy.uint8_max)
+
+
+@pytest.mark.parametrize('display', ['float32', 'float16'])
+def test_float_display_modes(display):
+    policy = PrecisionPolicy(display=display)
+    data = np.array([0.25, np.nan], dtype=np.float32)
+    displayed = policy.to_display(data)
+    assert displayed.dtype == np.dtype(display)
+    assert displayed[0] == 0.25 and np.isnan(displayed[1])
+
+
+def test_invalid_display_mode():
+    with pytest.raises(ValueError):
+        PrecisionPolicy(display='int8')
+
+
+def test_atlas_defaults_to_the_configured_policy():
+    assert BrainAtlas(name='AAL', path=aal_1000_path).precision is precision
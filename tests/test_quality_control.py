@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.quality_control import QualityControl, \
+    calculate_robust_z
+
+
+def test_robust_z_matches_direct_mad():
+    data = np.random.default_rng(5).normal(size=(4, 25))
+    data[1, 3] = np.nan
+    data[2] = 1.
+    z = calculate_robust_z(data, axis=1)
+    for row, row_z in zip(data[[0, 1, 3]], z[[0, 1, 3]]):
+        values = row[np.isfinite(row)]
+        median = np.median(values)
+        mad = np.median(np.abs(values - median))
+        np.testing.assert_allclose(row_z[np.isfinite(row)], 0.6745 * (values - median) / mad)
+    assert (z[2] == 0).all()
+
+
+def test_report_counts_planted_problems():
+    stacked, subject_ids = create_stacked_pbrs(20)
+    stacked = stacked.astype(float)
+    stacked[0, 1, 0] = np.nan
+    stacked[[1, 2], 0, 1] = -0.1
+    stacked[3, :, 2] *= 1.5
+    stacked[[4, 5, 6], :, 3] = 0
+    # An outlier subject with every class probability in the first class
+    stacked[:, :, 4] = 0
+    stacked[:, 0, 4] = 1
+    report = QualityControl(stacked, subject_ids).create_report()
+    assert report.loc[subject_ids[0], 'n_nan'] == 1
+    assert report.loc[subject_ids[1], 'n_negative'] == 2
+    assert report.loc[subject_ids[1], 'n_bad_sum'] == 2
+    assert report.loc[subject_ids[2], 'n_bad_sum'] == 1
+    assert report.loc[subject_ids[3], 'n_empty'] == 3
+    assert report.loc[subject_ids[4], 'is_outlier']
+    assert report.loc[subject_ids[4], 'outlier_score'] == pytest.approx(
+        report['outlier_score'].max())
+    assert not report.loc[subject_ids[:5], 'passed'].any()
+    assert report.loc[subject_ids[5:], 'passed'].all()
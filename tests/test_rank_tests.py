@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scipy import stats
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.rank_tests import RankTests, rank_data
+
+N_SUBJECTS = 30
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS, n_regions=8)
+    # Rounding creates ties
+    stacked = np.round(stacked, 1)
+    stacked[2, 3, 5] = np.nan
+    stacked[4, 0, [1, 9]] = np.nan
+    rng = np.random.default_rng(3)
+    groups = pd.DataFrame({'group': rng.choice(['a', 'b', 'c'], N_SUBJECTS).astype(object)},
+                          index=subject_ids)
+    groups.iloc[7, 0] = None
+    scores = pd.DataFrame({'score': np.round(rng.normal(size=N_SUBJECTS), 1)},
+                          index=subject_ids)
+    scores.iloc[11, 0] = np.nan
+    return stacked, subject_ids, groups, scores
+
+
+def test_rank_data_matches_scipy():
+    data = np.array([[3., 1., np.nan, 1., 2.], [np.nan, 5., 5., 5., 0.]])
+    ranks, tie_terms = rank_data(data)
+    for row, row_ranks, tie_term in zip(data, ranks, tie_terms):
+        valid = np.isfinite(row)
+        np.testing.assert_array_equal(row_ranks[valid], stats.rankdata(row[valid]))
+        assert np.isnan(row_ranks[~valid]).all()
+        _, tie_sizes = np.unique(row[valid], return_counts=True)
+        assert tie_term == (tie_sizes ** 3 - tie_sizes).sum()
+
+
+def test_kruskal_wallis_matches_scipy(cohort):
+    stacked, subject_ids, groups, _ = cohort
+    results = RankTests(stacked, subject_ids).kruskal_wallis(groups)
+    labels = groups['group'].values
+    for region_idx, class_idx in [(0, 0), (2, 3), (4, 0), (7, 5)]:
+        values = stacked[region_idx, class_idx].astype(float)
+        samples = [values[labels == label] for label in ('a', 'b', 'c')]
+        expected = stats.kruskal(*samples, nan_policy='omit')
+        assert results['H'][region_idx, class_idx] == pytest.approx(expected.statistic)
+        assert results['p'][region_idx, class_idx] == pytest.approx(expected.pvalue)
+
+
+def test_spearman_matches_scipy(cohort):
+    stacked, subject_ids, _, scores = cohort
+    results = RankTests(stacked, subject_ids).spearman(scores)
+    for region_idx, class_idx in [(0, 0), (2, 3), (4, 0), (7, 5)]:
+        values = stacked[region_idx, class_idx].astype(float)
+        expected = stats.spearmanr(values, scores['score'].values, nan_policy='omit')
+        assert results['rho'][region_idx, class_idx] == pytest.approx(expected.correlation)
+        assert results['p'][region_idx, class_idx] == pytest.approx(expected.pvalue)
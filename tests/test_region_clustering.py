@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from research.data_classes.cortical_layers.region_clustering import RegionClustering, kmeans
+
+
+def create_planted_profiles(n_clusters: int, n_per_cluster: int = 25, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    centers = rng.dirichlet(np.ones(6), n_clusters) * 3
+    labels = np.repeat(np.arange(n_clusters), n_per_cluster)
+    rng.shuffle(labels)
+    profiles = centers[labels] + rng.normal(scale=0.02, size=(len(labels), 6))
+    return profiles, labels
+
+
+def assert_same_partition(labels: np.ndarray, expected: np.ndarray) -> None:
+    # Labels are only defined up to a permutation of the clusters
+    pairs = set(zip(labels.tolist(), expected.tolist()))
+    assert len(pairs) == len(set(expected.tolist())) == len(set(labels.tolist()))
+
+
+@pytest.mark.parametrize('batch_size', [None, 40])
+def test_kmeans_recovers_planted_partition(batch_size):
+    profiles, expected = create_planted_profiles(4)
+    labels, centers, inertia = kmeans(profiles, 4, batch_size=batch_size)
+    assert_same_partition(labels, expected)
+    # Labels are ordered by first appearance
+    _, first = np.unique(labels, return_index=True)
+    np.testing.assert_array_equal(labels[np.sort(first)], np.arange(4))
+    assert inertia == pytest.approx(((profiles - centers[labels]) ** 2).sum())
+
+
+def test_region_clustering_fits_several_numbers_of_clusters():
+    profiles, expected = create_planted_profiles(3, seed=1)
+    results = RegionClustering(n_threads=2).fit(profiles, [2, 3, 5])
+    assert sorted(results) == [2, 3, 5]
+    assert_same_partition(results[3][0], expected)
+    inertias = [results[n_clusters][2] for n_clusters in (2, 3, 5)]
+    assert inertias == sorted(inertias, reverse=True)
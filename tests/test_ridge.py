@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.ridge import RidgePredictor
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+preprocessing = pytest.importorskip('sklearn.preprocessing')
+
+N_SUBJECTS = 40
+
+
+@pytest.fixture
+def cohort() -> tuple:
+    stacked, subject_ids = create_stacked_pbrs(N_SUBJECTS, n_regions=5)
+    rng = np.random.default_rng(6)
+    features = stacked.reshape(-1, N_SUBJECTS).T.astype(float)
+    y = features[:, 3] * 4 - features[:, 10] * 2 + rng.normal(scale=0.1, size=N_SUBJECTS)
+    scores = pd.DataFrame({'score': y}, index=subject_ids)
+    scores.iloc[[0, 13], 0] = np.nan
+    return stacked, subject_ids, scores
+
+
+def fit_sklearn(X: np.ndarray, y: np.ndarray, alpha: float):
+    scaler = preprocessing.StandardScaler().fit(X)
+    return scaler, linear_model.Ridge(alpha=alpha).fit(scaler.transform(X), y)
+
+
+def test_cross_validated_r2_matches_sklearn(cohort):
+    stacked, subject_ids, scores = cohort
+    alphas = np.array([0.1, 1., 10.])
+    predictor = RidgePredictor(alphas=alphas, n_folds=4, n_threads=2).fit(stacked, subject_ids,
+                                                                          scores)
+    included = scores['score'].notnull().values
+    X = stacked[:, :, included].reshape(-1, included.sum()).T.astype(float)
+    y = scores['score'].values[included]
+    for alpha_idx, alpha in enumerate(alphas):
+        predictions = np.empty(len(y))
+        for test in predictor.get_folds(len(y)):
+            train = np.setdiff1d(np.arange(len(y)), test)
+            scaler, model = fit_sklearn(X[train], y[train], alpha)
+            predictions[test] = model.predict(scaler.transform(X[test]))
+        expected_r2 = 1 - ((y - predictions) ** 2).sum() / ((y - y.mean()) ** 2).sum()
+        assert predictor.cv_r2.iloc[alpha_idx] == pytest.approx(expected_r2)
+        if alpha == predictor.best_alpha:
+            np.testing.assert_allclose(predictor.predictions.values, predictions)
+    assert predictor.r2 == pytest.approx(predictor.cv_r2.max())
+    _, model = fit_sklearn(X, y, predictor.best_alpha)
+    np.testing.assert_allclose(predictor.weights.ravel(), model.coef_, atol=1e-10)
+
+
+def test_too_few_subjects(cohort):
+    stacked, subject_ids, scores = cohort
+    with pytest.raises(ValueError):
+        RidgePredictor(n_folds=5).fit(stacked, subject_ids, scores.iloc[:4])
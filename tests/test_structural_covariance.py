@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from conftest import create_stacked_pbrs
+from research.data_classes.cortical_layers.structural_covariance import StructuralCovariance, \
+    get_packed_offset
+
+
+def test_packed_offsets_index_the_upper_triangle():
+    n_regions = 9
+    rows, columns = np.triu_indices(n_regions)
+    np.testing.assert_array_equal(get_packed_offset(rows, n_regions) + columns - rows,
+                                  np.arange(len(rows)))
+
+
+@pytest.mark.parametrize('block_size', [7, 256])
+def test_correlation_matches_numpy(tmp_path, block_size):
+    stacked, _ = create_stacked_pbrs(25)
+    covariance = StructuralCovariance(stacked, str(tmp_path), block_size=block_size,
+                                      n_threads=2)
+    for class_idx in (0, 4):
+        expected = np.corrcoef(stacked[:, class_idx].astype(float))
+        np.testing.assert_allclose(covariance.get_matrix('correlation', class_idx), expected,
+                                   atol=1e-6)
+        np.testing.assert_allclose(covariance.get_row('correlation', class_idx, 17),
+                                   expected[17], atol=1e-6)
+    strongest = covariance.get_covarying_regions('correlation', 4, 17, n=3)
+    row = np.abs(np.corrcoef(stacked[:, 4].astype(float))[17])
+    row[17] = -1
+    np.testing.assert_array_equal(strongest, np.argsort(row)[::-1][:3])
+
+
+def test_partial_correlation_matches_residual_correlation(tmp_path):
+    stacked, _ = create_stacked_pbrs(80, n_regions=6)
+    covariance = StructuralCovariance(stacked, str(tmp_path), shrinkage=0)
+    partial = covariance.get_matrix('partial', 2)
+    data = stacked[:, 2].astype(float).T
+    for i, j in [(0, 1), (2, 5), (3, 4)]:
+        others = np.delete(np.arange(6), [i, j])
+        design = np.column_stack([np.ones(len(data)), data[:, others]])
+        residuals = [data[:, k] - design @ np.linalg.lstsq(design, data[:, k], rcond=None)[0]
+                     for k in (i, j)]
+        assert partial[i, j] == pytest.approx(np.corrcoef(*residuals)[0, 1], abs=1e-5)